@@ -1,25 +1,48 @@
-from openai import OpenAI
 import os
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Callable, Optional
 import json
-import re
 from datetime import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from utils.completion_cache import CompletionCache, build_chat_client
+from utils.async_client import AsyncClientMixin
+from utils.chunk_retrieval import format_excerpts
+from utils.pdf_ingestion import (
+    PdfExtractionCache, chunk_pages, chunk_text, extract_pages, file_sha256, get_default_pdf_cache
+)
+from utils.prompt_packing import count_tokens
+from utils.structured_output import (
+    PAPER_ANALYSIS_FIELDS, IncrementalJsonParser, describe_fields, json_schema, parse_json_object, validate_fields
+)
 
-class AnalysisAgent:
-    def __init__(self, api_key: str, model: str = "gpt-3.5-turbo"):
-        self.client = OpenAI(api_key=api_key)
+class AnalysisAgent(AsyncClientMixin):
+    def __init__(self, api_key: str, model: str = "gpt-3.5-turbo", client=None,
+                 cache: Optional[CompletionCache] = None, use_cache: bool = True, async_client=None):
+        self.client = build_chat_client(api_key, client=client, cache=cache, use_cache=use_cache)
         self.model = model
+        self.api_key = api_key
+        self._async_client = async_client
+        self._cache = cache
+        self._use_cache = use_cache
+        # Paper chunk size for map-reduce analysis, and how many chunk notes one merge call combines
+        self.chunk_tokens = 2000
+        self.notes_per_merge = 12
 
+    def _analysis_prompt(self, search_results):
+        if isinstance(search_results, list) and all(isinstance(result, dict) for result in search_results):
+            search_results = format_excerpts(search_results)
+        return (
+            "You are an Analysis Agent that organizes research information.\n"
+            "Analyze the following search results and organize them into "
+            "coherent themes and key points.\n\n"
+            f"Search results:\n{search_results}\n\n"
+            "Provide a structured analysis that can be used for drafting a comprehensive answer."
+        )
+    
     def analyze(self, search_results):
         """Analyze and organize search results"""
         try:
-            prompt = (
-                "You are an Analysis Agent that organizes research information.\n"
-                "Analyze the following search results and organize them into "
-                "coherent themes and key points.\n\n"
-                f"Search results:\n{search_results}\n\n"
-                "Provide a structured analysis that can be used for drafting a comprehensive answer."
-            )
+            prompt = self._analysis_prompt(search_results)
             
             response = self.client.chat.completions.create(
                 model=self.model,
@@ -36,65 +59,215 @@ class AnalysisAgent:
                 "error": str(e)
             }
     
-    def analyze_paper(self, paper_text: str, paper_name: str):
-        """Extract key information from a research paper."""
+    async def analyze_async(self, search_results):
+        """Analyze and organize search results without blocking the event loop"""
         try:
-            prompt = (
-                "You are a Research Paper Analysis Agent.\n"
-                "Analyze the following research paper and extract these key elements:\n"
-                "1. Title\n"
-                "2. Authors\n"
-                "3. Publication year and journal/conference\n"
-                "4. Abstract summary (100 words)\n"
-                "5. Key findings (bullet points)\n"
-                "6. Methodology\n"
-                "7. Main topics/themes\n\n"
-                f"Paper name: {paper_name}\n"
-                f"Paper content: {paper_text[:4000]}...\n\n"
-                "Format your response as a JSON object."
-            )
-            
-            response = self.client.chat.completions.create(
+            response = await self.async_client.chat.completions.create(
                 model=self.model,
-                messages=[{"role": "user", "content": prompt}]
+                messages=[{"role": "user", "content": self._analysis_prompt(search_results)}]
             )
             
-            content = response.choices[0].message.content
-            
-            # Extract JSON from response
-            try:
-                # Find JSON in response
-                json_match = re.search(r'```json\n(.*?)\n```', content, re.DOTALL)
-                if json_match:
-                    json_str = json_match.group(1)
-                else:
-                    json_str = content
-                    
-                result = json.loads(json_str)
-                return {
-                    "success": True,
-                    "paper_analysis": result
-                }
-            except:
-                # Fallback if JSON parsing fails
+            return {
+                "success": True,
+                "analysis": response.choices[0].message.content
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    def analyze_paper(self, paper_text: str, paper_name: str, max_workers: int = 4):
+        """Extract key information from a research paper, using map-reduce over chunks for long papers."""
+        try:
+            if count_tokens(paper_text, self.model) > self.chunk_tokens:
+                return self.analyze_paper_chunks(
+                    chunk_text(paper_text, model=self.model, max_tokens=self.chunk_tokens),
+                    paper_name,
+                    max_workers=max_workers
+                )
+            
+            return self.extract_paper_fields(paper_text, paper_name)
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    def analyze_pdf(self, pdf, paper_name: Optional[str] = None, max_workers: int = 4,
+                    pdf_cache: Optional[PdfExtractionCache] = None):
+        """Analyze a whole PDF: pages are extracted lazily, chunked and analyzed with map-reduce"""
+        try:
+            paper_name = paper_name or os.path.basename(str(getattr(pdf, "name", pdf)))
+            file_hash = file_sha256(pdf)
+            pages = extract_pages(pdf, cache=pdf_cache or get_default_pdf_cache(), file_hash=file_hash)
+            chunks = chunk_pages(pages, model=self.model, max_tokens=self.chunk_tokens)
+            
+            result = self.analyze_paper_chunks(chunks, paper_name, max_workers=max_workers)
+            result["file_hash"] = file_hash
+            return result
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    def analyze_paper_chunks(self, chunks, paper_name: str, max_workers: int = 4):
+        """Map: take notes on each chunk in a worker pool. Reduce: merge the notes into one analysis.
+        
+        chunks may be a generator; at most 2 * max_workers chunks are held at a time.
+        """
+        try:
+            notes = []
+            pages = 0
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                in_flight = deque()
+                for chunk in chunks:
+                    pages = max(pages, chunk.get("end_page", 0))
+                    in_flight.append(executor.submit(self._chunk_notes, chunk, paper_name))
+                    if len(in_flight) >= 2 * max_workers:
+                        notes.append(in_flight.popleft().result())
+                while in_flight:
+                    notes.append(in_flight.popleft().result())
+            
+            if not notes:
                 return {
-                    "success": True,
-                    "paper_analysis": {
-                        "title": paper_name,
-                        "authors": "Extraction failed",
-                        "publication": "Unknown",
-                        "abstract": "Could not parse paper content properly.",
-                        "key_findings": ["Extraction failed"],
-                        "methodology": "Extraction failed",
-                        "topics": ["Unknown"]
-                    }
+                    "success": False,
+                    "error": "No text could be extracted from the paper."
                 }
+            
+            chunk_count = len(notes)
+            # Merge in rounds until the notes fit into one extraction prompt
+            while len(notes) > self.notes_per_merge:
+                groups = [notes[i:i + self.notes_per_merge] for i in range(0, len(notes), self.notes_per_merge)]
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    notes = list(executor.map(lambda group: self._merge_notes(group, paper_name), groups))
+            
+            result = self.extract_paper_fields(
+                "\n\n".join(f"Notes {i + 1}:\n{note}" for i, note in enumerate(notes)),
+                paper_name,
+                source_label="Notes taken on consecutive parts of the paper"
+            )
+            result.update({"chunks": chunk_count, "pages": pages})
+            return result
         except Exception as e:
             return {
                 "success": False,
                 "error": str(e)
             }
+    
+    def _chunk_notes(self, chunk: Dict[str, Any], paper_name: str) -> str:
+        prompt = (
+            "You are a Research Paper Analysis Agent reading one excerpt of a longer paper.\n"
+            f"Paper name: {paper_name}\n"
+            f"Excerpt (pages {chunk.get('start_page', '?')}-{chunk.get('end_page', '?')}):\n{chunk['text']}\n\n"
+            "Take concise notes on what this excerpt says about the paper's title, authors, publication, "
+            "abstract, key findings, methodology and main topics. Skip anything the excerpt does not cover."
+        )
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}]
+        )
+        return response.choices[0].message.content
+    
+    def _merge_notes(self, notes: List[str], paper_name: str) -> str:
+        sections = "\n\n".join(f"Notes {i + 1}:\n{note}" for i, note in enumerate(notes))
+        prompt = (
+            "You are a Research Paper Analysis Agent.\n"
+            f"These are notes taken on consecutive parts of the paper {paper_name}.\n\n"
+            f"{sections}\n\n"
+            "Merge these notes into one set of concise notes, removing repetition."
+        )
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}]
+        )
+        return response.choices[0].message.content
+    
+    def extract_paper_fields(self, text: str, paper_name: str, fields: Optional[List[str]] = None,
+                             source_label: str = "Paper content", max_reasks: int = 2,
+                             on_field: Optional[Callable[[str, Any], None]] = None):
+        """Extract paper fields as schema-validated JSON, re-asking only for the fields that fail validation.
+        
+        The response is streamed and parsed incrementally; on_field is called with each valid
+        field as soon as it arrives. Fields the text does not state come back as None without a
+        re-ask. Missing or malformed fields still invalid after max_reasks are also set to None
+        and listed in missing_fields.
+        """
+        try:
+            specs = {name: PAPER_ANALYSIS_FIELDS[name] for name in (fields or PAPER_ANALYSIS_FIELDS)}
+            analysis = {}
+            errors = {}
+            pending = dict(specs)
+            attempts = 0
+            while pending and attempts <= max_reasks:
+                data = self._request_fields(self._fields_prompt(text, paper_name, pending, errors, source_label),
+                                            pending, on_field)
+                valid, errors = validate_fields(data, pending)
+                analysis.update(valid)
+                pending = {name: specs[name] for name in errors}
+                attempts += 1
+                if pending:
+                    print(f"AnalysisAgent: Invalid fields for {paper_name}: {errors}")
             
+            for name in pending:
+                analysis[name] = None
+            
+            return {
+                "success": True,
+                "paper_analysis": {name: analysis[name] for name in specs},
+                "missing_fields": list(pending),
+                "requests": attempts
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    def _fields_prompt(self, text: str, paper_name: str, fields: Dict[str, Dict[str, Any]],
+                       errors: Dict[str, str], source_label: str) -> str:
+        if errors:
+            problems = "\n".join(f"- {name}: {error}" for name, error in errors.items())
+            instructions = (
+                f"A previous answer had these problems:\n{problems}\n\n"
+                "Respond with a JSON object containing only these keys:\n"
+            )
+        else:
+            instructions = "Extract the following fields and respond with a JSON object with exactly these keys:\n"
+        
+        return (
+            "You are a Research Paper Analysis Agent.\n"
+            f"{instructions}{describe_fields(fields)}\n\n"
+            f"JSON Schema: {json.dumps(json_schema(fields))}\n\n"
+            f"Paper name: {paper_name}\n"
+            f"{source_label}: {text}"
+        )
+    
+    def _request_fields(self, prompt: str, fields: Dict[str, Dict[str, Any]],
+                        on_field: Optional[Callable[[str, Any], None]] = None) -> Dict[str, Any]:
+        """Stream a JSON-mode completion, reporting each valid field as soon as it is complete"""
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            response_format={"type": "json_object"},
+            stream=True
+        )
+        parser = IncrementalJsonParser()
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            for name, value in parser.feed(chunk.choices[0].delta.content or ""):
+                if on_field is not None and name in fields:
+                    valid, _ = validate_fields({name: value}, {name: fields[name]})
+                    if valid.get(name) is not None:
+                        on_field(name, valid[name])
+        
+        if parser.done:
+            return parser.fields
+        # The stream was cut off or the object was malformed; keep whatever parsed cleanly
+        return parse_json_object(parser.text) or parser.fields
+    
     def format_citation(self, source: Dict[str, Any], style: str = "APA"):
         """Format a citation based on the chosen style."""
         try:
@@ -130,12 +303,14 @@ class AnalysisAgent:
             # Prepare the content for the literature review
             paper_data = []
             for paper in papers:
+                # Extracted fields are None when the paper does not state them
+                authors = paper.get('authors') or ''
                 paper_data.append(
-                    f"Title: {paper.get('title', '')}\n"
-                    f"Authors: {paper.get('authors', '')}\n"
-                    f"Publication: {paper.get('publication', '')}\n"
-                    f"Abstract: {paper.get('abstract', '')}\n"
-                    f"Key findings: {', '.join(paper.get('key_findings', []))}"
+                    f"Title: {paper.get('title') or ''}\n"
+                    f"Authors: {', '.join(authors) if isinstance(authors, list) else authors}\n"
+                    f"Publication: {paper.get('publication') or ''}\n"
+                    f"Abstract: {paper.get('abstract') or ''}\n"
+                    f"Key findings: {', '.join(paper.get('key_findings') or [])}"
                 )
             
             prompt = (
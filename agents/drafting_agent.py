@@ -1,22 +1,35 @@
-from openai import OpenAI
 import os
 from typing import List, Dict, Any, Optional
+from utils.completion_cache import CompletionCache, build_chat_client
+from utils.async_client import AsyncClientMixin
+from utils.prompt_packing import pack_sources
+from utils.streaming import iter_completion_text
 
-class DraftingAgent:
-    def __init__(self, api_key: str, model: str = "gpt-3.5-turbo"):
-        self.client = OpenAI(api_key=api_key)
+class DraftingAgent(AsyncClientMixin):
+    def __init__(self, api_key: str, model: str = "gpt-3.5-turbo", client=None,
+                 cache: Optional[CompletionCache] = None, use_cache: bool = True, async_client=None):
+        self.client = build_chat_client(api_key, client=client, cache=cache, use_cache=use_cache)
         self.model = model
+        self.api_key = api_key
+        self._async_client = async_client
+        self._cache = cache
+        self._use_cache = use_cache
 
-    def draft_answer(self, question, analysis):
+    def _answer_prompt(self, question, analysis, excerpts=None):
+        excerpt_section = f"Most relevant source excerpts:\n{excerpts}\n\n" if excerpts else ""
+        return (
+            "You are a Drafting Agent that creates comprehensive answers based on research.\n\n"
+            f"Original question:\n{question}\n\n"
+            f"Organized research information:\n{analysis}\n\n"
+            f"{excerpt_section}"
+            "Create a well-structured, informative answer that addresses the question comprehensively. "
+            "Include proper citations to sources wherever applicable."
+        )
+    
+    def draft_answer(self, question, analysis, excerpts=None):
         """Draft a comprehensive answer"""
         try:
-            prompt = (
-                "You are a Drafting Agent that creates comprehensive answers based on research.\n\n"
-                f"Original question:\n{question}\n\n"
-                f"Organized research information:\n{analysis}\n\n"
-                "Create a well-structured, informative answer that addresses the question comprehensively. "
-                "Include proper citations to sources wherever applicable."
-            )
+            prompt = self._answer_prompt(question, analysis, excerpts)
             
             response = self.client.chat.completions.create(
                 model=self.model,
@@ -33,13 +46,45 @@ class DraftingAgent:
                 "error": str(e)
             }
     
+    async def draft_answer_async(self, question, analysis, excerpts=None):
+        """Draft a comprehensive answer without blocking the event loop"""
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": self._answer_prompt(question, analysis, excerpts)}]
+            )
+            
+            return {
+                "success": True,
+                "answer": response.choices[0].message.content
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    def draft_answer_stream(self, question, analysis, excerpts=None):
+        """Draft a comprehensive answer, yielding text chunks as they are generated
+        
+        Errors are raised from the generator instead of being returned as a dict.
+        """
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": self._answer_prompt(question, analysis, excerpts)}],
+            stream=True
+        )
+        yield from iter_completion_text(stream)
+    
     def create_paper_summary_table(self, papers: List[Dict[str, Any]]):
         """Create a formatted summary table for research papers"""
         try:
+            packed = pack_sources(papers, model=self.model, max_content_tokens=150)
+            
             prompt = (
                 "You are a Research Summary Agent.\n"
                 "Create a well-formatted markdown table summarizing the following research papers:\n\n"
-                f"{str(papers)}\n\n"
+                f"{packed['text']}\n\n"
                 "The table should include columns for:\n"
                 "1. Title\n"
                 "2. Authors\n"
@@ -56,7 +101,8 @@ class DraftingAgent:
             
             return {
                 "success": True,
-                "summary_table": response.choices[0].message.content
+                "summary_table": response.choices[0].message.content,
+                "tokens_saved": packed["tokens_saved"]
             }
         except Exception as e:
             return {
@@ -64,78 +110,114 @@ class DraftingAgent:
                 "error": str(e)
             }
     
+    def _references_prompt(self, sources: List[Dict[str, Any]], citation_style: str):
+        # Citations only need metadata, never the page content
+        packed = pack_sources(
+            sources,
+            model=self.model,
+            fields=["title", "authors", "year", "publication", "url", "date_accessed"],
+            include_content=False
+        )
+        print(f"DraftingAgent: Packed {packed['included']} sources, saved {packed['tokens_saved']} tokens")
+        
+        # Create a more detailed prompt with specific formatting instructions
+        prompt = (
+            "You are a Citation Agent specializing in academic citation formatting.\n"
+            f"Create a references list in {citation_style} style for the following sources:\n\n"
+            f"{packed['text']}\n\n"
+            f"Follow these specific {citation_style} style guidelines:\n"
+        )
+        
+        # Add style-specific instructions
+        if citation_style.upper() == "APA":
+            prompt += (
+                "APA Style:\n"
+                "- Author, A. A., Author, B. B., & Author, C. C. (Year). Title of article. Title of Journal, Volume(Issue), pp-pp.\n"
+                "- For books: Author, A. A. (Year). Title of book. Publisher.\n"
+                "- For websites: Author, A. A. (Year, Month Day). Title of webpage. Website Name. URL\n"
+                "- For PDFs: Author, A. A. (Year). Title of document. Source. URL\n"
+            )
+        elif citation_style.upper() == "MLA":
+            prompt += (
+                "MLA Style:\n"
+                "- Author, First Name, and Second Author. \"Title of Article.\" Title of Journal, vol. Volume, no. Issue, Year, pp. pp-pp.\n"
+                "- For books: Author, First Name. Title of Book. Publisher, Year.\n"
+                "- For websites: Author, First Name. \"Title of Webpage.\" Website Name, Publisher, Date, URL\n"
+                "- For PDFs: Author, First Name. \"Title of Document.\" Source, Year, URL\n"
+            )
+        elif citation_style.upper() == "CHICAGO":
+            prompt += (
+                "Chicago Style:\n"
+                "- Author, First Name, and Second Author. \"Title of Article.\" Title of Journal Volume, no. Issue (Year): pp-pp.\n"
+                "- For books: Author, First Name. Title of Book. Place of Publication: Publisher, Year.\n"
+                "- For websites: Author, First Name. \"Title of Webpage.\" Website Name. Month Day, Year. URL\n"
+                "- For PDFs: Author, First Name. \"Title of Document.\" Source, Year. URL\n"
+            )
+        elif citation_style.upper() == "HARVARD":
+            prompt += (
+                "Harvard Style:\n"
+                "- Author, A.A. and Author, B.B. (Year) 'Title of article', Title of Journal, Volume(Issue), pp. pp-pp.\n"
+                "- For books: Author, A.A. (Year) Title of Book, Place of Publication: Publisher.\n"
+                "- For websites: Author, A.A. (Year) 'Title of webpage', Website Name, [online] Available at: URL [Accessed Day Month Year]\n"
+                "- For PDFs: Author, A.A. (Year) 'Title of document', Source, [online] Available at: URL [Accessed Day Month Year]\n"
+            )
+        elif citation_style.upper() == "IEEE":
+            prompt += (
+                "IEEE Style:\n"
+                "- A. Author, B. Author, and C. Author, \"Title of article,\" Title of Journal, vol. Volume, no. Issue, pp. pp-pp, Year.\n"
+                "- A. Author, Title of Book, ed. Edition. Place of Publication: Publisher, Year.\n"
+                "- A. Author, \"Title of webpage,\" Website Name, Year. [Online]. Available: URL\n"
+                "- A. Author, \"Title of document,\" Source, Year. [Online]. Available: URL\n"
+            )
+        else:
+            prompt += (
+                f"Format the references according to standard {citation_style} style guidelines.\n"
+            )
+        
+        prompt += (
+            "\nOrder the references alphabetically by author surname.\n"
+            "Ensure each reference is properly formatted with all required elements.\n"
+            "For PDFs, include the source and URL if available.\n"
+            "For websites, include the access date if available.\n"
+        )
+        
+        return prompt, packed
+    
     def generate_references_list(self, sources: List[Dict[str, Any]], citation_style: str = "APA"):
         """Generate a formatted references list from sources"""
         try:
-            # Create a more detailed prompt with specific formatting instructions
-            prompt = (
-                "You are a Citation Agent specializing in academic citation formatting.\n"
-                f"Create a references list in {citation_style} style for the following sources:\n\n"
-                f"{str(sources)}\n\n"
-                f"Follow these specific {citation_style} style guidelines:\n"
-            )
-            
-            # Add style-specific instructions
-            if citation_style.upper() == "APA":
-                prompt += (
-                    "APA Style:\n"
-                    "- Author, A. A., Author, B. B., & Author, C. C. (Year). Title of article. Title of Journal, Volume(Issue), pp-pp.\n"
-                    "- For books: Author, A. A. (Year). Title of book. Publisher.\n"
-                    "- For websites: Author, A. A. (Year, Month Day). Title of webpage. Website Name. URL\n"
-                    "- For PDFs: Author, A. A. (Year). Title of document. Source. URL\n"
-                )
-            elif citation_style.upper() == "MLA":
-                prompt += (
-                    "MLA Style:\n"
-                    "- Author, First Name, and Second Author. \"Title of Article.\" Title of Journal, vol. Volume, no. Issue, Year, pp. pp-pp.\n"
-                    "- For books: Author, First Name. Title of Book. Publisher, Year.\n"
-                    "- For websites: Author, First Name. \"Title of Webpage.\" Website Name, Publisher, Date, URL\n"
-                    "- For PDFs: Author, First Name. \"Title of Document.\" Source, Year, URL\n"
-                )
-            elif citation_style.upper() == "CHICAGO":
-                prompt += (
-                    "Chicago Style:\n"
-                    "- Author, First Name, and Second Author. \"Title of Article.\" Title of Journal Volume, no. Issue (Year): pp-pp.\n"
-                    "- For books: Author, First Name. Title of Book. Place of Publication: Publisher, Year.\n"
-                    "- For websites: Author, First Name. \"Title of Webpage.\" Website Name. Month Day, Year. URL\n"
-                    "- For PDFs: Author, First Name. \"Title of Document.\" Source, Year. URL\n"
-                )
-            elif citation_style.upper() == "HARVARD":
-                prompt += (
-                    "Harvard Style:\n"
-                    "- Author, A.A. and Author, B.B. (Year) 'Title of article', Title of Journal, Volume(Issue), pp. pp-pp.\n"
-                    "- For books: Author, A.A. (Year) Title of Book, Place of Publication: Publisher.\n"
-                    "- For websites: Author, A.A. (Year) 'Title of webpage', Website Name, [online] Available at: URL [Accessed Day Month Year]\n"
-                    "- For PDFs: Author, A.A. (Year) 'Title of document', Source, [online] Available at: URL [Accessed Day Month Year]\n"
-                )
-            elif citation_style.upper() == "IEEE":
-                prompt += (
-                    "IEEE Style:\n"
-                    "- A. Author, B. Author, and C. Author, \"Title of article,\" Title of Journal, vol. Volume, no. Issue, pp. pp-pp, Year.\n"
-                    "- A. Author, Title of Book, ed. Edition. Place of Publication: Publisher, Year.\n"
-                    "- A. Author, \"Title of webpage,\" Website Name, Year. [Online]. Available: URL\n"
-                    "- A. Author, \"Title of document,\" Source, Year. [Online]. Available: URL\n"
-                )
-            else:
-                prompt += (
-                    f"Format the references according to standard {citation_style} style guidelines.\n"
-                )
+            prompt, packed = self._references_prompt(sources, citation_style)
             
-            prompt += (
-                "\nOrder the references alphabetically by author surname.\n"
-                "Ensure each reference is properly formatted with all required elements.\n"
-                "For PDFs, include the source and URL if available.\n"
-                "For websites, include the access date if available.\n"
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}]
             )
             
-            response = self.client.chat.completions.create(
+            return {
+                "success": True,
+                "references_list": response.choices[0].message.content,
+                "tokens_saved": packed["tokens_saved"]
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    async def generate_references_list_async(self, sources: List[Dict[str, Any]], citation_style: str = "APA"):
+        """Generate a formatted references list without blocking the event loop"""
+        try:
+            prompt, packed = self._references_prompt(sources, citation_style)
+            
+            response = await self.async_client.chat.completions.create(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}]
             )
             
             return {
                 "success": True,
-                "references_list": response.choices[0].message.content
+                "references_list": response.choices[0].message.content,
+                "tokens_saved": packed["tokens_saved"]
             }
         except Exception as e:
             return {
@@ -149,7 +231,7 @@ class DraftingAgent:
             prompt = (
                 "You are a Literature Review Drafting Agent.\n"
                 f"Create a well-structured literature review section on the topic: {topic}\n\n"
-                f"Based on these papers:\n{str(related_papers)}\n\n"
+                f"Based on these papers:\n{pack_sources(related_papers, model=self.model)['text']}\n\n"
                 "Your literature review section should:\n"
                 "1. Synthesize findings related to this specific topic\n"
                 "2. Compare and contrast different approaches\n"
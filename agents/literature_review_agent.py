@@ -1,29 +1,156 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+import asyncio
 import json
-from openai import OpenAI
+import re
+from concurrent.futures import ThreadPoolExecutor
+from utils.completion_cache import CompletionCache, build_chat_client
+from utils.async_client import AsyncClientMixin
+from utils.prompt_packing import pack_sources
+from utils.source_clustering import cluster_sources
+from utils.streaming import iter_completion_text
+from utils.structured_output import parse_json_object
 
-class LiteratureReviewAgent:
-    def __init__(self, api_key: str, model: str = "gpt-3.5-turbo"):
+def _summary_rows(content: str) -> List[Dict[str, Any]]:
+    """Read summary rows from a {"rows": [...]} object or a bare JSON array"""
+    fenced = re.search(r"```(?:json)?\s*(.*?)\s*```", content or "", re.DOTALL)
+    try:
+        data = json.loads(fenced.group(1) if fenced else content)
+    except ValueError:
+        data = parse_json_object(content)
+    if isinstance(data, dict):
+        data = data.get("rows", next((value for value in data.values() if isinstance(value, list)), None))
+    if not isinstance(data, list):
+        raise ValueError("Summary table response did not contain a list of rows")
+    return [row for row in data if isinstance(row, dict)]
+
+class LiteratureReviewAgent(AsyncClientMixin):
+    def __init__(self, api_key: str, model: str = "gpt-3.5-turbo", client=None,
+                 cache: Optional[CompletionCache] = None, use_cache: bool = True, async_client=None):
         """Initialize the Literature Review Agent with OpenAI API key"""
-        self.client = OpenAI(api_key=api_key)
+        self.client = build_chat_client(api_key, client=client, cache=cache, use_cache=use_cache)
         self.model = model
+        self.api_key = api_key
+        self._async_client = async_client
+        self._cache = cache
+        self._use_cache = use_cache
+        # How many partial reviews one merge call combines in the hierarchical review
+        self.reviews_per_merge = 8
+    
+    def _review_prompt(self, packed_sources: str, style: str):
+        return (
+            "You are a Literature Review Agent.\n"
+            f"Create a comprehensive literature review in {style} style based on the following sources:\n\n"
+            f"{packed_sources}\n\n"
+            "Your literature review should:\n"
+            "1. Provide a comprehensive overview of the research field\n"
+            "2. Synthesize findings from multiple sources\n"
+            "3. Identify patterns, trends, and contradictions in the literature\n"
+            "4. Be well-structured with clear sections and transitions\n"
+            "5. Include proper citations to sources\n\n"
+            "Format the review in markdown with appropriate headings, bullet points, and emphasis."
+        )
     
-    def generate_literature_review(self, sources: List[Dict[str, Any]], style: str = "thematic"):
+    def generate_literature_review(self, sources: List[Dict[str, Any]], style: str = "thematic",
+                                   map_reduce_threshold: Optional[int] = 24):
         """Generate a literature review based on the provided sources"""
+        # Large source sets are reviewed per theme and merged instead of in one huge prompt
+        if map_reduce_threshold is not None and len(sources) > map_reduce_threshold:
+            return self.generate_hierarchical_literature_review(sources, style=style)
+        
         try:
-            prompt = (
-                "You are a Literature Review Agent.\n"
-                f"Create a comprehensive literature review in {style} style based on the following sources:\n\n"
-                f"{str(sources)}\n\n"
-                "Your literature review should:\n"
-                "1. Provide a comprehensive overview of the research field\n"
-                "2. Synthesize findings from multiple sources\n"
-                "3. Identify patterns, trends, and contradictions in the literature\n"
-                "4. Be well-structured with clear sections and transitions\n"
-                "5. Include proper citations to sources\n\n"
-                "Format the review in markdown with appropriate headings, bullet points, and emphasis."
+            packed = pack_sources(sources, model=self.model)
+            print(f"LiteratureReviewAgent: Packed {packed['included']} sources, saved {packed['tokens_saved']} tokens")
+            
+            prompt = self._review_prompt(packed["text"], style)
+            
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}]
             )
             
+            return {
+                "success": True,
+                "literature_review": response.choices[0].message.content,
+                "tokens_saved": packed["tokens_saved"]
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    async def generate_literature_review_async(self, sources: List[Dict[str, Any]], style: str = "thematic",
+                                               map_reduce_threshold: Optional[int] = 24):
+        """Generate a literature review without blocking the event loop"""
+        if map_reduce_threshold is not None and len(sources) > map_reduce_threshold:
+            return await self.generate_hierarchical_literature_review_async(sources, style=style)
+        
+        try:
+            packed = pack_sources(sources, model=self.model)
+            
+            response = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": self._review_prompt(packed["text"], style)}]
+            )
+            
+            return {
+                "success": True,
+                "literature_review": response.choices[0].message.content,
+                "tokens_saved": packed["tokens_saved"]
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    def generate_literature_review_stream(self, sources: List[Dict[str, Any]], style: str = "thematic"):
+        """Generate a literature review, yielding text chunks as they are generated
+        
+        Errors are raised from the generator instead of being returned as a dict.
+        """
+        packed = pack_sources(sources, model=self.model)
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": self._review_prompt(packed["text"], style)}],
+            stream=True
+        )
+        yield from iter_completion_text(stream)
+    
+    def generate_hierarchical_literature_review(self, sources: List[Dict[str, Any]], style: str = "thematic",
+                                                max_cluster_size: int = 8, max_workers: int = 4,
+                                                section_drafter=None):
+        """Generate a literature review with a map-reduce over theme clusters
+        
+        Sources are clustered into themes, a partial review is drafted for each
+        cluster in parallel, and the partial reviews are merged in rounds of
+        reviews_per_merge until a final call can merge them all, so no prompt
+        grows with the number of clusters. A DraftingAgent can be passed as
+        section_drafter to draft the partial reviews with draft_literature_review_section.
+        """
+        try:
+            clusters = cluster_sources(sources, max_cluster_size=max_cluster_size)
+            print(f"LiteratureReviewAgent: Reviewing {len(sources)} sources in {len(clusters)} theme clusters")
+            
+            def draft_cluster(cluster):
+                if section_drafter is not None:
+                    result = section_drafter.draft_literature_review_section(cluster["theme"], cluster["sources"])
+                    if not result["success"]:
+                        raise RuntimeError(result.get("error", "Unknown error drafting section"))
+                    return result["section_draft"]
+                return self._draft_theme_review(cluster["theme"], cluster["sources"])
+            
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                partial_reviews = list(executor.map(draft_cluster, clusters))
+                themes = [cluster["theme"] for cluster in clusters]
+                # Merge in rounds until the partial reviews fit into one merge prompt
+                while len(partial_reviews) > self.reviews_per_merge:
+                    groups = self._merge_groups(themes, partial_reviews)
+                    partial_reviews = list(executor.map(lambda group: self._combine_reviews(*group), groups))
+                    themes = [" / ".join(group_themes) for group_themes, _ in groups]
+            
+            prompt = self._merge_reviews_prompt(themes, partial_reviews, style)
+            
             response = self.client.chat.completions.create(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}]
@@ -31,7 +158,52 @@ class LiteratureReviewAgent:
             
             return {
                 "success": True,
-                "literature_review": response.choices[0].message.content
+                "literature_review": response.choices[0].message.content,
+                "clusters": len(clusters)
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    async def generate_hierarchical_literature_review_async(self, sources: List[Dict[str, Any]],
+                                                            style: str = "thematic", max_cluster_size: int = 8):
+        """Generate a map-reduce literature review with the cluster reviews drafted concurrently"""
+        try:
+            clusters = cluster_sources(sources, max_cluster_size=max_cluster_size)
+            
+            async def draft_cluster(cluster):
+                response = await self.async_client.chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": self._theme_review_prompt(cluster["theme"], cluster["sources"])}]
+                )
+                return response.choices[0].message.content
+            
+            partial_reviews = await asyncio.gather(*[draft_cluster(cluster) for cluster in clusters])
+            themes = [cluster["theme"] for cluster in clusters]
+            
+            async def combine(group):
+                response = await self.async_client.chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": self._combine_reviews_prompt(*group)}]
+                )
+                return response.choices[0].message.content
+            
+            while len(partial_reviews) > self.reviews_per_merge:
+                groups = self._merge_groups(themes, partial_reviews)
+                partial_reviews = await asyncio.gather(*[combine(group) for group in groups])
+                themes = [" / ".join(group_themes) for group_themes, _ in groups]
+            
+            response = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": self._merge_reviews_prompt(themes, partial_reviews, style)}]
+            )
+            
+            return {
+                "success": True,
+                "literature_review": response.choices[0].message.content,
+                "clusters": len(clusters)
             }
         except Exception as e:
             return {
@@ -39,33 +211,153 @@ class LiteratureReviewAgent:
                 "error": str(e)
             }
     
+    def _theme_review_prompt(self, theme: str, sources: List[Dict[str, Any]]):
+        packed = pack_sources(sources, model=self.model)
+        return (
+            "You are a Literature Review Agent.\n"
+            f"Write a concise literature review section on the theme: {theme}\n\n"
+            f"Based on these sources:\n{packed['text']}\n\n"
+            "Synthesize the findings, compare approaches, and cite each source you use."
+        )
+    
+    def _merge_groups(self, themes: List[str], partial_reviews: List[str]):
+        """Split the partial reviews into (themes, reviews) groups of at most reviews_per_merge"""
+        size = self.reviews_per_merge
+        return [(themes[i:i + size], partial_reviews[i:i + size]) for i in range(0, len(partial_reviews), size)]
+    
+    def _combine_reviews_prompt(self, themes: List[str], partial_reviews: List[str]):
+        sections = "\n\n".join(f"## Theme: {theme}\n{review}" for theme, review in zip(themes, partial_reviews))
+        return (
+            "You are a Literature Review Agent.\n"
+            "Combine the following partial literature reviews into one concise review section. "
+            "It will later be merged with other sections, so do not add an introduction or conclusion.\n\n"
+            f"{sections}\n\n"
+            "Merge overlapping points, keep the key findings and contrasts, and keep the citations used."
+        )
+    
+    def _combine_reviews(self, themes: List[str], partial_reviews: List[str]):
+        """Combine one group of partial reviews into a single, shorter partial review"""
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": self._combine_reviews_prompt(themes, partial_reviews)}]
+        )
+        return response.choices[0].message.content
+    
+    def _merge_reviews_prompt(self, themes: List[str], partial_reviews: List[str], style: str):
+        sections = "\n\n".join(f"## Theme: {theme}\n{review}" for theme, review in zip(themes, partial_reviews))
+        return (
+            "You are a Literature Review Agent.\n"
+            f"Merge the following partial literature reviews into one comprehensive literature review in {style} style.\n\n"
+            f"{sections}\n\n"
+            "Your literature review should:\n"
+            "1. Provide a comprehensive overview of the research field\n"
+            "2. Merge overlapping themes and remove repetition\n"
+            "3. Identify patterns, trends, and contradictions across themes\n"
+            "4. Be well-structured with clear sections and transitions\n"
+            "5. Keep the citations used in the partial reviews\n\n"
+            "Format the review in markdown with appropriate headings, bullet points, and emphasis."
+        )
+    
+    def _draft_theme_review(self, theme: str, sources: List[Dict[str, Any]]):
+        """Draft the partial review for one theme cluster"""
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": self._theme_review_prompt(theme, sources)}]
+        )
+        return response.choices[0].message.content
+    
+    def _summary_table_prompt(self, packed_papers: str):
+        return (
+            "You are a Research Summary Agent.\n"
+            "Create a well-formatted markdown table summarizing the following research papers:\n\n"
+            f"{packed_papers}\n\n"
+            "The table should include columns for:\n"
+            "1. Title\n"
+            "2. Authors\n"
+            "3. Publication\n"
+            "4. Brief summary (2-3 sentences)\n"
+            "5. Key contribution\n\n"
+            "Make the table readable and well-formatted in markdown."
+        )
+    
     def create_paper_summary_table(self, papers: List[Dict[str, Any]]):
         """Create a formatted summary table for research papers"""
         try:
+            packed = pack_sources(papers, model=self.model, max_content_tokens=150)
+            print(f"LiteratureReviewAgent: Packed {packed['included']} papers, saved {packed['tokens_saved']} tokens")
+            
+            prompt = self._summary_table_prompt(packed["text"])
+            
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}]
+            )
+            
+            return {
+                "success": True,
+                "summary_table": response.choices[0].message.content,
+                "tokens_saved": packed["tokens_saved"]
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    async def create_paper_summary_table_async(self, papers: List[Dict[str, Any]]):
+        """Create a formatted summary table without blocking the event loop"""
+        try:
+            packed = pack_sources(papers, model=self.model, max_content_tokens=150)
+            
+            response = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": self._summary_table_prompt(packed["text"])}]
+            )
+            
+            return {
+                "success": True,
+                "summary_table": response.choices[0].message.content,
+                "tokens_saved": packed["tokens_saved"]
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    def create_paper_summary_rows(self, papers: List[Dict[str, Any]]):
+        """Summarize each paper as a structured row keyed by source ID"""
+        try:
+            packed = pack_sources(
+                papers,
+                model=self.model,
+                fields=["id", "title", "authors", "year", "publication"],
+                max_content_tokens=150
+            )
+            
             prompt = (
                 "You are a Research Summary Agent.\n"
-                "Create a well-formatted markdown table summarizing the following research papers:\n\n"
-                f"{str(papers)}\n\n"
-                "The table should include columns for:\n"
-                "1. Title\n"
-                "2. Authors\n"
-                "3. Publication\n"
-                "4. Brief summary (2-3 sentences)\n"
-                "5. Key contribution\n\n"
-                "Make the table readable and well-formatted in markdown."
+                "Summarize each of the following research papers:\n\n"
+                f"{packed['text']}\n\n"
+                "Return a JSON object {\"rows\": [...]} with one object per paper and these keys:\n"
+                "\"id\" (copied from the paper), \"title\", \"authors\", \"publication\", "
+                "\"summary\" (2-3 sentences), \"contribution\" (key contribution in one sentence)."
             )
             
             response = self.client.chat.completions.create(
                 model=self.model,
-                messages=[{"role": "user", "content": prompt}]
+                messages=[{"role": "user", "content": prompt}],
+                response_format={"type": "json_object"}
             )
             
+            rows = _summary_rows(response.choices[0].message.content)
+            
             return {
                 "success": True,
-                "summary_table": response.choices[0].message.content
+                "rows": {row["id"]: row for row in rows if row.get("id")}
             }
         except Exception as e:
             return {
                 "success": False,
                 "error": str(e)
-            } 
\ No newline at end of file
+            }
\ No newline at end of file
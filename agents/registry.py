@@ -0,0 +1,99 @@
+import os
+import threading
+from typing import Optional
+from agents.research_agent import ResearchAgent
+from agents.analysis_agent import AnalysisAgent
+from agents.drafting_agent import DraftingAgent
+from agents.literature_review_agent import LiteratureReviewAgent
+from agents.research_gaps_agent import ResearchGapsAgent
+from utils.completion_cache import get_default_cache
+from utils.prompt_packing import count_tokens
+from utils.request_governor import (
+    PRIORITY_INTERACTIVE, GovernedChatClient, GovernedSearchTool, RequestGovernor, get_default_governor
+)
+from utils.search_cache import get_default_search_cache
+from workflows.research_graph import create_research_workflow
+
+
+def create_pooled_openai_client(api_key: str, max_connections: int = 20, timeout: float = 60.0,
+                                max_retries: int = 0):
+    """Create one OpenAI client with a pooled HTTP client to share across agents
+
+    Retries are left to the RequestGovernor by default, so the SDK does not retry on its own.
+    """
+    import httpx
+    from openai import OpenAI
+
+    http_client = httpx.Client(
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        timeout=timeout
+    )
+    return OpenAI(api_key=api_key, http_client=http_client, max_retries=max_retries)
+
+
+class AgentRegistry:
+    """Builds every agent and the workflow once and shares a single pooled OpenAI client
+
+    OpenAI and search calls go through a RequestGovernor (the process-wide one
+    unless given) with the given default priority. The workflow runs as a
+    checkpointed LangGraph graph unless use_graph is False or the
+    RESEARCH_WORKFLOW_GRAPH environment variable is "0".
+    """
+
+    def __init__(self, openai_api_key: Optional[str] = None, model: str = "gpt-3.5-turbo",
+                 client=None, search_tool=None, governor: Optional[RequestGovernor] = None,
+                 priority: int = PRIORITY_INTERACTIVE, use_graph: Optional[bool] = None):
+        self.openai_api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
+        self.model = model
+        self.governor = governor or get_default_governor()
+        self.client = GovernedChatClient(
+            client or create_pooled_openai_client(self.openai_api_key),
+            self.governor,
+            priority=priority
+        )
+        self._warmed_up = False
+        self._lock = threading.Lock()
+
+        self.research_agent = ResearchAgent(search_tool=search_tool)
+        self.research_agent.search_tool = GovernedSearchTool(
+            self.research_agent.search_tool,
+            self.governor,
+            priority=priority
+        )
+        self.analysis_agent = AnalysisAgent(api_key=self.openai_api_key, model=model, client=self.client)
+        self.drafting_agent = DraftingAgent(api_key=self.openai_api_key, model=model, client=self.client)
+        self.literature_review_agent = LiteratureReviewAgent(api_key=self.openai_api_key, model=model, client=self.client)
+        self.research_gaps_agent = ResearchGapsAgent(api_key=self.openai_api_key, model=model, client=self.client)
+
+        self.workflow = create_research_workflow(
+            research_agent_instance=self.research_agent,
+            analysis_agent_instance=self.analysis_agent,
+            drafting_agent_instance=self.drafting_agent,
+            literature_review_agent_instance=self.literature_review_agent,
+            research_gaps_agent_instance=self.research_gaps_agent,
+            use_graph=os.getenv("RESEARCH_WORKFLOW_GRAPH", "1") != "0" if use_graph is None else use_graph
+        )
+
+    def warm_up(self, ping_api: bool = True):
+        """Pay cold-start costs up front so the first user request does not
+
+        Opens the completion and search caches, loads the tokenizer and, if
+        ping_api is set, opens a pooled connection to the OpenAI API with a
+        request that does not consume tokens.
+        """
+        with self._lock:
+            if self._warmed_up:
+                return True
+
+            get_default_cache()
+            get_default_search_cache()
+            count_tokens("warm up", self.model)
+
+            if ping_api:
+                try:
+                    self.client.models.retrieve(self.model)
+                except Exception as e:
+                    print(f"AgentRegistry: Warm-up request failed: {str(e)}")
+
+            self._warmed_up = True
+            return True
@@ -2,30 +2,38 @@ from langchain_community.tools.tavily_search import TavilySearchResults
 from langchain_core.tools import tool
 from dotenv import load_dotenv
 import os
-import PyPDF2
-import tempfile
+import asyncio
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utils.pdf_ingestion import PdfExtractionCache, chunk_pages, extract_pages, file_sha256, get_default_pdf_cache
+from utils.search_cache import SearchCache, get_default_search_cache
+from utils.source_store import SourceStore
 
 # Load environment variables
 load_dotenv()
 
 class ResearchAgent:
-    def __init__(self):
+    def __init__(self, search_cache: Optional[SearchCache] = None, use_search_cache: bool = True,
+                 search_tool=None):
         # Debug: Print Tavily API key status
         tavily_api_key = os.getenv("TAVILY_API_KEY")
         print(f"ResearchAgent: Tavily API key {'is set' if tavily_api_key else 'is not set'}")
         
-        # Initialize the Tavily search tool
-        self.search_tool = TavilySearchResults(
+        # Initialize the Tavily search tool unless one was injected
+        self.search_tool = search_tool or TavilySearchResults(
             tavily_api_key=tavily_api_key,
             max_results=5,
             search_depth="advanced"  # Use advanced search for better results
         )
         
-        # Initialize sources storage
-        self.sources = []
+        # Cache search results across calls and process restarts
+        self.search_cache = (search_cache or get_default_search_cache()) if use_search_cache else None
+        
+        # Initialize sources storage (indexed by normalized URL, title and content similarity, thread-safe)
+        self.sources = SourceStore()
         
         # Academic domains to prioritize
         self.academic_domains = [
@@ -44,32 +52,77 @@ class ResearchAgent:
         """Perform web research on a given query, optionally focusing only on research papers"""
         print(f"ResearchAgent: Starting research for query: {query}")
         try:
+            original_query = query
+            include_domains = self.academic_domains if paper_only else None
+            
             # Modify query to focus on research papers if requested
             if paper_only:
                 query = f"{query} research paper academic journal"
             
             # Use the search tool with academic domains
-            search_results = self.search_tool.invoke(
-                query,
-                include_domains=self.academic_domains if paper_only else None
-            )
+            def fetch():
+                return self.search_tool.invoke(
+                    query,
+                    include_domains=include_domains
+                )
+            
+            if self.search_cache is not None:
+                search_results = self.search_cache.fetch(
+                    original_query,
+                    fetch,
+                    paper_only=paper_only,
+                    domains=include_domains
+                )
+            else:
+                search_results = fetch()
+            
+            print(f"ResearchAgent: Search successful, found {len(search_results)} results")
+            
+            return {
+                "success": True,
+                "results": search_results,
+                "sources": self._store_results(search_results),
+                "query": query
+            }
+        except Exception as e:
+            print(f"ResearchAgent: Search failed with error: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e),
+                "query": query
+            }
+    
+    async def research_async(self, query, paper_only=False):
+        """Async version of research that awaits the search tool instead of blocking a thread"""
+        print(f"ResearchAgent: Starting async research for query: {query}")
+        try:
+            original_query = query
+            include_domains = self.academic_domains if paper_only else None
+            
+            if paper_only:
+                query = f"{query} research paper academic journal"
+            
+            async def fetch():
+                if hasattr(self.search_tool, "ainvoke"):
+                    return await self.search_tool.ainvoke(query, include_domains=include_domains)
+                return await asyncio.to_thread(self.search_tool.invoke, query, include_domains=include_domains)
+            
+            if self.search_cache is not None:
+                search_results = await self.search_cache.fetch_async(
+                    original_query,
+                    fetch,
+                    paper_only=paper_only,
+                    domains=include_domains
+                )
+            else:
+                search_results = await fetch()
             
             print(f"ResearchAgent: Search successful, found {len(search_results)} results")
             
-            # Process and store sources
-            for result in search_results:
-                source = {
-                    "title": result.get("title", ""),
-                    "url": result.get("url", ""),
-                    "content": result.get("content", ""),
-                    "score": result.get("score", 0),
-                    "date_accessed": datetime.now().strftime("%Y-%m-%d")
-                }
-                self._add_source(source)
-                
             return {
                 "success": True,
                 "results": search_results,
+                "sources": self._store_results(search_results),
                 "query": query
             }
         except Exception as e:
@@ -80,47 +133,190 @@ class ResearchAgent:
                 "query": query
             }
     
+    def _store_results(self, search_results):
+        """Convert raw search results to this run's sources, merging copies of the same work
+        
+        Each run gets its own store, so concurrent runs and sessions sharing the
+        agent neither see each other's sources nor grow a process-wide index.
+        """
+        run_sources = SourceStore()
+        for result in search_results:
+            run_sources.add({
+                "title": result.get("title", ""),
+                "url": result.get("url", ""),
+                "content": result.get("content", ""),
+                "score": result.get("score", 0),
+                "date_accessed": datetime.now().strftime("%Y-%m-%d")
+            })
+        return run_sources.to_list()
+    
     
     
+    def add_pdf_source(self, pdf, title=None, pdf_cache: Optional[PdfExtractionCache] = None):
+        """Add a local or uploaded PDF as a source, keeping the opening text as its content"""
+        try:
+            title = title or os.path.splitext(os.path.basename(str(getattr(pdf, "name", pdf))))[0]
+            file_hash = file_sha256(pdf)
+            # Only the first chunk is needed, so extraction stops after the opening pages; a
+            # cached document is reused, but these pages are not cached as if it were complete
+            pages = extract_pages(pdf, cache=pdf_cache or get_default_pdf_cache(), file_hash=file_hash, store=False)
+            opening = next(chunk_pages(pages, max_tokens=800, overlap_tokens=0), None)
+            pages.close()
+            
+            source = {
+                "title": title,
+                "url": "",
+                "content": opening["text"] if opening else "",
+                "score": 1.0,
+                "file_hash": file_hash,
+                "date_accessed": datetime.now().strftime("%Y-%m-%d")
+            }
+            source_id = self.sources.add(source)
+            return {
+                "success": True,
+                "source": source,
+                "source_id": source_id,
+                "added": source_id is not None
+            }
+        except Exception as e:
+            print(f"ResearchAgent: PDF ingestion failed with error: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
     def get_sources(self):
         """Get all collected sources"""
-        return self.sources
+        return self.sources.to_list()
+    
+    def similar_sources(self, query, k=5):
+        """Get the k collected sources most similar to a query or source"""
+        return self.sources.similar_sources(query, k=k)
     
     
     def clear_sources(self):
         """Clear all sources"""
-        self.sources = []
+        self.sources.clear()
         return True
     
-    def remove_source(self, index):
-        """Remove a specific source by index"""
-        if 0 <= index < len(self.sources):
-            self.sources.pop(index)
-            return True
-        return False
-    
-    def _add_source(self, source):
-        """Add a source if not already present"""
-        # Check if source is already in the list by URL
-        for existing_source in self.sources:
-            if existing_source.get("url") == source.get("url"):
-                return False
-        
-        self.sources.append(source)
-        return True
+    def remove_source(self, source_id):
+        """Remove a specific source by its ID"""
+        return self.sources.remove(source_id)
     
 
-    def search_by_topics(self, topics):
-        """Perform targeted research on specific topics"""
+    def search_by_topics(self, topics, concurrent=False, max_workers=4, timeout=None):
+        """Perform targeted research on specific topics, optionally in parallel"""
         print(f"ResearchAgent: Researching specific topics: {topics}")
+        
+        if not concurrent:
+            results = {}
+            for topic in topics:
+                query = f"{topic} research paper recent findings"
+                topic_results = self.research(query, paper_only=True)
+                results[topic] = topic_results
+                
+            return {
+                "success": True,
+                "topic_results": results
+            }
+        
         results = {}
+        merged_results = []
+        seen_urls = set()
+        for topic, topic_results in self.iter_topic_results(topics, max_workers=max_workers, timeout=timeout):
+            results[topic] = topic_results
+            # Merge and deduplicate by URL as results arrive
+            for result in topic_results.get("results", []):
+                url = result.get("url")
+                if url in seen_urls:
+                    continue
+                seen_urls.add(url)
+                merged_results.append(result)
         
-        for topic in topics:
+        return {
+            "success": True,
+            "topic_results": results,
+            "merged_results": merged_results
+        }
+    
+    async def search_by_topics_async(self, topics, max_concurrent=4, timeout=None):
+        """Research topics concurrently on the event loop, merging results deduplicated by URL"""
+        print(f"ResearchAgent: Researching specific topics: {topics}")
+        semaphore = asyncio.Semaphore(max_concurrent)
+        
+        async def run_topic(topic):
             query = f"{topic} research paper recent findings"
-            topic_results = self.research(query, paper_only=True)
-            results[topic] = topic_results
-            
+            async with semaphore:
+                try:
+                    return await asyncio.wait_for(self.research_async(query, paper_only=True), timeout)
+                except asyncio.TimeoutError:
+                    return {
+                        "success": False,
+                        "error": f"Search timed out after {timeout} seconds",
+                        "query": topic
+                    }
+        
+        topic_results = await asyncio.gather(*[run_topic(topic) for topic in topics])
+        
+        results = {}
+        merged_results = []
+        seen_urls = set()
+        for topic, result in zip(topics, topic_results):
+            results[topic] = result
+            for item in result.get("results", []):
+                url = item.get("url")
+                if url in seen_urls:
+                    continue
+                seen_urls.add(url)
+                merged_results.append(item)
+        
         return {
             "success": True,
-            "topic_results": results
-        }
\ No newline at end of file
+            "topic_results": results,
+            "merged_results": merged_results
+        }
+    
+    def iter_topic_results(self, topics, max_workers=4, timeout=None):
+        """Yield (topic, results) pairs as each topic search completes
+        
+        Searches run in a bounded thread pool. If timeout is set, a topic whose
+        search has been running longer than timeout seconds is yielded as a
+        failed result instead of blocking the remaining topics.
+        """
+        started = {}
+        
+        def run_topic(topic):
+            started[topic] = time.monotonic()
+            query = f"{topic} research paper recent findings"
+            return self.research(query, paper_only=True)
+        
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            pending = {executor.submit(run_topic, topic): topic for topic in topics}
+            
+            while pending:
+                done, _ = wait(pending, timeout=0.05 if timeout else None, return_when=FIRST_COMPLETED)
+                
+                for future in done:
+                    topic = pending.pop(future)
+                    try:
+                        yield topic, future.result()
+                    except Exception as e:
+                        yield topic, {"success": False, "error": str(e), "query": topic}
+                
+                if timeout is None:
+                    continue
+                
+                now = time.monotonic()
+                for future, topic in list(pending.items()):
+                    if topic in started and now - started[topic] > timeout:
+                        pending.pop(future)
+                        future.cancel()
+                        yield topic, {
+                            "success": False,
+                            "error": f"Search timed out after {timeout} seconds",
+                            "query": topic
+                        }
+        finally:
+            # Do not block on timed-out searches that are still running
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -1,11 +1,205 @@
-from typing import Dict, Any
-from openai import OpenAI
+from typing import Dict, Any, List, Optional
+from utils.completion_cache import CompletionCache, build_chat_client
+from utils.async_client import AsyncClientMixin
+from utils.prompt_packing import pack_sources
+from utils.research_gaps import clean_gap, diff_paragraphs, format_gaps, review_digest, split_paragraphs
+from utils.source_store import make_source_id
+from utils.streaming import iter_completion_text
+from utils.structured_output import parse_json_object
 
-class ResearchGapsAgent:
-    def __init__(self, api_key: str, model: str = "gpt-3.5-turbo"):
+def _source_id(source):
+    return source.get("id") or make_source_id(source)
+
+# Removed sources are listed by title only, up to this many
+MAX_REMOVED_TITLES = 50
+
+GAP_ITEM_FORMAT = '{"title": "short name of the gap", "description": "one or two sentences", "priority": "high|medium|low"}'
+
+class ResearchGapsAgent(AsyncClientMixin):
+    def __init__(self, api_key: str, model: str = "gpt-3.5-turbo", client=None,
+                 cache: Optional[CompletionCache] = None, use_cache: bool = True, async_client=None):
         """Initialize the Research Gaps Agent with OpenAI API key"""
-        self.client = OpenAI(api_key=api_key)
+        self.client = build_chat_client(api_key, client=client, cache=cache, use_cache=use_cache)
         self.model = model
+        self.api_key = api_key
+        self._async_client = async_client
+        self._cache = cache
+        self._use_cache = use_cache
+    
+    def _gaps_prompt(self, literature_review: str):
+        return (
+            "You are a Research Gaps Analysis Agent.\n"
+            "Based on the following literature review, identify and analyze research gaps:\n\n"
+            f"{literature_review}\n\n"
+            "Your analysis should:\n"
+            "1. Identify areas where research is lacking or insufficient\n"
+            "2. Highlight methodological limitations in existing studies\n"
+            "3. Suggest promising directions for future research\n"
+            "4. Prioritize gaps by importance and feasibility\n"
+            "5. Consider interdisciplinary connections and opportunities\n\n"
+            "Format your response with clear sections and bullet points for each gap."
+        )
+    
+    def _full_gaps_prompt(self, literature_review: str):
+        return (
+            "You are a Research Gaps Analysis Agent.\n"
+            "Based on the following literature review, identify research gaps: areas where research is "
+            "lacking, methodological limitations of existing studies and promising directions for future work.\n\n"
+            f"{literature_review}\n\n"
+            "Respond with a JSON object of the form "
+            f'{{"gaps": [{GAP_ITEM_FORMAT}]}}, most important gaps first.'
+        )
+    
+    def _delta_gaps_prompt(self, open_gaps: List[Dict[str, Any]], changes: str):
+        known = "\n".join(f"- {gap['id']}: {gap['title']}" for gap in open_gaps) or "(none)"
+        return (
+            "You are a Research Gaps Analysis Agent maintaining a list of research gaps for a literature review.\n"
+            f"Known open gaps:\n{known}\n\n"
+            f"{changes}\n\n"
+            "Based only on these changes, report which known gaps are now addressed by the literature and "
+            "which new gaps the changes reveal. Do not repeat known gaps.\n"
+            "Respond with a JSON object of the form "
+            f'{{"resolved": ["IDs of known gaps"], "new": [{GAP_ITEM_FORMAT}]}}.'
+        )
+    
+    def _source_changes(self, sources: List[Dict[str, Any]], previous_sources: Dict[str, str]) -> Optional[str]:
+        current = {_source_id(source): source for source in sources}
+        added = [source for source_id, source in current.items() if source_id not in previous_sources]
+        removed = [title for source_id, title in previous_sources.items() if source_id not in current]
+        if not added and not removed:
+            return None
+        print(f"ResearchGapsAgent: {len(added)} sources added, {len(removed)} removed since the last update")
+        # A large import is packed into the model's source budget, most relevant sources first
+        packed = pack_sources(added, model=self.model, fields=["title", "authors", "year"], max_content_tokens=150)
+        if packed["dropped"]:
+            print(f"ResearchGapsAgent: {packed['dropped']} added sources did not fit the prompt")
+        changes = "Sources added to the literature:\n\n" + (packed["text"] or "(none)")
+        if removed:
+            changes += "\n\nSources removed from the literature:\n" + "\n".join(
+                f"- {title}" for title in removed[:MAX_REMOVED_TITLES]
+            )
+            if len(removed) > MAX_REMOVED_TITLES:
+                changes += f"\n- ...and {len(removed) - MAX_REMOVED_TITLES} more"
+        return changes
+    
+    def _review_changes(self, literature_review: str, previous: Dict[str, Any],
+                        max_delta_share: float) -> Optional[str]:
+        paragraphs = split_paragraphs(literature_review)
+        added, removed = diff_paragraphs(previous.get("paragraphs", []), paragraphs)
+        if not added and not removed:
+            return None
+        print(f"ResearchGapsAgent: {len(added)} paragraphs added, {len(removed)} removed since the last review")
+        if len(added) > max_delta_share * max(1, len(paragraphs)):
+            # A mostly rewritten review is sent whole; gaps still keep their IDs
+            return f"The literature review was largely rewritten. Current review:\n\n{literature_review}"
+        changes = "Paragraphs added to the literature review:\n\n" + ("\n\n".join(added) or "(none)")
+        if removed:
+            changes += "\n\nParagraphs removed from the literature review:\n\n" + "\n\n".join(removed)
+        return changes
+    
+    def _request_gaps(self, prompt: str) -> Dict[str, Any]:
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            response_format={"type": "json_object"}
+        )
+        data = parse_json_object(response.choices[0].message.content or "")
+        if data is None:
+            raise ValueError("Research gaps response was not a JSON object")
+        return data
+    
+    def update_research_gaps(self, literature_review: str, previous: Optional[Dict[str, Any]] = None,
+                             sources: Optional[List[Dict[str, Any]]] = None, max_delta_share: float = 0.6):
+        """Update a structured list of research gaps from what changed since the previous update
+        
+        previous is the gaps_state of an earlier call. Gaps keep their IDs across
+        updates. With sources, the change is the set of source IDs: only the
+        content of added sources (and the titles of removed ones) is sent, so a
+        regenerated, reworded review costs nothing extra. Without sources the
+        review paragraphs are diffed instead. Unchanged input is answered from
+        previous without a request.
+        """
+        try:
+            if not literature_review:
+                return {
+                    "success": False,
+                    "error": "No literature review provided for gap analysis."
+                }
+            
+            previous = previous or {}
+            digest = review_digest(literature_review)
+            source_titles = None
+            if sources is not None:
+                source_titles = {_source_id(source): source.get("title") or "Untitled" for source in sources}
+            
+            unchanged = previous.get("review_digest") == digest
+            if source_titles is not None and "sources" in previous:
+                unchanged = set(source_titles) == set(previous["sources"])
+            if unchanged:
+                print("ResearchGapsAgent: Input unchanged, reusing research gaps")
+                return {
+                    "success": True,
+                    "research_gaps": format_gaps(previous.get("gaps", [])),
+                    "gaps_state": previous,
+                    "new_gaps": [],
+                    "resolved_gaps": [],
+                    "cached": True
+                }
+            
+            gaps = [dict(gap) for gap in previous.get("gaps", [])]
+            open_gaps = [gap for gap in gaps if gap.get("status") != "resolved"]
+            next_id = previous.get("next_id", 1)
+            data = {}
+            if "review_digest" not in previous:
+                data = {"new": self._request_gaps(self._full_gaps_prompt(literature_review)).get("gaps", [])}
+            else:
+                if source_titles is not None and "sources" in previous:
+                    changes = self._source_changes(sources, previous["sources"])
+                else:
+                    changes = self._review_changes(literature_review, previous, max_delta_share)
+                if changes:
+                    data = self._request_gaps(self._delta_gaps_prompt(open_gaps, changes))
+            
+            resolved_ids = {str(gap_id).strip() for gap_id in data.get("resolved") or []}
+            resolved = []
+            for gap in open_gaps:
+                if gap["id"] in resolved_ids:
+                    gap["status"] = "resolved"
+                    resolved.append(gap["id"])
+            
+            known_titles = {gap["title"].lower() for gap in gaps}
+            new = []
+            for item in data.get("new") or []:
+                gap = clean_gap(item)
+                if gap is None or gap["title"].lower() in known_titles:
+                    continue
+                gap.update(id=f"G{next_id}", status="open")
+                next_id += 1
+                known_titles.add(gap["title"].lower())
+                gaps.append(gap)
+                new.append(gap["id"])
+            
+            gaps_state = {
+                "review_digest": digest,
+                "paragraphs": split_paragraphs(literature_review),
+                "gaps": gaps,
+                "next_id": next_id
+            }
+            if source_titles is not None:
+                gaps_state["sources"] = source_titles
+            return {
+                "success": True,
+                "research_gaps": format_gaps(gaps),
+                "gaps_state": gaps_state,
+                "new_gaps": new,
+                "resolved_gaps": resolved,
+                "cached": False
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
     
     def identify_research_gaps(self, literature_review: str):
         """Identify research gaps based on the literature review."""
@@ -16,18 +210,7 @@ class ResearchGapsAgent:
                     "error": "No literature review provided for gap analysis."
                 }
             
-            prompt = (
-                "You are a Research Gaps Analysis Agent.\n"
-                "Based on the following literature review, identify and analyze research gaps:\n\n"
-                f"{literature_review}\n\n"
-                "Your analysis should:\n"
-                "1. Identify areas where research is lacking or insufficient\n"
-                "2. Highlight methodological limitations in existing studies\n"
-                "3. Suggest promising directions for future research\n"
-                "4. Prioritize gaps by importance and feasibility\n"
-                "5. Consider interdisciplinary connections and opportunities\n\n"
-                "Format your response with clear sections and bullet points for each gap."
-            )
+            prompt = self._gaps_prompt(literature_review)
             
             response = self.client.chat.completions.create(
                 model=self.model,
@@ -42,4 +225,43 @@ class ResearchGapsAgent:
             return {
                 "success": False,
                 "error": str(e)
-            } 
\ No newline at end of file
+            }
+    
+    async def identify_research_gaps_async(self, literature_review: str):
+        """Identify research gaps without blocking the event loop"""
+        try:
+            if not literature_review:
+                return {
+                    "success": False,
+                    "error": "No literature review provided for gap analysis."
+                }
+            
+            response = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": self._gaps_prompt(literature_review)}]
+            )
+            
+            return {
+                "success": True,
+                "research_gaps": response.choices[0].message.content
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    def identify_research_gaps_stream(self, literature_review: str):
+        """Identify research gaps, yielding text chunks as they are generated
+        
+        Errors are raised from the generator instead of being returned as a dict.
+        """
+        if not literature_review:
+            raise ValueError("No literature review provided for gap analysis.")
+        
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": self._gaps_prompt(literature_review)}],
+            stream=True
+        )
+        yield from iter_completion_text(stream)
\ No newline at end of file
@@ -0,0 +1,259 @@
+"""
+Headless HTTP API for the research workflow.
+
+Every endpoint that calls an LLM or the search API queues a job and returns
+202 with the job ID. Clients poll GET /api/jobs/<id> or stream partial results
+from GET /api/jobs/<id>/events as server-sent events. Jobs run on a worker
+pool sized by API_JOB_WORKERS, independently of the web server threads.
+Requests with "priority": "batch" give way to interactive jobs for API quota.
+
+Run with: python api_server.py
+"""
+import json
+import os
+from flask import Flask, Response, jsonify, request
+from flask_cors import CORS
+from dotenv import load_dotenv
+from utils.job_queue import JobQueue
+from utils.request_governor import PRIORITY_BATCH, PRIORITY_INTERACTIVE, request_priority
+from utils.source_store import SourceStore
+
+SSE_HEARTBEAT_SECONDS = 15.0
+
+
+def _sse(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _require(payload, field):
+    if not payload.get(field):
+        raise ValueError(f"Missing required field: {field}")
+    return payload[field]
+
+
+def _check_step(state, success_status):
+    """Raise if an engine step did not end in its success status"""
+    if state.get("status") != success_status:
+        raise RuntimeError(state.get("error") or f"Step ended with status {state.get('status')}")
+    return state
+
+
+def run_workflow_job(engine, job, params):
+    """Run search, analysis and drafting, then optionally the post-search stage, emitting chunks"""
+    state = {
+        "question": params["question"],
+        "paper_only": params.get("paper_only", False),
+        "citation_style": params.get("citation_style", "APA"),
+        "search_results": [],
+        "analysis": "",
+        "answer": "",
+        "needs_more_research": False,
+        "status": "started",
+        "run_id": job.id
+    }
+
+    for field, chunk in engine.execute_workflow_stream(state):
+        if field == "state":
+            state = chunk
+        else:
+            job.emit(field, chunk)
+    job.emit("status", {"status": state["status"], "sources": len(state.get("sources", []))})
+
+    if state["status"] != "workflow_complete":
+        raise RuntimeError(state.get("error") or f"Workflow ended with status {state['status']}")
+
+    if params.get("post_search", True):
+        for field, chunk in engine.stream_post_search_stage(state, params.get("style", "thematic"),
+                                                            map_reduce_threshold=params.get("map_reduce_threshold", 24)):
+            if field == "state":
+                state = chunk
+            else:
+                job.emit(field, chunk)
+
+    state.pop("search_results", None)
+    return state
+
+
+def _job_sources(params):
+    """Client-supplied sources with copies of the same work merged, as a workflow run would have them"""
+    return SourceStore(params["sources"]).to_list()
+
+
+def run_literature_review_job(engine, job, params):
+    sources = _job_sources(params)
+    style = params.get("style", "thematic")
+    agent = engine.literature_review_agent
+
+    # Stream single-pass reviews; larger source sets take the hierarchical path
+    if hasattr(agent, "generate_literature_review_stream") and len(sources) <= params.get("map_reduce_threshold", 24):
+        chunks = []
+        for chunk in agent.generate_literature_review_stream(sources, style):
+            chunks.append(chunk)
+            job.emit("literature_review", chunk)
+        return {"literature_review": "".join(chunks)}
+
+    state = _check_step(engine.generate_literature_review({"sources": sources}, style), "literature_review_generated")
+    return {"literature_review": state["literature_review"]}
+
+
+def run_research_gaps_job(engine, job, params):
+    literature_review = params["literature_review"]
+    agent = engine.research_gaps_agent
+
+    if hasattr(agent, "identify_research_gaps_stream"):
+        chunks = []
+        for chunk in agent.identify_research_gaps_stream(literature_review):
+            chunks.append(chunk)
+            job.emit("research_gaps", chunk)
+        return {"research_gaps": "".join(chunks)}
+
+    state = _check_step(engine.identify_research_gaps({"literature_review": literature_review}),
+                        "research_gaps_identified")
+    return {"research_gaps": state["research_gaps"]}
+
+
+def run_summary_table_job(engine, job, params):
+    state = _check_step(engine.update_paper_summary_table({
+        "sources": _job_sources(params),
+        "paper_summary_rows": params.get("paper_summary_rows", {})
+    }), "summary_table_generated")
+    return {"paper_summary_table": state["paper_summary_table"], "paper_summary_rows": state["paper_summary_rows"]}
+
+
+def run_references_job(engine, job, params):
+    state = _check_step(engine.update_references_list({
+        "sources": _job_sources(params),
+        "citation_style": params.get("citation_style", "APA"),
+        "reference_entries": params.get("reference_entries", {}),
+        "citation_llm_fallback": params.get("citation_llm_fallback", False)
+    }), "references_list_generated")
+    return {"references_list": state["references_list"], "reference_entries": state.get("reference_entries", {})}
+
+
+# Job kind -> (runner, required fields)
+JOB_TYPES = {
+    "workflow": (run_workflow_job, ["question"]),
+    "literature_review": (run_literature_review_job, ["sources"]),
+    "research_gaps": (run_research_gaps_job, ["literature_review"]),
+    "summary_table": (run_summary_table_job, ["sources"]),
+    "references": (run_references_job, ["sources"]),
+}
+
+
+def create_app(engine=None, job_queue=None):
+    """Create the Flask app for a workflow engine, building the default agents if none is given"""
+    if engine is None:
+        from agents.registry import AgentRegistry
+        registry = AgentRegistry(openai_api_key=os.getenv("OPENAI_API_KEY"))
+        registry.warm_up()
+        engine = registry.workflow["engine"]
+
+    job_queue = job_queue or JobQueue(max_workers=int(os.getenv("API_JOB_WORKERS", 4)))
+
+    app = Flask(__name__)
+    CORS(app)
+    app.config["ENGINE"] = engine
+    app.config["JOB_QUEUE"] = job_queue
+
+    def submit(kind):
+        runner, required = JOB_TYPES[kind]
+        params = request.get_json(silent=True) or {}
+        try:
+            for field in required:
+                _require(params, field)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # Batch jobs yield to interactive ones when the API rate limits are contended
+        priority = PRIORITY_BATCH if params.get("priority") == "batch" else PRIORITY_INTERACTIVE
+
+        def run(job):
+            with request_priority(priority):
+                return runner(engine, job, params)
+
+        job = job_queue.submit(kind, run, params)
+        return jsonify({
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"/api/jobs/{job.id}",
+            "events_url": f"/api/jobs/{job.id}/events"
+        }), 202
+
+    @app.get("/api/health")
+    def health():
+        return jsonify({"status": "ok", **job_queue.stats()})
+
+    @app.post("/api/workflow")
+    def workflow():
+        return submit("workflow")
+
+    @app.post("/api/literature-review")
+    def literature_review():
+        return submit("literature_review")
+
+    @app.post("/api/research-gaps")
+    def research_gaps():
+        return submit("research_gaps")
+
+    @app.post("/api/summary-table")
+    def summary_table():
+        return submit("summary_table")
+
+    @app.post("/api/references")
+    def references():
+        return submit("references")
+
+    @app.get("/api/jobs")
+    def list_jobs():
+        return jsonify({"jobs": [job.to_dict(include_result=False) for job in job_queue.list()]})
+
+    @app.get("/api/jobs/<job_id>")
+    def get_job(job_id):
+        job = job_queue.get(job_id)
+        if job is None:
+            return jsonify({"error": f"Unknown job: {job_id}"}), 404
+        return jsonify(job.to_dict())
+
+    @app.get("/api/jobs/<job_id>/events")
+    def job_events(job_id):
+        job = job_queue.get(job_id)
+        if job is None:
+            return jsonify({"error": f"Unknown job: {job_id}"}), 404
+
+        # Resume after the last event the client saw when it reconnects
+        last_event_id = request.headers.get("Last-Event-ID", request.args.get("after"))
+        try:
+            start = max(0, int(last_event_id) + 1) if last_event_id not in (None, "") else 0
+        except ValueError:
+            return jsonify({"error": f"Invalid event ID: {last_event_id}"}), 400
+
+        def stream():
+            for index, event, data in job.iter_events(start, heartbeat=SSE_HEARTBEAT_SECONDS):
+                if event == "heartbeat":
+                    yield ": heartbeat\n\n"
+                else:
+                    yield _sse(event, data, index)
+            yield _sse("done", job.to_dict())
+
+        return Response(stream(), mimetype="text/event-stream", headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        })
+
+    return app
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    app = create_app()
+    # Web threads only accept requests and stream events; jobs run on the JobQueue workers
+    app.run(
+        host=os.getenv("API_HOST", "127.0.0.1"),
+        port=int(os.getenv("API_PORT", 8000)),
+        threaded=True
+    )
@@ -2,15 +2,32 @@ import streamlit as st
 import os
 import pandas as pd
 from dotenv import load_dotenv
-from agents.research_agent import ResearchAgent
-from agents.analysis_agent import AnalysisAgent
-from agents.drafting_agent import DraftingAgent
-from agents.literature_review_agent import LiteratureReviewAgent
-from agents.research_gaps_agent import ResearchGapsAgent
-from workflows.research_graph import create_research_workflow
+from agents.registry import AgentRegistry
+from utils.project_library import get_default_library
+from utils.source_browser import render_source_details, source_label
+from utils.source_store import SourceStore
+from workflows.pdf_import import PdfBulkImporter
+
+@st.cache_resource(show_spinner=False)
+def load_environment():
+    """Load environment variables once per process"""
+    load_dotenv()
+    return True
+
+@st.cache_resource(show_spinner=False)
+def get_agent_registry():
+    """Build the agents and the workflow once per process and warm them up"""
+    registry = AgentRegistry(openai_api_key=os.getenv('OPENAI_API_KEY'))
+    registry.warm_up()
+    return registry
+
+@st.cache_resource(show_spinner="Loading project sources...")
+def get_project_store(project_id):
+    """Build the in-memory source store of a project once per process, only when a search or import needs it"""
+    return SourceStore(get_default_library().iter_sources(project_id))
 
 # Load environment variables
-load_dotenv()
+load_environment()
 
 # Check API keys
 if not os.getenv("OPENAI_API_KEY"):
@@ -21,37 +38,91 @@ if not os.getenv("TAVILY_API_KEY"):
     st.error("Tavily API key not found. Please set TAVILY_API_KEY in your .env file.")
     st.stop()
 
-# Initialize session state
-if 'sources' not in st.session_state:
-    st.session_state.sources = []
-if 'citation_style' not in st.session_state:
-    st.session_state.citation_style = "APA"
-if 'literature_review' not in st.session_state:
-    st.session_state.literature_review = ""
-if 'research_gaps' not in st.session_state:
-    st.session_state.research_gaps = ""
-if 'references_list' not in st.session_state:
-    st.session_state.references_list = ""
-if 'search_completed' not in st.session_state:
-    st.session_state.search_completed = False
-if 'paper_summary_table' not in st.session_state:
-    st.session_state.paper_summary_table = ""
+# Get agents and workflow, built once per process and reused across reruns
+agent_registry = get_agent_registry()
+literature_review_agent = agent_registry.literature_review_agent
+research_gaps_agent = agent_registry.research_gaps_agent
+research_workflow = agent_registry.workflow
 
-# Initialize agents
-research_agent = ResearchAgent()
-analysis_agent = AnalysisAgent(api_key=os.getenv('OPENAI_API_KEY'))
-drafting_agent = DraftingAgent(api_key=os.getenv('OPENAI_API_KEY'))
-literature_review_agent = LiteratureReviewAgent(api_key=os.getenv('OPENAI_API_KEY'))
-research_gaps_agent = ResearchGapsAgent(api_key=os.getenv('OPENAI_API_KEY'))
+# Sources, runs and artefacts persist per project; the session only remembers the open project
+library = get_default_library()
 
-# Create workflow
-research_workflow = create_research_workflow(
-    research_agent_instance=research_agent,
-    analysis_agent_instance=analysis_agent,
-    drafting_agent_instance=drafting_agent,
-    literature_review_agent_instance=literature_review_agent,
-    research_gaps_agent_instance=research_gaps_agent
-)
+ARTEFACT_DEFAULTS = {
+    "citation_style": "APA",
+    "literature_review": "",
+    "research_gaps": "",
+    "research_gaps_state": {},
+    "references_list": "",
+    "paper_summary_table": "",
+    "paper_summary_rows": {},
+    "reference_entries": {}
+}
+
+def open_project(project_id):
+    """Switch the session to a project, restoring its saved artefacts without loading its sources"""
+    st.session_state.project_id = project_id
+    artefacts = library.load_artefacts(project_id)
+    for kind, default in ARTEFACT_DEFAULTS.items():
+        st.session_state[kind] = artefacts.get(kind, default)
+    st.session_state.search_completed = bool(artefacts)
+
+def save_artefacts(**artefacts):
+    """Update artefacts in the session and persist them to the open project"""
+    for kind, value in artefacts.items():
+        st.session_state[kind] = value
+    library.save_artefacts(st.session_state.project_id, **artefacts)
+
+def project_sources():
+    return get_project_store(st.session_state.project_id)
+
+def add_project_sources(sources):
+    """Add sources to the open project, persisting new ones and the stored copies duplicates were merged into"""
+    store = project_sources()
+    added = store.add_many(sources)
+    library.add_sources(st.session_state.project_id, [store.get(source_id) for source_id in added])
+    for source in sources:
+        merged = store.find_by_url(source.get("url", ""))
+        if merged is not None and merged["id"] not in added:
+            library.update_source(st.session_state.project_id, merged)
+    return added
+
+def source_filters(key):
+    """Render year, publication and domain filters for the open project and return them as a dict"""
+    facets = library.source_facets(st.session_state.project_id)
+    filters = {}
+    with st.expander("Filters"):
+        years = facets["years"]
+        if years and years[0] < years[1]:
+            # New sources can move the year range; drop a remembered selection that no longer fits
+            remembered = st.session_state.get(f"{key}_years")
+            if remembered and (remembered[0] < years[0] or remembered[1] > years[1]):
+                del st.session_state[f"{key}_years"]
+            year_from, year_to = st.slider("Year", years[0], years[1], years, key=f"{key}_years")
+            if (year_from, year_to) != tuple(years):
+                filters.update(year_from=year_from, year_to=year_to)
+        for field, label in [("publication", "Publication"), ("domain", "Domain")]:
+            options = [""] + [value for value, _ in facets[f"{field}s"]]
+            if st.session_state.get(f"{key}_{field}") not in options:
+                st.session_state.pop(f"{key}_{field}", None)
+            filters[field] = st.selectbox(label, options, format_func=lambda value: value or "All",
+                                          key=f"{key}_{field}")
+    return filters
+
+def source_page(key, page_size, filters=None):
+    """Render search and paging controls and return (page of sources, offset of the page, total matching)"""
+    query = st.text_input("Search sources", key=f"{key}_query")
+    total = library.count_sources(st.session_state.project_id, query, filters)
+    pages = max(1, -(-total // page_size))
+    # A narrower search or another project may leave the remembered page out of range
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = 1
+    page = st.number_input("Page", min_value=1, max_value=pages, key=f"{key}_page") - 1
+    st.caption(f"{total} sources · page {page + 1} of {pages}")
+    sources = library.page_sources(st.session_state.project_id, page, page_size, query, filters)
+    return sources, page * page_size, total
+
+if 'project_id' not in st.session_state:
+    open_project(library.get_or_create_project("Default project"))
 
 # Set page config
 st.set_page_config(
@@ -65,19 +136,77 @@ st.set_page_config(
 with st.sidebar:
     st.title("Source Management")
     
-    # Display sources
+    # Projects persist sources, runs and generated artefacts across restarts
+    projects = library.list_projects()
+    project_ids = [project["id"] for project in projects]
+    project_labels = {project["id"]: f"{project['name']} ({project['source_count']} sources)" for project in projects}
+    selected_project = st.selectbox(
+        "Project",
+        project_ids,
+        index=project_ids.index(st.session_state.project_id),
+        format_func=project_labels.get
+    )
+    if selected_project != st.session_state.project_id:
+        open_project(selected_project)
+        st.rerun()
+    new_project = st.text_input("New project name:")
+    if st.button("Create Project") and new_project.strip():
+        open_project(library.get_or_create_project(new_project.strip()))
+        st.rerun()
+    
+    # Display one page of sources; the project is never loaded whole for browsing
     st.subheader("Sources")
-    if st.session_state.sources:
-        for i, source in enumerate(st.session_state.sources):
-            st.write(f"{i+1}. {source.get('title', 'Untitled')}")
+    sidebar_sources, offset, source_count = source_page("sidebar_sources", page_size=25)
+    if source_count:
+        for i, source in enumerate(sidebar_sources):
+            st.write(f"{offset + i + 1}. {source.get('title', 'Untitled')}")
     else:
         st.info("No sources added yet.")
     
+    # Bulk import local PDFs into the sources
+    st.subheader("Import PDFs")
+    pdf_folder = st.text_input("Folder of PDF files:")
+    extract_metadata = st.checkbox("Extract titles and abstracts with AI", value=True)
+    if st.session_state.get("pdf_import_summary"):
+        st.success(st.session_state.pdf_import_summary)
+    if st.button("Import PDFs"):
+        if pdf_folder and os.path.isdir(pdf_folder):
+            progress_bar = st.progress(0.0)
+            progress_text = st.empty()
+            
+            def show_import_progress(report):
+                progress_bar.progress(report["done"] / max(report["total"], 1))
+                progress_text.caption(
+                    f"{report['done']}/{report['total']} files · "
+                    f"{report['pages_per_second']:.1f} pages/s · {report['papers_per_second']:.2f} papers/s"
+                )
+            
+            store = project_sources()
+            importer = PdfBulkImporter(store, analysis_agent=agent_registry.analysis_agent)
+            import_report = importer.import_directory(
+                pdf_folder,
+                analyze=extract_metadata,
+                progress=show_import_progress
+            )
+            library.add_sources(
+                st.session_state.project_id,
+                [store.get(item["id"]) for item in import_report["imported"]]
+            )
+            # Rerun so the source list above shows the new sources; the summary survives the rerun
+            st.session_state.pdf_import_summary = (
+                f"Imported {len(import_report['imported'])} PDFs, "
+                f"skipped {len(import_report['skipped'])}, "
+                f"failed {len(import_report['failed'])}."
+            )
+            st.rerun()
+        else:
+            st.warning("Please enter an existing folder.")
+    
     # Display references list in sidebar
     if st.session_state.references_list:
         st.subheader("References")
         st.markdown(st.session_state.references_list)
-    elif st.session_state.sources:
+    elif source_count:
         st.info("References will appear here after selecting a citation style.")
 
 # Main content
@@ -112,73 +241,95 @@ with tab1:
                     "paper_only": True  # Flag to indicate we only want research papers
                 }
                 
-                # Execute research workflow
-                result = research_workflow["execute_workflow"](initial_state)
+                # Execute research workflow, rendering the answer as it is drafted
+                st.subheader("Research Results")
+                answer_placeholder = st.empty()
+                answer_text = ""
+                result = initial_state
+                for event, payload in research_workflow["execute_workflow_stream"](initial_state):
+                    if event == "state":
+                        result = payload
+                    else:
+                        answer_text += payload
+                        answer_placeholder.markdown(answer_text)
+                answer_placeholder.markdown(result["answer"])
+                library.record_run(st.session_state.project_id, result)
                 
                 # Update sources - append new sources instead of replacing
                 if "sources" in result:
-                    # Add new sources to existing ones
-                    new_sources = result["sources"]
-                    existing_titles = [s.get('title') for s in st.session_state.sources]
-                    
-                    # Only add sources that don't already exist
-                    for source in new_sources:
-                        if source.get('title') not in existing_titles:
-                            st.session_state.sources.append(source)
-                    
-                    # Automatically generate references list when sources are updated
-                    if st.session_state.sources:
-                        st.session_state.references_list = research_workflow["generate_references_list"]({
-                            "sources": st.session_state.sources,
-                            "citation_style": st.session_state.citation_style
-                        })["references_list"]
-                
-                # Display results
-                st.subheader("Research Results")
-                st.write(result["answer"])
+                    # Add new sources to the project; the store skips duplicates
+                    add_project_sources(result["sources"])
                 
-                # Display search results
+                # Display search results with short excerpts; all of them are in the project's source list
+                search_results = result.get("search_results", [])
                 with st.expander("View Research Papers"):
-                    for i, result in enumerate(result.get("search_results", [])):
-                        st.write(f"**Paper {i+1}:**")
-                        st.write(f"**Title:** {result.get('title', 'No title')}")
-                        st.write(f"**URL:** {result.get('url', 'No URL')}")
-                        st.write(f"**Content:** {result.get('content', 'No content')}")
-                        st.write("---")
+                    for i, paper in enumerate(search_results[:10]):
+                        st.markdown(f"**{source_label(i + 1, paper)}**")
+                        st.markdown(render_source_details(paper))
+                    if len(search_results) > 10:
+                        st.caption(f"Showing 10 of {len(search_results)} papers. Browse all of them in the References tab.")
                 
-                # Automatically generate literature review
-                with st.spinner("Generating literature review..."):
-                    review_result = literature_review_agent.generate_literature_review(
-                        st.session_state.sources, 
-                        style="thematic"
-                    )
-                    
-                    if review_result["success"]:
-                        st.session_state.literature_review = review_result["literature_review"]
-                    else:
-                        st.warning(f"Failed to generate literature review: {review_result.get('error', 'Unknown error')}")
+                # Stream the literature review and research gaps while references
+                # and the summary table are generated in the background
+                st.subheader("Literature Review")
+                review_placeholder = st.empty()
+                st.subheader("Research Gaps")
+                gaps_placeholder = st.empty()
+                placeholders = {
+                    "literature_review": review_placeholder,
+                    "research_gaps": gaps_placeholder
+                }
+                streamed = {"literature_review": "", "research_gaps": ""}
                 
-                # Automatically identify research gaps
-                with st.spinner("Identifying research gaps..."):
-                    gaps_result = research_gaps_agent.identify_research_gaps(
-                        st.session_state.literature_review
-                    )
+                with st.spinner("Generating references, literature review, research gaps and summary table..."):
+                    post_search_events = research_workflow["stream_post_search_stage"]({
+                        "sources": project_sources().to_list(),
+                        "citation_style": st.session_state.citation_style,
+                        "literature_review": "",
+                        "research_gaps": "",
+                        "research_gaps_state": st.session_state.research_gaps_state,
+                        "paper_summary_table": "",
+                        "references_list": "",
+                        "paper_summary_rows": st.session_state.paper_summary_rows,
+                        "reference_entries": st.session_state.reference_entries,
+                        "status": "started"
+                    })
+                    
+                    post_search_state = {}
+                    for field, payload in post_search_events:
+                        if field == "state":
+                            post_search_state = payload
+                        else:
+                            streamed[field] += payload
+                            placeholders[field].markdown(streamed[field])
                     
-                    if gaps_result["success"]:
-                        st.session_state.research_gaps = gaps_result["research_gaps"]
+                    errors = post_search_state.get("errors", {})
+                    if len(project_sources()) and "references_list" not in errors:
+                        save_artefacts(
+                            references_list=post_search_state["references_list"],
+                            reference_entries=post_search_state["reference_entries"]
+                        )
+                    
+                    if "literature_review" in errors:
+                        st.warning(f"Failed to generate literature review: {errors['literature_review']}")
                     else:
-                        st.warning(f"Failed to identify research gaps: {gaps_result.get('error', 'Unknown error')}")
-                
-                # Generate paper summary table
-                with st.spinner("Generating paper summary table..."):
-                    summary_result = literature_review_agent.create_paper_summary_table(
-                        st.session_state.sources
-                    )
+                        save_artefacts(literature_review=post_search_state["literature_review"])
                     
-                    if summary_result["success"]:
-                        st.session_state.paper_summary_table = summary_result["summary_table"]
+                    if "research_gaps" in errors:
+                        st.warning(f"Failed to identify research gaps: {errors['research_gaps']}")
+                    elif "literature_review" not in errors:
+                        save_artefacts(
+                            research_gaps=post_search_state["research_gaps"],
+                            research_gaps_state=post_search_state.get("research_gaps_state", {})
+                        )
+                    
+                    if "paper_summary_table" in errors:
+                        st.warning(f"Failed to generate paper summary table: {errors['paper_summary_table']}")
                     else:
-                        st.warning(f"Failed to generate paper summary table: {summary_result.get('error', 'Unknown error')}")
+                        save_artefacts(
+                            paper_summary_table=post_search_state["paper_summary_table"],
+                            paper_summary_rows=post_search_state.get("paper_summary_rows", {})
+                        )
                 
                 # Set search completed flag
                 st.session_state.search_completed = True
@@ -193,26 +344,30 @@ with tab2:
     st.header("Literature Review")
     
     if st.button("Generate Literature Review"):
-        if st.session_state.sources:
+        if library.count_sources(st.session_state.project_id):
             with st.spinner("Generating literature review..."):
                 # Generate literature review using the literature review agent
                 review_result = literature_review_agent.generate_literature_review(
-                    st.session_state.sources, 
+                    project_sources().to_list(), 
                     style="thematic"  # Always use thematic style
                 )
                 
                 if review_result["success"]:
-                    st.session_state.literature_review = review_result["literature_review"]
+                    save_artefacts(literature_review=review_result["literature_review"])
                     
-                    # Generate paper summary table
-                    summary_result = literature_review_agent.create_paper_summary_table(
-                        st.session_state.sources
-                    )
+                    # Update paper summary table, summarizing only papers without a row
+                    summary_state = research_workflow["update_paper_summary_table"]({
+                        "sources": project_sources().to_list(),
+                        "paper_summary_rows": st.session_state.paper_summary_rows
+                    })
                     
-                    if summary_result["success"]:
-                        st.session_state.paper_summary_table = summary_result["summary_table"]
+                    if summary_state["status"] == "summary_table_generated":
+                        save_artefacts(
+                            paper_summary_table=summary_state["paper_summary_table"],
+                            paper_summary_rows=summary_state["paper_summary_rows"]
+                        )
                     else:
-                        st.warning(f"Failed to generate paper summary table: {summary_result.get('error', 'Unknown error')}")
+                        st.warning(f"Failed to generate paper summary table: {summary_state.get('error', 'Unknown error')}")
                 else:
                     st.warning(f"Failed to generate literature review: {review_result.get('error', 'Unknown error')}")
         else:
@@ -231,13 +386,22 @@ with tab3:
     if st.button("Regenerate Research Gaps"):
         if st.session_state.literature_review:
             with st.spinner("Identifying research gaps..."):
-                gaps_result = research_gaps_agent.identify_research_gaps(
-                    st.session_state.literature_review
+                # Only sources added or removed since the last run are analyzed; unchanged sources cost nothing
+                gaps_result = research_gaps_agent.update_research_gaps(
+                    st.session_state.literature_review,
+                    st.session_state.research_gaps_state,
+                    project_sources().to_list()
                 )
-                
                 if gaps_result["success"]:
-                    st.session_state.research_gaps = gaps_result["research_gaps"]
-                    st.write(st.session_state.research_gaps)
+                    save_artefacts(
+                        research_gaps=gaps_result["research_gaps"],
+                        research_gaps_state=gaps_result["gaps_state"]
+                    )
+                    if gaps_result["cached"]:
+                        st.info("No sources were added or removed since the gaps were last identified.")
+                    else:
+                        st.caption(f"{len(gaps_result['new_gaps'])} new gaps, "
+                                   f"{len(gaps_result['resolved_gaps'])} addressed by newer sources.")
                 else:
                     st.warning(f"Failed to identify research gaps: {gaps_result.get('error', 'Unknown error')}")
         else:
@@ -262,32 +426,27 @@ with tab4:
     
     # Update citation style and regenerate references if changed
     if citation_style != st.session_state.citation_style:
-        st.session_state.citation_style = citation_style
+        save_artefacts(citation_style=citation_style)
         # Update references list with new citation style
-        if st.session_state.sources:
-            st.session_state.references_list = research_workflow["generate_references_list"]({
-                "sources": st.session_state.sources,
-                "citation_style": citation_style
-            })["references_list"]
+        if library.count_sources(st.session_state.project_id):
+            references_state = research_workflow["update_references_list"]({
+                "sources": project_sources().to_list(),
+                "citation_style": citation_style,
+                "reference_entries": st.session_state.reference_entries
+            })
+            save_artefacts(
+                references_list=references_state["references_list"],
+                reference_entries=references_state.get("reference_entries", {})
+            )
     
-    # Display sources with links
-    if st.session_state.sources:
-        st.subheader("Sources")
-        for i, source in enumerate(st.session_state.sources):
-            with st.expander(f"{i+1}. {source.get('title', 'Untitled')}"):
-                if source.get('url'):
-                    st.markdown(f"**Link:** [{source.get('url')}]({source.get('url')})")
-                if source.get('authors'):
-                    st.markdown(f"**Authors:** {source.get('authors')}")
-                if source.get('publication'):
-                    st.markdown(f"**Publication:** {source.get('publication')}")
-                if source.get('year'):
-                    st.markdown(f"**Year:** {source.get('year')}")
-                if source.get('abstract'):
-                    st.markdown("**Abstract:**")
-                    st.markdown(source.get('abstract'))
-                if source.get('keywords'):
-                    st.markdown(f"**Keywords:** {', '.join(source.get('keywords', []))}")
+    # Display one filtered page of sources; details are rendered only for the rows opened
+    st.subheader("Sources")
+    reference_filters = source_filters("reference_sources")
+    reference_sources, offset, reference_count = source_page("reference_sources", 20, reference_filters)
+    if reference_count:
+        for i, source in enumerate(reference_sources):
+            if st.checkbox(source_label(offset + i + 1, source), key=f"reference_details_{source['id']}"):
+                st.markdown(render_source_details(source))
     else:
         st.info("No sources available. Please search for research papers first.")
     
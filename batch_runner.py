@@ -0,0 +1,235 @@
+"""
+Batch runner: answer a file of research questions with the research workflow.
+
+Questions are read from JSONL (one object with a "question" field per line) or
+CSV (with a "question" column). Optional fields are "id" and "paper_only".
+Results are appended to a JSONL file as each question finishes, so a crash
+loses nothing. Rerunning with the same output file skips questions that
+already completed. OpenAI and Tavily calls share process-wide rate limits and
+are retried with backoff on rate-limit and transient errors.
+
+Run with: python batch_runner.py questions.jsonl --output results.jsonl
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Set
+from dotenv import load_dotenv
+
+RESULT_FIELDS = [
+    "answer", "sources", "literature_review", "research_gaps",
+    "paper_summary_table", "references_list", "errors"
+]
+
+
+def _question_id(question: str, paper_only: bool) -> str:
+    return hashlib.sha1(f"{question.strip()}|{paper_only}".encode("utf-8")).hexdigest()[:12]
+
+
+def _as_bool(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "y")
+    return bool(value)
+
+
+def read_questions(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield {"id", "question", "paper_only"} items from a JSONL or CSV file"""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+
+        for row in rows:
+            question = (row.get("question") or "").strip()
+            if not question:
+                continue
+            paper_only = _as_bool(row.get("paper_only", False))
+            yield {
+                "id": str(row.get("id") or _question_id(question, paper_only)),
+                "question": question,
+                "paper_only": paper_only
+            }
+
+
+def read_completed_ids(output_path: str) -> Set[str]:
+    """Return IDs of questions that already have a completed result in the output file"""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash can leave a partial last line behind
+                continue
+            if record.get("status") == "completed":
+                completed.add(record["id"])
+    return completed
+
+
+class JsonlWriter:
+    """Append records to a JSONL file from many threads, flushing each one to disk"""
+
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def run_question(workflow: Dict[str, Any], item: Dict[str, Any], post_search: bool = False,
+                 style: str = "thematic", citation_style: str = "APA") -> Dict[str, Any]:
+    """Run the workflow for one question and return the result record"""
+    start = time.monotonic()
+    record = {"id": item["id"], "question": item["question"], "paper_only": item["paper_only"]}
+    engine = workflow["engine"]
+    try:
+        initial_state = {
+            # A stable run ID lets a rerun resume a failed graph run from its last completed node
+            "run_id": f"batch-{item['id']}",
+            "question": item["question"],
+            "paper_only": item["paper_only"],
+            "citation_style": citation_style,
+            "search_results": [],
+            "analysis": "",
+            "answer": "",
+            "needs_more_research": False,
+            "status": "started"
+        }
+        if post_search and engine.use_graph:
+            state = engine.execute_graph(initial_state, initial_state["run_id"], post_search=True, style=style)
+            failed = state["status"] != "workflow_complete"
+        else:
+            state = workflow["execute_workflow"](initial_state)
+
+            # execute_workflow reports workflow_complete even when a step failed, so check for errors too
+            failed = state["status"] != "workflow_complete" or bool(state.get("error"))
+            if not failed and post_search:
+                state = engine.run_post_search_stage(state, style)
+                failed = state["status"] != "post_search_complete"
+
+        record["status"] = "failed" if failed else "completed"
+        if failed:
+            record["error"] = state.get("error") or state.get("errors") or state["status"]
+        for field in RESULT_FIELDS:
+            if state.get(field):
+                record[field] = state[field]
+    except Exception as e:
+        record["status"] = "failed"
+        record["error"] = str(e)
+
+    record["elapsed_seconds"] = round(time.monotonic() - start, 3)
+    record["finished_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    return record
+
+
+def run_batch(workflow: Dict[str, Any], questions: List[Dict[str, Any]], output_path: str,
+              concurrency: int = 4, post_search: bool = False, style: str = "thematic",
+              citation_style: str = "APA") -> Dict[str, int]:
+    """Run every question not yet completed in output_path and append the results"""
+    completed_ids = read_completed_ids(output_path)
+    seen = set()
+    pending = []
+    for item in questions:
+        if item["id"] in completed_ids or item["id"] in seen:
+            continue
+        seen.add(item["id"])
+        pending.append(item)
+
+    summary = {"total": len(questions), "skipped": len(questions) - len(pending), "completed": 0, "failed": 0}
+    print(f"BatchRunner: {len(pending)} questions to run, {summary['skipped']} already done")
+
+    writer = JsonlWriter(output_path)
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {
+                executor.submit(run_question, workflow, item, post_search, style, citation_style): item
+                for item in pending
+            }
+            for future in as_completed(futures):
+                record = future.result()
+                writer.write(record)
+                summary[record["status"]] += 1
+                print(f"BatchRunner: [{summary['completed'] + summary['failed']}/{len(pending)}] "
+                      f"{record['status']}: {record['question'][:80]}")
+    finally:
+        writer.close()
+
+    return summary
+
+
+def build_batch_workflow(openai_rpm: float, openai_tpm: float, tavily_rpm: float, model: str = "gpt-3.5-turbo"):
+    """Build the default agents with batch priority and process-wide OpenAI and Tavily limits"""
+    from agents.registry import AgentRegistry
+    from utils.request_governor import PRIORITY_BATCH, get_default_governor
+
+    governor = get_default_governor()
+    governor.configure("openai", requests_per_minute=openai_rpm, tokens_per_minute=openai_tpm)
+    governor.configure("tavily", requests_per_minute=tavily_rpm)
+    registry = AgentRegistry(
+        openai_api_key=os.getenv("OPENAI_API_KEY"),
+        model=model,
+        governor=governor,
+        priority=PRIORITY_BATCH
+    )
+    return registry.workflow
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL or CSV file of questions")
+    parser.add_argument("--output", default="results.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("--concurrency", type=int, default=4, help="Questions run at the same time")
+    parser.add_argument("--openai-rpm", type=float, default=float(os.getenv("OPENAI_RPM", 500)),
+                        help="OpenAI requests per minute across all workers")
+    parser.add_argument("--openai-tpm", type=float, default=float(os.getenv("OPENAI_TPM", 200000)),
+                        help="OpenAI tokens per minute across all workers")
+    parser.add_argument("--tavily-rpm", type=float, default=float(os.getenv("TAVILY_RPM", 100)),
+                        help="Tavily requests per minute across all workers")
+    parser.add_argument("--post-search", action="store_true",
+                        help="Also generate literature review, gaps, summary table and references")
+    parser.add_argument("--style", default="thematic", help="Literature review style")
+    parser.add_argument("--citation-style", default="APA")
+    parser.add_argument("--model", default="gpt-3.5-turbo")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    if not os.getenv("OPENAI_API_KEY") or not os.getenv("TAVILY_API_KEY"):
+        print("BatchRunner: OPENAI_API_KEY and TAVILY_API_KEY must be set")
+        return 2
+
+    workflow = build_batch_workflow(args.openai_rpm, args.openai_tpm, args.tavily_rpm, args.model)
+    summary = run_batch(
+        workflow,
+        list(read_questions(args.input)),
+        args.output,
+        concurrency=args.concurrency,
+        post_search=args.post_search,
+        style=args.style,
+        citation_style=args.citation_style
+    )
+    print(f"BatchRunner: {summary}")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,3 @@
+"""
+Benchmarks package for AI research workflow.
+"""
\ No newline at end of file
@@ -0,0 +1,168 @@
+"""
+Smoke test for the API server: drive every endpoint with stand-in agents.
+
+Submits concurrent workflow jobs plus one job per output endpoint, consumes
+the server-sent events of one workflow, polls the rest to completion and
+checks each job finished with the expected fields. The streamed post-search
+stage is compared with the threaded one.
+
+Run with: python -m benchmarks.api_server_smoke
+"""
+import argparse
+import json
+import sys
+import time
+from api_server import create_app
+from benchmarks.workflow_load_test import FakeAnalysisAgent, FakeDraftingAgent, FakeResearchAgent
+from utils.job_queue import JobQueue
+from workflows.research_graph import ResearchWorkflowEngine
+
+
+class FakeStreamingDraftingAgent(FakeDraftingAgent):
+    def draft_answer_stream(self, question, analysis, excerpts=None):
+        answer = self.draft_answer(question, analysis, excerpts)["answer"]
+        for word in answer.split(" "):
+            yield word + " "
+
+
+class FakeLiteratureReviewAgent:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def generate_literature_review(self, sources, style="thematic"):
+        time.sleep(self.latency)
+        return {"success": True, "literature_review": f"{style} review of {len(sources)} sources"}
+
+    def generate_literature_review_stream(self, sources, style="thematic"):
+        for word in self.generate_literature_review(sources, style)["literature_review"].split(" "):
+            yield word + " "
+
+    def create_paper_summary_rows(self, sources):
+        time.sleep(self.latency)
+        return {"success": True, "rows": {source["id"]: dict(source, summary="Summary") for source in sources}}
+
+
+class FakeResearchGapsAgent:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def identify_research_gaps_stream(self, literature_review):
+        time.sleep(self.latency)
+        for word in f"Gaps in {literature_review}".split(" "):
+            yield word + " "
+
+    def identify_research_gaps(self, literature_review):
+        return {"success": True, "research_gaps": "".join(self.identify_research_gaps_stream(literature_review))}
+
+
+def parse_sse(body):
+    """Return (event, data) pairs from a server-sent event stream"""
+    events = []
+    for block in body.split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if line and not line.startswith(":"))
+        if "event" in fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def wait_for(client, job_id, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/jobs/{job_id}").get_json()
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(0.02)
+    raise TimeoutError(f"Job {job_id} did not finish within {timeout} seconds")
+
+
+def run_smoke_test(workflows: int = 8, latency: float = 0.05, workers: int = 4):
+    engine = ResearchWorkflowEngine(
+        research_agent=FakeResearchAgent(latency),
+        analysis_agent=FakeAnalysisAgent(latency),
+        drafting_agent=FakeStreamingDraftingAgent(latency),
+        literature_review_agent=FakeLiteratureReviewAgent(latency),
+        research_gaps_agent=FakeResearchGapsAgent(latency)
+    )
+    app = create_app(engine, JobQueue(max_workers=workers))
+    client = app.test_client()
+    problems = []
+
+    sources = FakeResearchAgent(0).research("topic")["sources"]
+    requests = {
+        "/api/literature-review": ({"sources": sources}, "literature_review"),
+        "/api/research-gaps": ({"literature_review": "a review"}, "research_gaps"),
+        "/api/summary-table": ({"sources": sources}, "paper_summary_table"),
+        "/api/references": ({"sources": sources, "citation_style": "MLA"}, "references_list"),
+    }
+
+    if client.post("/api/workflow", json={}).status_code != 400:
+        problems.append("missing question was not rejected")
+
+    start = time.perf_counter()
+    workflow_ids = {}
+    for i in range(workflows):
+        question = f"question-{i}"
+        workflow_ids[question] = client.post("/api/workflow", json={"question": question}).get_json()["job_id"]
+    output_ids = {
+        field: client.post(path, json=payload).get_json()["job_id"]
+        for path, (payload, field) in requests.items()
+    }
+
+    # Follow one workflow over SSE while the others run
+    events = parse_sse(client.get(f"/api/jobs/{workflow_ids['question-0']}/events").get_data(as_text=True))
+    event_names = {event for event, _ in events}
+    for expected in ("answer", "literature_review", "research_gaps", "done"):
+        if expected not in event_names:
+            problems.append(f"SSE stream is missing {expected} events")
+    malformed = client.get(f"/api/jobs/{workflow_ids['question-0']}/events", headers={"Last-Event-ID": "abc"})
+    if malformed.status_code != 400:
+        problems.append(f"a malformed Last-Event-ID returned {malformed.status_code}, expected 400")
+
+    for question, job_id in workflow_ids.items():
+        job = wait_for(client, job_id)
+        state = job.get("result") or {}
+        if job["status"] != "completed":
+            problems.append(f"workflow {question} failed: {job.get('error')}")
+        elif state["question"] != question or not state["research_gaps"] or not state["references_list"]:
+            problems.append(f"workflow {question} returned an incomplete state")
+
+    for field, job_id in output_ids.items():
+        job = wait_for(client, job_id)
+        if job["status"] != "completed" or not (job.get("result") or {}).get(field):
+            problems.append(f"{field} job failed: {job.get('error')}")
+
+    # The streamed post-search stage must produce the same cached entries and rows as the threaded one
+    post_search_input = {"question": "topic", "sources": sources, "citation_style": "APA",
+                         "reference_entries": {}, "paper_summary_rows": {}}
+    threaded = engine.run_post_search_stage(dict(post_search_input))
+    streamed = list(engine.stream_post_search_stage(dict(post_search_input)))[-1][1]
+    for field in ("references_list", "reference_entries", "paper_summary_table", "paper_summary_rows"):
+        if not threaded.get(field) or streamed.get(field) != threaded.get(field):
+            problems.append(f"the streamed post-search stage returned a different {field}")
+
+    report = {
+        "jobs": workflows + len(output_ids),
+        "workers": workers,
+        "seconds": time.perf_counter() - start,
+        "sse_events": len(events)
+    }
+    return report, problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workflows", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    report, problems = run_smoke_test(args.workflows, args.latency, args.workers)
+    for key, value in report.items():
+        print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
+
+    if problems:
+        print(f"Smoke test failed with {len(problems)} problems:")
+        for problem in problems:
+            print(f"- {problem}")
+        sys.exit(1)
+    print("Smoke test passed")
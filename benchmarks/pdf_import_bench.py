@@ -0,0 +1,120 @@
+"""
+Benchmark the bulk PDF importer on a directory of generated PDFs.
+
+Writes simple text-only PDFs, imports them twice and reports pages/s and
+papers/s. The second run must skip every file by content hash. LLM metadata
+extraction is disabled so only extraction throughput is measured.
+
+Run with: python -m benchmarks.pdf_import_bench --papers 40 --pages 30
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+from utils.pdf_ingestion import PdfExtractionCache
+from utils.source_store import SourceStore
+from workflows.pdf_import import PdfBulkImporter
+
+WORDS = (
+    "model data training results method analysis performance accuracy evaluation "
+    "baseline approach experiment network learning dataset study effect sample"
+).split()
+
+
+def write_sample_pdf(path: str, title: str, pages: int, seed: int):
+    """Write a minimal PDF with a few dozen lines of text per page"""
+    rng = random.Random(seed)
+    objects = {1: "<< /Type /Catalog /Pages 2 0 R >>", 3: "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    kids = []
+    for page in range(pages):
+        lines = [f"{title} page {page + 1}"] + [
+            " ".join(rng.choice(WORDS) for _ in range(12)) + "." for _ in range(40)
+        ]
+        text = "BT /F1 10 Tf 50 780 Td 14 TL " + " ".join(f"({line}) '" for line in lines) + " ET"
+        content_id, page_id = 4 + 2 * page, 5 + 2 * page
+        objects[content_id] = f"<< /Length {len(text)} >>\nstream\n{text}\nendstream"
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        )
+        kids.append(f"{page_id} 0 R")
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>"
+    info_id = max(objects) + 1
+    objects[info_id] = f"<< /Title ({title}) >>"
+
+    body = b"%PDF-1.4\n"
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(body)
+        body += f"{number} 0 obj\n{objects[number]}\nendobj\n".encode("latin-1")
+    xref = len(body)
+    body += f"xref\n0 {info_id + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for number in range(1, info_id + 1):
+        body += f"{offsets[number]:010d} 00000 n \n".encode("latin-1")
+    body += f"trailer\n<< /Size {info_id + 1} /Root 1 0 R /Info {info_id} 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+
+    with open(path, "wb") as f:
+        f.write(body)
+
+
+def run_benchmark(papers: int = 40, pages: int = 30, workers: int = None):
+    problems = []
+    with tempfile.TemporaryDirectory() as directory:
+        for i in range(papers):
+            write_sample_pdf(os.path.join(directory, f"paper-{i:03d}.pdf"), f"Sample paper {i}", pages, seed=i)
+        # An exact copy must be skipped by content hash
+        write_sample_pdf(os.path.join(directory, "duplicate.pdf"), "Sample paper 0", pages, seed=0)
+
+        store = SourceStore()
+        importer = PdfBulkImporter(
+            store,
+            extract_workers=workers,
+            pdf_cache=PdfExtractionCache(os.path.join(directory, "cache.sqlite"))
+        )
+
+        def show(report):
+            sys.stdout.write(f"\r{report['done']}/{report['total']} files, {report['pages_per_second']:.0f} pages/s")
+            sys.stdout.flush()
+
+        first = importer.import_directory(directory, analyze=False, progress=show)
+        print()
+        second = importer.import_directory(directory, analyze=False)
+
+    if len(first["imported"]) != papers or len(first["skipped"]) != 1 or first["failed"]:
+        problems.append(f"first import: {len(first['imported'])} imported, {len(first['skipped'])} skipped, "
+                        f"{len(first['failed'])} failed")
+    if len(second["skipped"]) != papers + 1:
+        problems.append("second import did not skip every file by hash")
+    if len(store) != papers or any(source["pages"] != pages for source in store):
+        problems.append("the source store does not hold one complete source per paper")
+
+    report = {
+        "papers": papers,
+        "pages": first["pages"],
+        "workers": importer.extract_workers,
+        "seconds": first["elapsed_seconds"],
+        "pages_per_second": first["pages_per_second"],
+        "papers_per_second": first["papers_per_second"],
+        "reimport_seconds": second["elapsed_seconds"]
+    }
+    return report, problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--papers", type=int, default=40)
+    parser.add_argument("--pages", type=int, default=30)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    report, problems = run_benchmark(args.papers, args.pages, args.workers)
+    for key, value in report.items():
+        print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
+
+    if problems:
+        print(f"Import check failed with {len(problems)} problems:")
+        for problem in problems:
+            print(f"- {problem}")
+        sys.exit(1)
+    print("Import check passed")
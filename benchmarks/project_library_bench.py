@@ -0,0 +1,166 @@
+"""
+Benchmark reopening and browsing a large project in the SQLite project library.
+
+Creates a project with thousands of sources, then times what the app does when
+the project is reopened: listing projects, counting sources, loading the first
+page and the saved artefacts. Full-text search, filtered pages, facets, cached
+source rendering and a full scan are timed too, and updating a source is
+checked to re-index its title and domain.
+
+Run with: python -m benchmarks.project_library_bench --sources 5000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from utils.project_library import ProjectLibrary
+from utils.source_browser import render_cache_info, render_source_details
+
+JOURNALS = ["Nature", "Science", "Journal of Machine Learning Research", "Bioinformatics"]
+HOSTS = ["arxiv.org", "www.nature.com", "doi.org", "example.org"]
+
+WORDS = (
+    "learning network protein climate graph speech policy model data neural transformer attention "
+    "reinforcement folding ocean retrieval language vision robustness benchmark dataset"
+).split()
+
+
+def make_source(rng, index):
+    title = " ".join(rng.choice(WORDS) for _ in range(6)).capitalize() + f" {index}"
+    return {
+        "title": title,
+        "url": f"https://{rng.choice(HOSTS)}/papers/{index}",
+        "publication": rng.choice(JOURNALS),
+        "authors": [f"Author {rng.randint(1, 500)}", f"Author {rng.randint(1, 500)}"],
+        "year": rng.randint(1995, 2025),
+        "content": " ".join(rng.choice(WORDS) for _ in range(150)),
+        "score": rng.random()
+    }
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, 1000 * (time.perf_counter() - start)
+
+
+def run_benchmark(sources: int = 5000, page_size: int = 25, seed: int = 5):
+    problems = []
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "projects.sqlite")
+        library = ProjectLibrary(path)
+        project_id = library.get_or_create_project("Large project")
+        batch = [make_source(rng, i) for i in range(sources)]
+        _, insert_ms = timed(library.add_sources, project_id, batch)
+        added_again = library.add_sources(project_id, batch[:100])
+        library.save_artefacts(project_id, literature_review="# Review\n" * 200, citation_style="MLA",
+                               reference_entries={str(i): f"Entry {i}" for i in range(sources)})
+
+        # A new process opening the same file, as after a restart
+        reopened = ProjectLibrary(path)
+        start = time.perf_counter()
+        projects = reopened.list_projects()
+        count = reopened.count_sources(project_id)
+        first_page = reopened.page_sources(project_id, 0, page_size)
+        artefacts = reopened.load_artefacts(project_id)
+        reopen_ms = 1000 * (time.perf_counter() - start)
+
+        last_page, last_page_ms = timed(reopened.page_sources, project_id, (sources - 1) // page_size, page_size)
+        matches, search_ms = timed(reopened.count_sources, project_id, "protein fold")
+        found, search_page_ms = timed(reopened.page_sources, project_id, 0, page_size, "protein fold")
+        filters = {"year_from": 2010, "year_to": 2015, "publication": "Nature", "domain": "nature.com"}
+        filtered_count, filter_count_ms = timed(reopened.count_sources, project_id, "", filters)
+        filtered, filter_page_ms = timed(reopened.page_sources, project_id, 0, page_size, "", filters)
+        facets, facets_ms = timed(reopened.source_facets, project_id)
+        plan = " ".join(row[-1] for row in reopened._conn.execute(
+            "EXPLAIN QUERY PLAN SELECT COUNT(*) FROM sources WHERE project_id = ? AND domain = ?", (project_id, "doi.org")
+        ))
+        everything, scan_ms = timed(lambda: list(reopened.iter_sources(project_id)))
+
+        # A merged source gets a new title and URL; search and filters must follow it
+        updated = dict(first_page[0], title="Quasicrystal lattice survey", url="https://openalex.org/W1")
+        reopened.update_source(project_id, updated)
+        found_updated = reopened.page_sources(project_id, 0, page_size, "quasicrystal")
+        found_by_domain = reopened.page_sources(project_id, 0, page_size, "", {"domain": "openalex.org"})
+        stale = reopened.count_sources(project_id, first_page[0]["title"].split()[-1] + " " +
+                                       " ".join(first_page[0]["title"].split()[:3]))
+
+    # Rendering the same page on every rerun only builds its markdown once
+    before = render_cache_info()
+    _, first_render_ms = timed(lambda: [render_source_details(source) for source in first_page])
+    _, rerender_ms = timed(lambda: [render_source_details(source) for source in first_page])
+    cache = render_cache_info()
+    if cache["hits"] - before["hits"] < len(first_page):
+        problems.append("rendered source details were not reused")
+    edited = dict(first_page[1], abstract="A revised abstract.")
+    if "A revised abstract." not in render_source_details(edited):
+        problems.append("an edited source was rendered from the cache")
+    if "sources_by_domain" not in plan:
+        problems.append(f"the domain filter does not use its index: {plan}")
+
+    expected_filtered = sum(1 for source in batch if 2010 <= source["year"] <= 2015 and
+                            source["publication"] == "Nature" and "www.nature.com" in source["url"])
+    if filtered_count != expected_filtered:
+        problems.append(f"filters matched {filtered_count} sources, expected {expected_filtered}")
+    if any(not 2010 <= source["year"] <= 2015 or source["publication"] != "Nature" for source in filtered):
+        problems.append("a filtered page contains sources outside the filters")
+    if facets["years"] != (min(s["year"] for s in batch), max(s["year"] for s in batch)) or \
+            {value for value, _ in facets["domains"]} != {host.replace("www.", "") for host in HOSTS}:
+        problems.append(f"unexpected facets {facets['years']} {facets['domains']}")
+
+    if [s["id"] for s in found_updated] != [updated["id"]] or [s["id"] for s in found_by_domain] != [updated["id"]]:
+        problems.append("an updated source is not found by its new title or domain")
+    if stale:
+        problems.append("an updated source is still found by its old title")
+
+    if added_again:
+        problems.append(f"{len(added_again)} duplicate sources were stored twice")
+    if count != sources or len(everything) != sources:
+        problems.append(f"expected {sources} sources, counted {count} and scanned {len(everything)}")
+    if projects[0]["source_count"] != sources or artefacts.get("citation_style") != "MLA":
+        problems.append("the project summary or artefacts did not survive reopening")
+    if first_page[0]["title"] != batch[0]["title"] or last_page[-1]["title"] != batch[-1]["title"]:
+        problems.append("pages are not in insertion order")
+    if not matches or any("protein" not in source["title"].lower() + source["content"] for source in found):
+        problems.append("full-text search returned sources that do not match")
+    if reopen_ms > 500:
+        problems.append(f"reopening took {reopen_ms:.0f} ms")
+
+    report = {
+        "sources": sources,
+        "insert_ms": insert_ms,
+        "reopen_ms": reopen_ms,
+        "last_page_ms": last_page_ms,
+        "search_matches": matches,
+        "search_count_ms": search_ms,
+        "search_page_ms": search_page_ms,
+        "filtered_matches": filtered_count,
+        "filter_count_ms": filter_count_ms,
+        "filter_page_ms": filter_page_ms,
+        "facets_ms": facets_ms,
+        "first_render_ms": first_render_ms,
+        "rerender_ms": rerender_ms,
+        "full_scan_ms": scan_ms
+    }
+    return report, problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sources", type=int, default=5000)
+    parser.add_argument("--page-size", type=int, default=25)
+    args = parser.parse_args()
+
+    report, problems = run_benchmark(args.sources, args.page_size)
+    for key, value in report.items():
+        print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
+
+    if problems:
+        print(f"Project library check failed with {len(problems)} problems:")
+        for problem in problems:
+            print(f"- {problem}")
+        sys.exit(1)
+    print("Project library check passed")
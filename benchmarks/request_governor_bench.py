@@ -0,0 +1,205 @@
+"""
+Exercise the RequestGovernor against a fake OpenAI server that injects 429s and 503s.
+
+Checks that every request eventually succeeds, that throttled requests are not
+retried before the server's Retry-After, that interactive requests jump ahead
+of queued batch requests, and that non-retryable errors are raised at once.
+A fake search tool that returns its HTTP errors as strings, as Tavily's does,
+checks that those are retried too.
+
+Run with: python -m benchmarks.request_governor_bench
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from utils.request_governor import (
+    PRIORITY_BATCH, PRIORITY_INTERACTIVE, GovernedChatClient, GovernedSearchTool, RequestGovernor, SearchToolError
+)
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"Error code: {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+class FakeOpenAIServer:
+    """Chat completions endpoint with a fixed-window rate limit and random server errors"""
+
+    def __init__(self, requests_per_window: int, window: float, retry_after: float, error_rate: float = 0.0):
+        self.requests_per_window = requests_per_window
+        self.window = window
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.chat = SimpleNamespace(completions=self)
+        self.throttled_at = {}
+        self.retry_gaps = []
+        self.completed = []
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self._lock = threading.Lock()
+
+    def create(self, model, messages, **params):
+        tag = messages[0]["content"]
+        with self._lock:
+            now = time.monotonic()
+            if tag in self.throttled_at:
+                self.retry_gaps.append(now - self.throttled_at.pop(tag))
+
+            if messages[0].get("invalid"):
+                raise FakeAPIError(400)
+            if now - self._window_start >= self.window:
+                self._window_start = now
+                self._window_count = 0
+            if self._window_count >= self.requests_per_window:
+                self.throttled_at[tag] = now
+                raise FakeAPIError(429, {"retry-after": str(self.retry_after)})
+            self._window_count += 1
+            if random.random() < self.error_rate:
+                raise FakeAPIError(503)
+            self.completed.append(tag)
+
+        time.sleep(0.005)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=f"Reply to {tag}"))],
+            usage=SimpleNamespace(total_tokens=50)
+        )
+
+
+def check_retries(requests: int, problems):
+    """Flood a server whose real limit is far below the configured one"""
+    server = FakeOpenAIServer(requests_per_window=10, window=0.5, retry_after=0.3, error_rate=0.05)
+    governor = RequestGovernor(max_retries=20, base_delay=0.05, max_delay=1.0)
+    governor.configure("openai", requests_per_minute=6000, tokens_per_minute=1000000)
+    client = GovernedChatClient(server, governor)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        futures = [
+            executor.submit(client.chat.completions.create, model="gpt-3.5-turbo",
+                            messages=[{"role": "user", "content": f"request-{i}"}])
+            for i in range(requests)
+        ]
+        errors = [future.exception() for future in futures]
+    elapsed = time.perf_counter() - start
+
+    if any(errors):
+        problems.append(f"{sum(1 for e in errors if e)} requests failed after retries")
+    if len(set(server.completed)) != requests:
+        problems.append("not every request completed exactly once")
+    if governor.stats["throttled"] == 0:
+        problems.append("the fake server never throttled, so Retry-After was not exercised")
+    early = [gap for gap in server.retry_gaps if gap < server.retry_after]
+    if early:
+        problems.append(f"{len(early)} retries were sent before Retry-After expired")
+    return {"retry_seconds": elapsed, **{f"retry_{key}": value for key, value in governor.stats.items()}}
+
+
+def check_priority(problems):
+    """Queue batch requests, then interactive ones, behind a slow limit"""
+    server = FakeOpenAIServer(requests_per_window=1000, window=1.0, retry_after=0.1)
+    governor = RequestGovernor()
+    governor.configure("openai", requests_per_minute=1200, burst=1)
+    batch_client = GovernedChatClient(server, governor, priority=PRIORITY_BATCH)
+    interactive_client = GovernedChatClient(server, governor, priority=PRIORITY_INTERACTIVE)
+
+    def send(client, tag):
+        client.chat.completions.create(model="gpt-3.5-turbo", messages=[{"role": "user", "content": tag}])
+
+    with ThreadPoolExecutor(max_workers=20) as executor:
+        futures = [executor.submit(send, batch_client, f"batch-{i}") for i in range(12)]
+        time.sleep(0.1)
+        futures += [executor.submit(send, interactive_client, f"interactive-{i}") for i in range(4)]
+        for future in futures:
+            future.result()
+
+    positions = [i for i, tag in enumerate(server.completed) if tag.startswith("interactive")]
+    # Interactive requests arrive after about two batch requests went out; they should be next
+    if max(positions) > 8:
+        problems.append(f"interactive requests did not jump the batch queue: order {server.completed}")
+    return {"interactive_positions": positions}
+
+
+def check_non_retryable(problems):
+    server = FakeOpenAIServer(requests_per_window=1000, window=1.0, retry_after=0.1)
+    governor = RequestGovernor(max_retries=5)
+    client = GovernedChatClient(server, governor)
+    try:
+        client.chat.completions.create(model="gpt-3.5-turbo",
+                                       messages=[{"role": "user", "content": "bad", "invalid": True}])
+        problems.append("a 400 response did not raise")
+    except FakeAPIError:
+        pass
+    if governor.stats["retries"]:
+        problems.append("a 400 response was retried")
+
+
+class FakeSearchTool:
+    """Returns errors as repr strings instead of raising, like TavilySearchResults"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def invoke(self, query, **kwargs):
+        self.calls.append(time.monotonic())
+        return self.responses.pop(0)
+
+
+def check_search_errors(problems):
+    results = [{"title": "Result", "url": "https://example.org", "content": "Text"}]
+    tool = FakeSearchTool([
+        "HTTPError('429 Client Error: Too Many Requests for url: https://api.tavily.com/search')",
+        "ClientResponseError(status=429, message='Too Many Requests', headers={'Retry-After': '0.2'})",
+        "ReadTimeout('Read timed out.')",
+        results
+    ])
+    governor = RequestGovernor(max_retries=5, base_delay=0.01)
+    if GovernedSearchTool(tool, governor).invoke("query") != results:
+        problems.append("a search that recovered after error strings did not return its results")
+    if governor.stats["retries"] != 3 or governor.stats["throttled"] != 2:
+        problems.append(f"search error strings were not retried as rate limits and timeouts: {governor.stats}")
+    if tool.calls[2] - tool.calls[1] < 0.2:
+        problems.append("a search Retry-After in an error string was not honoured")
+
+    tool = FakeSearchTool(["HTTPError('401 Client Error: Unauthorized for url: https://api.tavily.com/search')"])
+    governor = RequestGovernor(max_retries=5, base_delay=0.01)
+    try:
+        GovernedSearchTool(tool, governor).invoke("query")
+        problems.append("a 401 search error string was returned as results")
+    except SearchToolError:
+        pass
+    if governor.stats["retries"]:
+        problems.append("a 401 search error string was retried")
+
+
+def run_benchmark(requests: int = 60):
+    problems = []
+    report = {}
+    report.update(check_retries(requests, problems))
+    report.update(check_priority(problems))
+    check_non_retryable(problems)
+    check_search_errors(problems)
+    return report, problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=60)
+    args = parser.parse_args()
+
+    report, problems = run_benchmark(args.requests)
+    for key, value in report.items():
+        print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
+
+    if problems:
+        print(f"Governor check failed with {len(problems)} problems:")
+        for problem in problems:
+            print(f"- {problem}")
+        sys.exit(1)
+    print("Governor check passed")
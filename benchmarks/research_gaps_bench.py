@@ -0,0 +1,174 @@
+"""
+Benchmark incremental research gap updates against re-analyzing the whole review.
+
+A fake model answers gap prompts with JSON and records the prompt sizes. Each
+search adds a few sources, and the review is regenerated from scratch every
+time, reworded as an LLM would. Checks that updates send only the added
+sources, that gap IDs stay stable, that resolved gaps are marked, and that
+unchanged sources make no request even when the review is reworded. A bulk
+import of thousands of sources must still fit one bounded prompt.
+
+Run with: python -m benchmarks.research_gaps_bench --sources 40
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import time
+from types import SimpleNamespace
+from agents.research_gaps_agent import ResearchGapsAgent
+from utils.prompt_packing import count_tokens, source_token_budget
+
+TOPICS = ["federated learning", "protein folding", "climate downscaling", "speech recognition", "graph retrieval",
+          "robust vision", "policy evaluation", "ocean modelling", "neural compression", "causal discovery"]
+FILLER = ("studies evaluate methods on benchmark datasets and report improvements over baselines while noting "
+          "limitations in scale generalization and reproducibility across settings").split()
+
+
+class FakeGapsModel:
+    """Returns one gap per topic mentioned in added text; 'solved' paragraphs resolve known gaps"""
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=self)
+        self.prompt_chars = []
+        self.last_prompt = ""
+
+    def create(self, model, messages, **params):
+        prompt = messages[0]["content"]
+        self.prompt_chars.append(len(prompt))
+        self.last_prompt = prompt
+        if "Known open gaps" in prompt:
+            known = dict(re.findall(r"^- (G\d+): (.+)$", prompt, flags=re.MULTILINE))
+            changes = prompt.split("Sources added to the literature:")[-1]
+            resolved = [gap_id for gap_id, title in known.items() if f"solved {title.split(' in ')[-1]}" in changes]
+            topics = [topic for topic in TOPICS if topic in changes and f"solved {topic}" not in changes]
+            content = {"resolved": resolved, "new": [self._gap(topic) for topic in topics]}
+        else:
+            content = {"gaps": [self._gap(topic) for topic in TOPICS if topic in prompt]}
+        message = SimpleNamespace(content=json.dumps(content))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    @staticmethod
+    def _gap(topic):
+        return {"title": f"Missing evaluations in {topic}", "description": f"Few studies of {topic}.", "priority": "high"}
+
+
+def paragraph(rng, topic=None, solved=False):
+    words = [rng.choice(FILLER) for _ in range(rng.randint(50, 90))]
+    if topic:
+        words.insert(5, f"solved {topic}" if solved else topic)
+    return " ".join(words).capitalize() + "."
+
+
+def make_source(rng, index, topic=None, solved=False):
+    return {"id": f"source-{index}", "title": f"Study {index}", "content": paragraph(rng, topic, solved)}
+
+
+def write_review(rng, sources):
+    """A freshly worded review: new filler around every source's topic, in shuffled order"""
+    paragraphs = [paragraph(rng) for _ in range(len(sources))]
+    for source in sources:
+        topic = next((t for t in TOPICS if t in source["content"]), None)
+        if topic:
+            solved = f"solved {topic}" in source["content"]
+            paragraphs.insert(rng.randint(0, len(paragraphs)), paragraph(rng, topic, solved))
+    return "\n\n".join(paragraphs)
+
+
+def run_benchmark(initial_sources: int = 40, searches: int = 5, seed: int = 3):
+    problems = []
+    rng = random.Random(seed)
+    sources = [make_source(rng, i) for i in range(initial_sources)]
+    sources[3] = make_source(rng, 3, TOPICS[0])
+    sources[10] = make_source(rng, 10, TOPICS[1])
+
+    model = FakeGapsModel()
+    agent = ResearchGapsAgent(api_key="", client=model, use_cache=False)
+    result = agent.update_research_gaps(write_review(rng, sources), None, sources)
+    full_chars = model.prompt_chars[-1]
+    ids = {gap["title"]: gap["id"] for gap in result["gaps_state"]["gaps"]}
+
+    delta_chars = []
+    review = ""
+    start = time.perf_counter()
+    for search in range(searches):
+        # A couple of new sources per search, one of them raising a new topic
+        sources += [make_source(rng, len(sources), TOPICS[2 + search]), make_source(rng, len(sources) + 1)]
+        if search == searches - 1:
+            sources.append(make_source(rng, len(sources), TOPICS[0], solved=True))
+        review = write_review(rng, sources)
+        requests_before = len(model.prompt_chars)
+        result = agent.update_research_gaps(review, result["gaps_state"], sources)
+        if not result["success"]:
+            problems.append(f"update {search} failed: {result['error']}")
+            break
+        if len(model.prompt_chars) != requests_before + 1:
+            problems.append(f"update {search} made {len(model.prompt_chars) - requests_before} requests")
+        delta_chars.append(model.prompt_chars[-1])
+    update_ms = 1000 * (time.perf_counter() - start) / searches
+
+    gaps = result["gaps_state"]["gaps"]
+    for gap in gaps:
+        if gap["title"] in ids and ids[gap["title"]] != gap["id"]:
+            problems.append(f"gap '{gap['title']}' changed ID from {ids[gap['title']]} to {gap['id']}")
+    if len(gaps) != len(set(gap["id"] for gap in gaps)):
+        problems.append("gap IDs are not unique")
+    if len(gaps) != 2 + searches:
+        problems.append(f"expected {2 + searches} gaps, found {len(gaps)}")
+    if result["resolved_gaps"] != ["G1"]:
+        problems.append(f"expected G1 to be resolved, got {result['resolved_gaps']}")
+
+    # The review is regenerated and reworded again, but the sources have not changed
+    requests_before = len(model.prompt_chars)
+    repeated, repeat_ms = None, 0.0
+    for _ in range(3):
+        start = time.perf_counter()
+        repeated = agent.update_research_gaps(write_review(rng, sources), result["gaps_state"], sources)
+        repeat_ms = 1000 * (time.perf_counter() - start)
+    if len(model.prompt_chars) != requests_before or not repeated["cached"]:
+        problems.append("unchanged sources were sent to the model again")
+    if repeated["research_gaps"] != result["research_gaps"]:
+        problems.append("the cached gaps differ from the last update")
+
+    # A bulk import is packed into the source budget instead of growing the prompt without bound
+    bulk = sources + [make_source(rng, len(sources) + i) for i in range(3000)]
+    agent.update_research_gaps(write_review(rng, sources), result["gaps_state"], bulk)
+    bulk_tokens = count_tokens(model.last_prompt, agent.model)
+    if bulk_tokens > source_token_budget(agent.model) + 1000:
+        problems.append(f"a bulk import of {len(bulk) - len(sources)} sources sent a {bulk_tokens} token prompt")
+
+    full_review_chars = len(review)
+    mean_delta = sum(delta_chars) / max(1, len(delta_chars))
+    if mean_delta > 0.3 * full_review_chars:
+        problems.append(f"delta prompts average {mean_delta:.0f} characters for a {full_review_chars} character review")
+
+    report = {
+        "sources": len(sources),
+        "first_prompt_chars": full_chars,
+        "delta_prompt_chars": mean_delta,
+        "full_review_chars": full_review_chars,
+        "gaps": len(gaps),
+        "bulk_import_prompt_tokens": bulk_tokens,
+        "update_ms": update_ms,
+        "unchanged_ms": repeat_ms
+    }
+    return report, problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sources", type=int, default=40)
+    parser.add_argument("--searches", type=int, default=5)
+    args = parser.parse_args()
+
+    report, problems = run_benchmark(args.sources, min(args.searches, len(TOPICS) - 2))
+    for key, value in report.items():
+        print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
+
+    if problems:
+        print(f"Research gaps check failed with {len(problems)} problems:")
+        for problem in problems:
+            print(f"- {problem}")
+        sys.exit(1)
+    print("Research gaps check passed")
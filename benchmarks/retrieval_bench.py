@@ -0,0 +1,92 @@
+"""
+Measure how much BM25 chunk retrieval shrinks the analysis prompt as the number of sources grows.
+
+Each synthetic source covers one topic; the question targets one topic, so a
+good retrieval stage keeps chunks from the matching sources only. Reports the
+analysis prompt tokens with and without retrieval, retrieval latency and the
+share of retrieved chunks that come from on-topic sources.
+
+Run with: python -m benchmarks.retrieval_bench --sources 10 50 200
+"""
+import argparse
+import random
+import sys
+import time
+from utils.chunk_retrieval import format_excerpts, retrieve_chunks
+from utils.prompt_packing import count_tokens
+
+TOPICS = {
+    "protein folding": "protein folding structure prediction residue contact alphafold amino sequence",
+    "graph networks": "graph neural network message passing node embedding edge aggregation",
+    "climate models": "climate model temperature precipitation emission scenario ocean forcing",
+    "speech recognition": "speech recognition acoustic phoneme transcription audio decoder",
+    "reinforcement learning": "reinforcement learning policy reward agent exploration value",
+}
+FILLER = "method data evaluation experiment baseline benchmark improvement analysis setting metric".split()
+
+
+def make_source(rng, topic, index):
+    words = TOPICS[topic].split()
+    sentences = []
+    for _ in range(40):
+        picked = [rng.choice(words) for _ in range(4)] + [rng.choice(FILLER) for _ in range(8)]
+        rng.shuffle(picked)
+        sentences.append(" ".join(picked).capitalize() + ".")
+    return {
+        "title": f"Study {index} on {topic}",
+        "url": f"https://example.org/{index}",
+        "content": " ".join(sentences),
+        "score": rng.random(),
+        "topic": topic
+    }
+
+
+def run_benchmark(source_counts=(10, 50, 200), k: int = 8, seed: int = 3):
+    problems = []
+    rng = random.Random(seed)
+    question = "What are recent advances in protein folding structure prediction?"
+    report = {}
+    for count in source_counts:
+        sources = [make_source(rng, rng.choice(list(TOPICS)), i) for i in range(count)]
+        sources[0]["topic"] = "protein folding"
+        sources[0].update(make_source(rng, "protein folding", 0))
+
+        start = time.perf_counter()
+        retrieval = retrieve_chunks(question, sources, k=k)
+        elapsed = time.perf_counter() - start
+
+        full_tokens = count_tokens(str(sources))
+        retrieved_tokens = count_tokens(format_excerpts(retrieval["chunks"]))
+        titles = {source["title"]: source["topic"] for source in sources}
+        on_topic = sum(1 for chunk in retrieval["chunks"] if titles[chunk["title"]] == "protein folding")
+        precision = on_topic / max(1, len(retrieval["chunks"]))
+
+        if precision < 0.9:
+            problems.append(f"{count} sources: only {precision:.0%} of retrieved chunks are on topic")
+        if count > k and retrieved_tokens >= full_tokens:
+            problems.append(f"{count} sources: retrieval did not shrink the prompt")
+
+        report[f"{count}_sources_full_tokens"] = full_tokens
+        report[f"{count}_sources_retrieved_tokens"] = retrieved_tokens
+        report[f"{count}_sources_chunks"] = retrieval["total_chunks"]
+        report[f"{count}_sources_retrieval_ms"] = 1000 * elapsed
+        report[f"{count}_sources_precision"] = precision
+    return report, problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sources", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--k", type=int, default=8)
+    args = parser.parse_args()
+
+    report, problems = run_benchmark(args.sources, args.k)
+    for key, value in report.items():
+        print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
+
+    if problems:
+        print(f"Retrieval check failed with {len(problems)} problems:")
+        for problem in problems:
+            print(f"- {problem}")
+        sys.exit(1)
+    print("Retrieval check passed")
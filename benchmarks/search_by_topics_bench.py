@@ -0,0 +1,64 @@
+"""
+Benchmark serial vs concurrent ResearchAgent.search_by_topics with a local fake search tool.
+
+Run with: python -m benchmarks.search_by_topics_bench
+"""
+import argparse
+import time
+from agents.research_agent import ResearchAgent
+
+
+class FakeSearchTool:
+    """Stand-in for TavilySearchResults that sleeps to simulate network latency"""
+
+    def __init__(self, latency: float = 0.2, results_per_query: int = 5):
+        self.latency = latency
+        self.results_per_query = results_per_query
+
+    def invoke(self, query, include_domains=None):
+        time.sleep(self.latency)
+        # Overlapping URLs across topics exercise deduplication
+        return [
+            {
+                "title": f"Paper {i} for {query}",
+                "url": f"https://arxiv.org/abs/{hash(query) % 3}.{i}",
+                "content": f"Content {i}",
+                "score": 1.0 / (i + 1)
+            }
+            for i in range(self.results_per_query)
+        ]
+
+
+def run_benchmark(num_topics: int = 8, latency: float = 0.2, max_workers: int = 4):
+    topics = [f"topic {i}" for i in range(num_topics)]
+
+    serial_agent = ResearchAgent(search_tool=FakeSearchTool(latency), use_search_cache=False)
+    start = time.perf_counter()
+    serial_agent.search_by_topics(topics)
+    serial_time = time.perf_counter() - start
+
+    concurrent_agent = ResearchAgent(search_tool=FakeSearchTool(latency), use_search_cache=False)
+    start = time.perf_counter()
+    concurrent_result = concurrent_agent.search_by_topics(topics, concurrent=True, max_workers=max_workers)
+    concurrent_time = time.perf_counter() - start
+
+    return {
+        "topics": num_topics,
+        "max_workers": max_workers,
+        "serial_seconds": serial_time,
+        "concurrent_seconds": concurrent_time,
+        "speedup": serial_time / concurrent_time if concurrent_time else float("inf"),
+        "merged_results": len(concurrent_result["merged_results"])
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--topics", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    report = run_benchmark(args.topics, args.latency, args.workers)
+    for key, value in report.items():
+        print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
@@ -0,0 +1,138 @@
+"""
+Benchmark semantic deduplication and similar_sources on a large synthetic source collection.
+
+Generates distinct papers, copies of some of them as they would appear on arXiv,
+doi.org and ResearchGate (decorated titles, different snippets), and related
+papers that share a topic but are different works. Checks that copies merge,
+related papers do not, and that LSH search agrees with an exact scan.
+
+Run with: python -m benchmarks.source_index_bench --sources 10000
+"""
+import argparse
+import random
+import sys
+import time
+from utils.source_store import SourceStore
+
+SYLLABLES = "ka lo mi ne ra su ti vo ze ba ce du fi go hu ja ke li mo nu pa qui re so tu va we xi yo zu".split()
+
+
+def make_vocabulary(rng, size):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def make_paper(rng, vocabulary, index):
+    return {
+        "index": index,
+        "title": " ".join(rng.choice(vocabulary) for _ in range(rng.randint(5, 10))).capitalize(),
+        "abstract": [rng.choice(vocabulary) for _ in range(160)]
+    }
+
+
+def as_source(paper, site, rng):
+    start = rng.randint(0, 60)
+    content = " ".join(paper["abstract"][start:start + 80])
+    title = paper["title"]
+    if site == "arxiv":
+        url = f"https://arxiv.org/abs/2101.{paper['index']:05d}"
+        title = f"[2101.{paper['index']:05d}] {title}"
+    elif site == "doi":
+        url = f"https://doi.org/10.1000/paper.{paper['index']}"
+    else:
+        url = f"https://www.researchgate.net/publication/{paper['index']}_paper"
+        title = f"{title} | Request PDF"
+    return {"title": title, "url": url, "content": content, "score": rng.random(), "paper": paper["index"]}
+
+
+def related_paper(rng, vocabulary, paper, index):
+    """A different work on the same topic: half of the title words and a third of the vocabulary shared"""
+    words = paper["title"].lower().split()
+    title = words[:len(words) // 2] + [rng.choice(vocabulary) for _ in range(len(words) - len(words) // 2)]
+    abstract = paper["abstract"][:50] + [rng.choice(vocabulary) for _ in range(110)]
+    rng.shuffle(abstract)
+    return {"index": index, "title": " ".join(title).capitalize(), "abstract": abstract}
+
+
+def run_benchmark(sources: int = 10000, duplicate_rate: float = 0.2, related_rate: float = 0.1,
+                  queries: int = 200, seed: int = 1):
+    problems = []
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng, 4000)
+
+    papers = [make_paper(rng, vocabulary, i) for i in range(sources)]
+    related = [related_paper(rng, vocabulary, paper, sources + i)
+               for i, paper in enumerate(rng.sample(papers, int(sources * related_rate)))]
+    stream = [as_source(paper, "doi", rng) for paper in papers + related]
+    copies = [as_source(paper, rng.choice(["arxiv", "researchgate"]), rng)
+              for paper in rng.sample(papers, int(sources * duplicate_rate))]
+    stream += copies
+    rng.shuffle(stream)
+
+    store = SourceStore()
+    start = time.perf_counter()
+    for source in stream:
+        store.add(source)
+    insert_seconds = time.perf_counter() - start
+
+    by_paper = {}
+    for source in store:
+        by_paper.setdefault(source["paper"], []).append(source)
+    unmerged = sum(1 for copies_of_paper in by_paper.values() if len(copies_of_paper) > 1)
+    expected = len(papers) + len(related)
+    false_merges = expected - len(by_paper)
+    if unmerged > 0.02 * len(copies):
+        problems.append(f"{unmerged} of {len(copies)} copies were not merged")
+    if false_merges:
+        problems.append(f"{false_merges} distinct papers were merged into others")
+
+    sample = rng.sample(store.to_list(), queries)
+    start = time.perf_counter()
+    approximate = [store.similar_sources(source, k=10) for source in sample]
+    query_seconds = (time.perf_counter() - start) / queries
+    start = time.perf_counter()
+    exact = [store.similar_sources(source, k=10, exact=True) for source in sample]
+    exact_seconds = (time.perf_counter() - start) / queries
+
+    # Recall over the neighbours that matter: exact top-10 results that are actually similar
+    relevant = [{s["id"] for s in e if s["similarity"] >= 0.3} for e in exact]
+    found = sum(len(r & {s["id"] for s in a}) for a, r in zip(approximate, relevant))
+    recall = found / max(1, sum(len(r) for r in relevant))
+    if any(not result or result[0]["id"] != source["id"] for result, source in zip(approximate, sample)):
+        problems.append("a stored source was not its own nearest neighbour")
+    if recall < 0.9:
+        problems.append(f"LSH recall against an exact scan is only {recall:.2f}")
+
+    report = {
+        "inserted": len(stream),
+        "stored": len(store),
+        "copies": len(copies),
+        "unmerged_copies": unmerged,
+        "false_merges": false_merges,
+        "insert_us_per_source": 1e6 * insert_seconds / len(stream),
+        "query_ms_lsh": 1000 * query_seconds,
+        "query_ms_exact": 1000 * exact_seconds,
+        "lsh_recall": recall
+    }
+    return report, problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sources", type=int, default=10000)
+    parser.add_argument("--duplicate-rate", type=float, default=0.2)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    report, problems = run_benchmark(args.sources, args.duplicate_rate, queries=args.queries)
+    for key, value in report.items():
+        print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
+
+    if problems:
+        print(f"Source index check failed with {len(problems)} problems:")
+        for problem in problems:
+            print(f"- {problem}")
+        sys.exit(1)
+    print("Source index check passed")
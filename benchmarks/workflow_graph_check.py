@@ -0,0 +1,182 @@
+"""
+Offline check of the LangGraph workflow: checkpointing, resume and streaming.
+
+Runs the graph with counting stand-in agents, one of which fails once. The
+failed run is resumed with the same run ID and the check verifies that the
+nodes completed before the failure are not run (and paid for) again. Also
+checks that drafting receives the retrieved excerpts and that research stops
+after the same number of rounds as in the sequential workflow, that gaps are
+not identified from the placeholder review of a search without sources, that
+completed runs delete their checkpoints, and that execute_workflow_stream
+streams the drafted answer through the graph.
+
+Needs langgraph and langgraph-checkpoint-sqlite.
+
+Run with: python -m benchmarks.workflow_graph_check
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+from collections import Counter
+from workflows.research_graph import ResearchWorkflowEngine
+
+
+class CountingAgents:
+    """Stand-ins for every agent that count calls and fail once at a chosen step"""
+
+    def __init__(self, fail_at=None, source_count=3):
+        self.calls = Counter()
+        self.fail_at = fail_at
+        self.source_count = source_count
+        self.excerpts = []
+
+    def _call(self, step):
+        self.calls[step] += 1
+        if step == self.fail_at:
+            self.fail_at = None
+            return {"success": False, "error": f"{step} is temporarily unavailable"}
+        return None
+
+    def research(self, query, paper_only=False):
+        failure = self._call("research")
+        sources = [{"title": f"{query} paper {i}", "url": f"https://example.org/{i}",
+                    "content": f"Findings about {query} from study {i}.", "score": 0.5} for i in range(self.source_count)]
+        return failure or {"success": True, "results": sources, "sources": sources, "query": query}
+
+    def analyze(self, search_results):
+        return self._call("analysis") or {"success": True, "analysis": f"Analysis of {len(search_results)} results"}
+
+    def draft_answer(self, question, analysis, excerpts=None):
+        self.excerpts.append(excerpts)
+        return self._call("drafting") or {"success": True, "answer": f"Answer to {question}"}
+
+    def draft_answer_stream(self, question, analysis, excerpts=None):
+        response = self.draft_answer(question, analysis, excerpts)
+        if not response["success"]:
+            raise RuntimeError(response["error"])
+        for word in response["answer"].split(" "):
+            yield word + " "
+
+    def generate_literature_review(self, sources, style="thematic"):
+        return self._call("literature_review") or {"success": True, "literature_review": f"Review of {len(sources)}"}
+
+    def create_paper_summary_rows(self, sources):
+        failure = self._call("summary_table")
+        return failure or {"success": True, "rows": {s["id"]: {"title": s["title"], "summary": "S"} for s in sources}}
+
+    def identify_research_gaps(self, literature_review):
+        return self._call("research_gaps") or {"success": True, "research_gaps": "Gaps"}
+
+
+class AlwaysMoreResearchEngine(ResearchWorkflowEngine):
+    """An engine whose drafts always ask for more research, to exercise the iteration limit"""
+
+    def run_drafting(self, state):
+        state = super().run_drafting(state)
+        state["needs_more_research"] = True
+        return state
+
+    def run_drafting_stream(self, state):
+        yield from super().run_drafting_stream(state)
+        state["needs_more_research"] = True
+
+
+def make_engine(agents, checkpoint_path, engine_class=ResearchWorkflowEngine):
+    return engine_class(research_agent=agents, analysis_agent=agents, drafting_agent=agents,
+                                  literature_review_agent=agents, research_gaps_agent=agents,
+                                  use_graph=True, checkpoint_path=checkpoint_path)
+
+
+def run_check():
+    problems = []
+    report = {}
+    with tempfile.TemporaryDirectory() as directory:
+        checkpoint_path = os.path.join(directory, "checkpoints.sqlite")
+
+        # A post-search node fails; the resumed run only repeats that node
+        agents = CountingAgents(fail_at="research_gaps")
+        engine = make_engine(agents, checkpoint_path)
+        first = engine.execute_graph({"question": "graph check"}, "run-1", post_search=True)
+        if first["status"] != "workflow_failed":
+            problems.append(f"the failing run ended with status {first['status']}")
+        resumed = engine.execute_graph({"question": "graph check"}, "run-1", post_search=True)
+        if resumed["status"] != "workflow_complete" or resumed.get("research_gaps") != "Gaps":
+            problems.append(f"the resumed run ended with status {resumed['status']}")
+        repeated = {step: count for step, count in agents.calls.items() if step != "research_gaps" and count != 1}
+        if repeated or agents.calls["research_gaps"] != 2:
+            problems.append(f"resuming repeated completed steps: {dict(agents.calls)}")
+        report["post_search_calls"] = dict(agents.calls)
+        with sqlite3.connect(checkpoint_path) as conn:
+            kept = conn.execute("SELECT COUNT(*) FROM checkpoints WHERE thread_id = 'run-1'").fetchone()[0]
+        if kept:
+            problems.append(f"the completed run left {kept} checkpoints behind")
+
+        # An early node fails through execute_workflow; retrying with the run ID skips the search
+        agents = CountingAgents(fail_at="analysis")
+        engine = make_engine(agents, checkpoint_path)
+        failed = engine.execute_workflow({"question": "retry check", "run_id": "run-2"})
+        retried = engine.execute_workflow({"question": "retry check", "run_id": "run-2"})
+        if failed["status"] != "workflow_failed" or retried["status"] != "workflow_complete":
+            problems.append(f"expected a failed then a completed run, got {failed['status']}, {retried['status']}")
+        if agents.calls["research"] != 1 or agents.calls["analysis"] != 2:
+            problems.append(f"the retried run searched again: {dict(agents.calls)}")
+        report["retry_calls"] = dict(agents.calls)
+
+        # The chunks retrieved for analysis reach drafting as excerpts, as in the sequential workflow
+        graph_agents, plain_agents = CountingAgents(), CountingAgents()
+        make_engine(graph_agents, checkpoint_path).execute_workflow({"question": "excerpt check"})
+        plain = make_engine(plain_agents, checkpoint_path)
+        plain.use_graph = False
+        plain.execute_workflow({"question": "excerpt check"})
+        if not plain_agents.excerpts[-1] or graph_agents.excerpts[-1] != plain_agents.excerpts[-1]:
+            problems.append("drafting in the graph did not receive the retrieved excerpts")
+
+        # Both paths stop after the same number of follow-up research rounds
+        rounds = {}
+        for use_graph in (True, False):
+            agents = CountingAgents()
+            engine = make_engine(agents, checkpoint_path, AlwaysMoreResearchEngine)
+            engine.use_graph = use_graph
+            state = engine.execute_workflow({"question": f"limit check {use_graph}"})
+            rounds[use_graph] = (agents.calls["research"], state.get("iteration"), state["status"])
+        if rounds[True] != rounds[False]:
+            problems.append(f"graph and sequential runs stop after different rounds: {rounds}")
+        report["research_rounds"] = rounds[False][0]
+
+        # A search without sources leaves only the review placeholder, which must not be analyzed for gaps
+        agents = CountingAgents(source_count=0)
+        empty = make_engine(agents, checkpoint_path).execute_graph({"question": "empty check"}, "run-3",
+                                                                   post_search=True)
+        if empty["status"] != "workflow_complete" or agents.calls["research_gaps"] or empty.get("research_gaps"):
+            problems.append(f"research gaps ran on the placeholder review: {dict(agents.calls)}")
+
+        # The answer streams out of the graph's drafting node
+        agents = CountingAgents()
+        engine = make_engine(agents, checkpoint_path)
+        events = list(engine.execute_workflow_stream({"question": "stream check"}))
+        chunks = [payload for event, payload in events if event == "answer"]
+        event, state = events[-1]
+        if event != "state" or state["status"] != "workflow_complete":
+            problems.append(f"the streamed run ended with {event} {state.get('status')}")
+        elif len(chunks) < 2 or "".join(chunks) != state["answer"]:
+            problems.append("the answer was not streamed chunk by chunk")
+        report["streamed_chunks"] = len(chunks)
+    return report, problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.parse_args()
+
+    report, problems = run_check()
+    for key, value in report.items():
+        print(f"{key}: {value}")
+
+    if problems:
+        print(f"Workflow graph check failed with {len(problems)} problems:")
+        for problem in problems:
+            print(f"- {problem}")
+        sys.exit(1)
+    print("Workflow graph check passed")
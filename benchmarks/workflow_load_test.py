@@ -0,0 +1,143 @@
+"""
+Load test for ResearchWorkflowEngine: run many simultaneous workflows against fake agents.
+
+Checks that every run only sees its own question, sources and answer, and reports
+throughput for thread-based and asyncio-based execution.
+
+Run with: python -m benchmarks.workflow_load_test
+"""
+import argparse
+import asyncio
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from workflows.research_graph import ResearchWorkflowEngine
+
+
+class FakeResearchAgent:
+    """Returns sources derived from the query after a simulated search delay"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def research(self, query, paper_only=False):
+        time.sleep(self.latency)
+        sources = [
+            {"title": f"{query} paper {i}", "url": f"https://example.org/{query}/{i}", "score": 0.5}
+            for i in range(3)
+        ]
+        return {"success": True, "results": sources, "sources": sources, "query": query}
+
+
+class FakeAnalysisAgent:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def analyze(self, search_results):
+        time.sleep(self.latency)
+        titles = "; ".join(result["title"] for result in search_results)
+        return {"success": True, "analysis": f"Analysis of {titles}"}
+
+
+class FakeDraftingAgent:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def draft_answer(self, question, analysis, excerpts=None):
+        time.sleep(self.latency)
+        return {"success": True, "answer": f"Answer to {question} based on {analysis}"}
+
+
+def check_isolation(question, state):
+    """Return a list of problems if the state contains data from another run"""
+    problems = []
+    if state["question"] != question:
+        problems.append(f"question mismatch: {state['question']} != {question}")
+    if not state["answer"].startswith(f"Answer to {question} "):
+        problems.append(f"answer for {question} belongs to another run")
+    for source in state["sources"]:
+        if not source["title"].startswith(f"{question} "):
+            problems.append(f"source {source['title']} leaked into {question}")
+    if state["status"] != "workflow_complete":
+        problems.append(f"run {question} ended with status {state['status']}")
+    return problems
+
+
+def run_threaded(engine, questions, workers):
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        states = list(executor.map(
+            lambda question: engine.execute_workflow({
+                "question": question,
+                "search_results": [],
+                "analysis": "",
+                "answer": "",
+                "needs_more_research": False,
+                "status": "started"
+            }),
+            questions
+        ))
+    return states
+
+
+async def run_async(engine, questions):
+    return await asyncio.gather(*[
+        engine.execute_workflow_async({
+            "question": question,
+            "search_results": [],
+            "analysis": "",
+            "answer": "",
+            "needs_more_research": False,
+            "status": "started"
+        })
+        for question in questions
+    ])
+
+
+def run_load_test(runs: int = 48, latency: float = 0.05, workers: int = 48):
+    engine = ResearchWorkflowEngine(
+        research_agent=FakeResearchAgent(latency),
+        analysis_agent=FakeAnalysisAgent(latency),
+        drafting_agent=FakeDraftingAgent(latency)
+    )
+    questions = [f"question-{i}" for i in range(runs)]
+    serial_estimate = runs * latency * 3
+
+    report = {"runs": runs, "serial_estimate_seconds": serial_estimate}
+    problems = []
+
+    start = time.perf_counter()
+    threaded_states = run_threaded(engine, questions, workers)
+    report["threaded_seconds"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    async_states = asyncio.run(run_async(engine, questions))
+    report["async_seconds"] = time.perf_counter() - start
+
+    for states in (threaded_states, async_states):
+        for question, state in zip(questions, states):
+            problems.extend(check_isolation(question, state))
+        if len({state["run_id"] for state in states}) != runs:
+            problems.append("run IDs are not unique")
+
+    report["threaded_runs_per_second"] = runs / report["threaded_seconds"]
+    report["async_runs_per_second"] = runs / report["async_seconds"]
+    return report, problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=48)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, default=48)
+    args = parser.parse_args()
+
+    report, problems = run_load_test(args.runs, args.latency, args.workers)
+    for key, value in report.items():
+        print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
+
+    if problems:
+        print(f"Isolation check failed with {len(problems)} problems:")
+        for problem in problems[:20]:
+            print(f"- {problem}")
+        sys.exit(1)
+    print("Isolation check passed")
@@ -0,0 +1,3 @@
+"""
+Utilities package for AI research workflow.
+"""
\ No newline at end of file
@@ -0,0 +1,108 @@
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional
+from utils.completion_cache import CompletionCache, CachedResponse, get_default_cache
+from utils.request_governor import GovernedChatClient, get_default_governor
+
+DEFAULT_MAX_CONNECTIONS = 50
+DEFAULT_MAX_CONCURRENT_REQUESTS = 20
+
+
+def create_async_openai_client(api_key: str, max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                               timeout: float = 60.0, max_retries: int = 0):
+    """Create an AsyncOpenAI client backed by one pooled httpx.AsyncClient"""
+    import httpx
+    from openai import AsyncOpenAI
+
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        timeout=timeout
+    )
+    return AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=max_retries)
+
+
+class _AsyncCompletions:
+    def __init__(self, client, cache: Optional[CompletionCache], max_concurrent_requests: int):
+        self._client = client
+        self._cache = cache
+        self._max_concurrent_requests = max_concurrent_requests
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # Semaphores belong to an event loop, so keep one per running loop
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                semaphore = asyncio.Semaphore(self._max_concurrent_requests)
+                self._semaphores[loop] = semaphore
+            return semaphore
+
+    async def create(self, model: str, messages: List[Dict[str, Any]], **params):
+        key = None
+        if self._cache is not None and not params.get("stream"):
+            key = CompletionCache.make_key(model, messages, **params)
+            cached = self._cache.get(key)
+            if cached is not None:
+                return CachedResponse(cached)
+
+        async with self._semaphore():
+            response = await self._client.chat.completions.create(model=model, messages=messages, **params)
+
+        if key is not None and response.choices[0].message.content is not None:
+            self._cache.set(key, response.choices[0].message.content)
+        return response
+
+
+class _AsyncChat:
+    def __init__(self, completions: _AsyncCompletions):
+        self.completions = completions
+
+
+class AsyncChatClient:
+    """Wrap an async OpenAI-compatible client with the completion cache and a concurrency limit"""
+
+    def __init__(self, client, cache: Optional[CompletionCache] = None,
+                 max_concurrent_requests: int = DEFAULT_MAX_CONCURRENT_REQUESTS):
+        self.client = client
+        self.cache = cache
+        self.chat = _AsyncChat(_AsyncCompletions(client, cache, max_concurrent_requests))
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+_shared_async_clients = {}
+_shared_async_clients_lock = threading.Lock()
+
+
+def get_shared_async_chat_client(api_key: str, cache: Optional[CompletionCache] = None,
+                                 use_cache: bool = True) -> AsyncChatClient:
+    """Return the process-wide async chat client for an API key, creating it on first use"""
+    with _shared_async_clients_lock:
+        client = _shared_async_clients.get(api_key)
+        if client is None:
+            client = AsyncChatClient(
+                GovernedChatClient(create_async_openai_client(api_key), get_default_governor(), is_async=True),
+                cache=(cache or get_default_cache()) if use_cache else None
+            )
+            _shared_async_clients[api_key] = client
+        return client
+
+
+class AsyncClientMixin:
+    """Gives an agent an async_client that defaults to the process-wide shared client
+
+    Agents set self.api_key, self._async_client, self._cache and self._use_cache.
+    """
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            self._async_client = get_shared_async_chat_client(
+                self.api_key,
+                cache=self._cache,
+                use_cache=self._use_cache
+            )
+        return self._async_client
@@ -0,0 +1,142 @@
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+from utils.pdf_ingestion import chunk_text
+from utils.prompt_packing import count_tokens
+from utils.source_clustering import STOPWORDS
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords"""
+    return [word for word in re.findall(r"[a-z0-9][a-z0-9\-]+", (text or "").lower()) if word not in STOPWORDS]
+
+
+def _source_text(source: Dict[str, Any]) -> str:
+    content = source.get("raw_content") or source.get("content") or source.get("abstract") or ""
+    if isinstance(content, list):
+        content = " ".join(str(item) for item in content)
+    return str(content)
+
+
+def chunk_sources(sources: Sequence[Dict[str, Any]], model: str = "gpt-3.5-turbo", max_tokens: int = 200,
+                  overlap_tokens: int = 40) -> List[Dict[str, Any]]:
+    """Split each source's content into small overlapping chunks that keep the source's title and URL"""
+    chunks = []
+    for source_index, source in enumerate(sources):
+        pieces = chunk_text(_source_text(source), model=model, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+        for chunk in pieces:
+            chunks.append({
+                "title": source.get("title", ""),
+                "url": source.get("url", ""),
+                "content": chunk["text"],
+                "tokens": chunk["tokens"],
+                "source_index": source_index,
+                "chunk_index": chunk["index"],
+                "source_score": source.get("score") or 0
+            })
+    return chunks
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of chunks
+
+    Postings are stored as flat NumPy arrays grouped by term, so a query
+    scores every chunk with one gather and one bincount instead of a Python
+    loop over documents.
+    """
+
+    def __init__(self, chunks: List[Dict[str, Any]], k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+
+        self._terms: Dict[str, int] = {}
+        term_ids, doc_ids, frequencies = [], [], []
+        lengths = np.zeros(len(chunks), dtype=np.float32)
+        for doc, chunk in enumerate(chunks):
+            # The title is indexed with every chunk so short chunks still match on topic
+            tokens = tokenize(f"{chunk.get('title', '')} {chunk.get('content', '')}")
+            lengths[doc] = len(tokens)
+            for term, count in Counter(tokens).items():
+                term_ids.append(self._terms.setdefault(term, len(self._terms)))
+                doc_ids.append(doc)
+                frequencies.append(count)
+
+        order = np.argsort(np.asarray(term_ids, dtype=np.int64), kind="stable")
+        sorted_terms = np.asarray(term_ids, dtype=np.int64)[order]
+        self._docs = np.asarray(doc_ids, dtype=np.int64)[order]
+        self._tf = np.asarray(frequencies, dtype=np.float32)[order]
+        self._offsets = np.searchsorted(sorted_terms, np.arange(len(self._terms) + 1))
+
+        document_frequency = np.diff(self._offsets).astype(np.float32)
+        self._idf = np.log(1.0 + (len(chunks) - document_frequency + 0.5) / (document_frequency + 0.5))
+        average = float(lengths.mean()) if len(chunks) else 0.0
+        # Per-chunk length normalization of the BM25 denominator, precomputed once
+        self._norms = self.k1 * (1.0 - self.b + self.b * lengths / max(average, 1.0))
+
+    def scores(self, query: str) -> np.ndarray:
+        """Return the BM25 score of every chunk for a query"""
+        term_ids = [self._terms[term] for term in set(tokenize(query)) if term in self._terms]
+        if not term_ids or not self.chunks:
+            return np.zeros(len(self.chunks), dtype=np.float32)
+
+        slices = [np.arange(self._offsets[term], self._offsets[term + 1]) for term in term_ids]
+        positions = np.concatenate(slices)
+        idf = np.repeat(self._idf[term_ids], [len(s) for s in slices])
+        docs = self._docs[positions]
+        tf = self._tf[positions]
+        weights = idf * tf * (self.k1 + 1.0) / (tf + self._norms[docs])
+        return np.bincount(docs, weights=weights, minlength=len(self.chunks))
+
+    def search(self, query: str, k: int = 8, max_per_source: Optional[int] = 3) -> List[Dict[str, Any]]:
+        """Return the k best chunks, most relevant first, with at most max_per_source from one source
+
+        Chunks that share no term with the query are only returned when nothing matches at all.
+        """
+        scores = self.scores(query)
+        # Ties (including no match at all) fall back to the search engine's own ranking
+        order = np.lexsort((-np.asarray([c["source_score"] for c in self.chunks], dtype=np.float32), -scores))
+
+        results = []
+        per_source = Counter()
+        matched = bool(len(scores)) and scores.max() > 0
+        for doc in order:
+            if matched and scores[doc] <= 0:
+                break
+            chunk = self.chunks[doc]
+            if max_per_source and per_source[chunk["source_index"]] >= max_per_source:
+                continue
+            per_source[chunk["source_index"]] += 1
+            results.append(dict(chunk, score=float(scores[doc])))
+            if len(results) == k:
+                break
+        return results
+
+
+def retrieve_chunks(question: str, sources: Sequence[Dict[str, Any]], model: str = "gpt-3.5-turbo", k: int = 8,
+                    chunk_tokens: int = 200, max_per_source: Optional[int] = 3) -> Dict[str, Any]:
+    """Chunk the sources and keep the k chunks most relevant to the question
+
+    Reports the content tokens kept against the content tokens of all sources.
+    """
+    chunks = chunk_sources(sources, model=model, max_tokens=chunk_tokens, overlap_tokens=chunk_tokens // 5)
+    selected = BM25Index(chunks).search(question, k=k, max_per_source=max_per_source)
+    original_tokens = sum(count_tokens(_source_text(source), model) for source in sources)
+    tokens = sum(chunk["tokens"] for chunk in selected)
+    return {
+        "chunks": selected,
+        "total_chunks": len(chunks),
+        "tokens": tokens,
+        "original_tokens": original_tokens,
+        "tokens_saved": max(0, original_tokens - tokens)
+    }
+
+
+def format_excerpts(chunks: Sequence[Dict[str, Any]]) -> str:
+    """Render retrieved chunks as numbered excerpts with their source title and URL"""
+    blocks = []
+    for i, chunk in enumerate(chunks, start=1):
+        header = " | ".join(part for part in [chunk.get("title"), chunk.get("url")] if part)
+        blocks.append(f"[{i}] {header}\n{chunk.get('content', '')}")
+    return "\n\n".join(blocks)
@@ -0,0 +1,285 @@
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+CITATION_STYLES = ["APA", "MLA", "Chicago", "Harvard", "IEEE"]
+
+# Source fields the formatters read; a change to any of them changes the citation
+CITED_FIELDS = ["title", "authors", "year", "publication", "url", "date_accessed"]
+
+
+def parse_authors(authors: Any) -> List[Tuple[List[str], str]]:
+    """Split an authors field into (given names, surname) pairs"""
+    if not authors:
+        return []
+
+    if isinstance(authors, (list, tuple)):
+        names = [str(name) for name in authors]
+    else:
+        text = str(authors).strip()
+        if ";" in text:
+            names = text.split(";")
+        else:
+            names = re.split(r"\s+and\s+|\s*&\s*", text)
+            # "John Smith, Jane Doe" lists names; "Smith, John" is a single inverted name
+            expanded = []
+            for name in names:
+                pieces = [piece.strip() for piece in name.split(",") if piece.strip()]
+                if len(pieces) > 1 and all(" " in piece for piece in pieces):
+                    expanded.extend(pieces)
+                else:
+                    expanded.append(name)
+            names = expanded
+
+    parsed = []
+    for name in names:
+        name = re.sub(r"\s+", " ", name).strip().strip(",")
+        if not name or name.lower() in ("et al", "et al."):
+            continue
+        if "," in name:
+            surname, given = [part.strip() for part in name.split(",", 1)]
+            parsed.append((given.split(), surname))
+        else:
+            parts = name.split(" ")
+            parsed.append((parts[:-1], parts[-1]))
+    return parsed
+
+
+def _initials(given: List[str], spaced: bool = True) -> str:
+    initials = [f"{name[0]}." for name in given if name]
+    return (" " if spaced else "").join(initials)
+
+
+def _join(names: List[str], pair_separator: str, last_separator: str) -> str:
+    if len(names) <= 1:
+        return "".join(names)
+    if len(names) == 2:
+        return f"{names[0]}{pair_separator}{names[1]}"
+    return ", ".join(names[:-1]) + f"{last_separator}{names[-1]}"
+
+
+def _site_name(source: Dict[str, Any]) -> str:
+    if source.get("publication"):
+        return source["publication"]
+    host = urlsplit(source.get("url", "")).netloc.lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def _accessed(source: Dict[str, Any], date_format: str) -> str:
+    value = source.get("date_accessed")
+    if not value:
+        return ""
+    try:
+        date = datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        return value
+    # Citation styles print the day without a leading zero
+    return date.strftime(date_format.replace("%d", str(date.day)))
+
+
+def _title(source: Dict[str, Any]) -> str:
+    return (source.get("title") or "Untitled").strip().rstrip(".")
+
+
+def format_apa(source: Dict[str, Any]) -> str:
+    authors = parse_authors(source.get("authors"))
+    year = source.get("year") or "n.d."
+    names = [f"{surname}, {_initials(given)}".strip(", ") for given, surname in authors]
+    author_text = _join(names, ", & ", ", & ")
+    site = _site_name(source)
+
+    if author_text:
+        citation = f"{author_text} ({year}). {_title(source)}."
+    else:
+        citation = f"{_title(source)}. ({year})."
+    if site:
+        citation += f" *{site}*."
+    if source.get("url"):
+        citation += f" {source['url']}"
+    return citation
+
+
+def format_mla(source: Dict[str, Any]) -> str:
+    authors = parse_authors(source.get("authors"))
+    citation = ""
+    if authors:
+        given, surname = authors[0]
+        first = f"{surname}, {' '.join(given)}".strip(", ")
+        if len(authors) == 1:
+            citation = f"{first}. "
+        elif len(authors) == 2:
+            second_given, second_surname = authors[1]
+            citation = f"{first}, and {' '.join(second_given + [second_surname])}. "
+        else:
+            citation = f"{first}, et al. "
+
+    citation += f"\"{_title(source)}.\""
+    site = _site_name(source)
+    if site:
+        citation += f" *{site}*,"
+    if source.get("year"):
+        citation += f" {source['year']},"
+    if source.get("url"):
+        citation += f" {source['url']}."
+    else:
+        citation = citation.rstrip(",") + "."
+    accessed = _accessed(source, "%d %b. %Y")
+    if accessed:
+        citation += f" Accessed {accessed}."
+    return citation
+
+
+def format_chicago(source: Dict[str, Any]) -> str:
+    authors = parse_authors(source.get("authors"))
+    names = []
+    for position, (given, surname) in enumerate(authors):
+        if position == 0:
+            names.append(f"{surname}, {' '.join(given)}".strip(", "))
+        else:
+            names.append(" ".join(given + [surname]))
+    citation = f"{_join(names, ' and ', ', and ')}. " if names else ""
+
+    citation += f"\"{_title(source)}.\""
+    site = _site_name(source)
+    if site:
+        citation += f" *{site}*"
+    if source.get("year"):
+        citation += f", {source['year']}"
+    citation += "."
+    accessed = _accessed(source, "%B %d, %Y")
+    if accessed:
+        citation += f" Accessed {accessed}."
+    if source.get("url"):
+        citation += f" {source['url']}."
+    return citation
+
+
+def format_harvard(source: Dict[str, Any]) -> str:
+    authors = parse_authors(source.get("authors"))
+    year = source.get("year") or "n.d."
+    names = [f"{surname}, {_initials(given, spaced=False)}".strip(", ") for given, surname in authors]
+    author_text = _join(names, " and ", " and ")
+
+    if author_text:
+        citation = f"{author_text} ({year}) '{_title(source)}'"
+    else:
+        citation = f"{_title(source)} ({year})"
+    site = _site_name(source)
+    if site:
+        citation += f", *{site}*"
+    citation += "."
+    if source.get("url"):
+        citation += f" Available at: {source['url']}"
+        accessed = _accessed(source, "%d %B %Y")
+        if accessed:
+            citation += f" (Accessed: {accessed})"
+        citation += "."
+    return citation
+
+
+def format_ieee(source: Dict[str, Any]) -> str:
+    authors = parse_authors(source.get("authors"))
+    names = [f"{_initials(given)} {surname}".strip() for given, surname in authors]
+    if len(names) > 6:
+        author_text = f"{names[0]} et al."
+    else:
+        author_text = _join(names, " and ", ", and ")
+
+    citation = f"{author_text}, " if author_text else ""
+    citation += f"\"{_title(source)},\""
+    site = _site_name(source)
+    if site:
+        citation += f" *{site}*,"
+    citation += f" {source['year']}." if source.get("year") else " n.d."
+    if source.get("url"):
+        citation += f" [Online]. Available: {source['url']}"
+        accessed = _accessed(source, "%b. %d, %Y")
+        if accessed:
+            citation += f" (accessed {accessed})."
+    return citation
+
+
+FORMATTERS = {
+    "APA": format_apa,
+    "MLA": format_mla,
+    "CHICAGO": format_chicago,
+    "HARVARD": format_harvard,
+    "IEEE": format_ieee,
+}
+
+
+def is_incomplete(source: Dict[str, Any]) -> bool:
+    """Check whether a source lacks the metadata needed for a full citation"""
+    return not source.get("authors") or not source.get("year")
+
+
+def citation_key(source: Dict[str, Any], style: str = "APA") -> str:
+    """Digest of the style and the cited fields of a source, so merged or updated metadata gets a new key"""
+    payload = json.dumps([style.upper()] + [source.get(field) for field in CITED_FIELDS], default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def join_references(entries: List[str], style: str = "APA") -> str:
+    """Merge formatted entries into a references list, sorted alphabetically or numbered for IEEE"""
+    if style.upper() == "IEEE":
+        return "\n\n".join(f"[{index}] {entry}" for index, entry in enumerate(entries, 1))
+
+    entries = sorted(entries, key=lambda entry: re.sub(r"[^\w\s]", "", entry).lower())
+    return "\n\n".join(entries)
+
+
+class CitationFormatter:
+    """Deterministic citation engine with an LRU cache of formatted entries
+
+    Entries are keyed by the cited fields rather than the source ID, so a source
+    whose authors or year are filled in later is formatted again.
+    """
+
+    def __init__(self, fallback: Optional[Callable[[Dict[str, Any], str], Optional[str]]] = None,
+                 max_entries: int = 10000):
+        # Optional callable (source, style) -> citation used for sources with incomplete metadata
+        self.fallback = fallback
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Tuple[str, bool], str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def format_source(self, source: Dict[str, Any], style: str = "APA", use_fallback: bool = True) -> str:
+        """Format a single source, serving repeated requests from the cache"""
+        style_key = style.upper()
+        if style_key not in FORMATTERS:
+            raise ValueError(f"Unsupported citation style: {style}")
+
+        key = (citation_key(source, style_key), use_fallback)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        citation = None
+        if use_fallback and self.fallback is not None and is_incomplete(source):
+            citation = self.fallback(source, style)
+        if not citation:
+            citation = FORMATTERS[style_key](source)
+
+        with self._lock:
+            self._cache[key] = citation
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return citation
+
+    def format_references(self, sources: List[Dict[str, Any]], style: str = "APA", use_fallback: bool = True) -> str:
+        """Format a references list, ordered alphabetically or numbered for IEEE"""
+        entries = [self.format_source(source, style, use_fallback) for source in sources]
+        return join_references(entries, style)
+
+    def clear(self):
+        """Remove all cached entries"""
+        with self._lock:
+            self._cache.clear()
@@ -0,0 +1,239 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "completions.sqlite")
+
+
+class CompletionCache:
+    """Content-addressed SQLite store for chat completions with TTL and LRU eviction"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl_seconds: Optional[float] = 7 * 24 * 3600,
+                 max_entries: int = 5000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            "key TEXT PRIMARY KEY, "
+            "value TEXT NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_completions_last_access ON completions (last_access)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict[str, Any]], **params) -> str:
+        """Hash the model, messages and request parameters into a cache key"""
+        payload = json.dumps(
+            {"model": model, "messages": messages, "params": params},
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached completion text for a key, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            value, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE completions SET last_access = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: str):
+        """Store a completion and evict the least recently used entries over the size bound"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, value, created_at, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+
+            count = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM completions WHERE key IN ("
+                    "SELECT key FROM completions ORDER BY last_access ASC LIMIT ?)",
+                    (overflow,)
+                )
+                self.evictions += overflow
+            self._conn.commit()
+
+    def clear(self):
+        """Remove all cached completions"""
+        with self._lock:
+            self._conn.execute("DELETE FROM completions")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the current number of entries"""
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": size,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+class _CachedMessage:
+    def __init__(self, content: str):
+        self.role = "assistant"
+        self.content = content
+
+
+class _CachedChoice:
+    def __init__(self, content: str):
+        self.index = 0
+        self.message = _CachedMessage(content)
+        self.finish_reason = "stop"
+
+
+class CachedResponse:
+    """Minimal stand-in for a chat completion response served from the cache"""
+
+    def __init__(self, content: str):
+        self.choices = [_CachedChoice(content)]
+        self.cached = True
+
+
+class _CachedDelta:
+    def __init__(self, content: str):
+        self.role = "assistant"
+        self.content = content
+
+
+class _CachedStreamChoice:
+    def __init__(self, content: str):
+        self.index = 0
+        self.delta = _CachedDelta(content)
+        self.finish_reason = "stop"
+
+
+class CachedChunk:
+    """Minimal stand-in for a streamed chat completion chunk served from the cache"""
+
+    def __init__(self, content: str):
+        self.choices = [_CachedStreamChoice(content)]
+        self.cached = True
+
+
+class _CachedCompletions:
+    def __init__(self, client, cache: CompletionCache):
+        self._client = client
+        self._cache = cache
+
+    def _stream(self, key: str, model: str, messages: List[Dict[str, Any]], params: Dict[str, Any]):
+        cached = self._cache.get(key)
+        if cached is not None:
+            yield CachedChunk(cached)
+            return
+
+        parts = []
+        for chunk in self._client.chat.completions.create(model=model, messages=messages, **params):
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+            yield chunk
+        # Only fully consumed streams are cached
+        self._cache.set(key, "".join(parts))
+
+    def create(self, model: str, messages: List[Dict[str, Any]], **params):
+        if params.get("stream"):
+            # Streamed and non-streamed requests share cache entries
+            key_params = {name: value for name, value in params.items() if name != "stream"}
+            key = CompletionCache.make_key(model, messages, **key_params)
+            return self._stream(key, model, messages, params)
+
+        key = CompletionCache.make_key(model, messages, **params)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return CachedResponse(cached)
+
+        response = self._client.chat.completions.create(model=model, messages=messages, **params)
+        content = response.choices[0].message.content
+        if content is not None:
+            self._cache.set(key, content)
+        return response
+
+
+class _CachedChat:
+    def __init__(self, client, cache: CompletionCache):
+        self.completions = _CachedCompletions(client, cache)
+
+
+class CachedChatClient:
+    """Wrap an OpenAI-compatible client so chat completions go through a CompletionCache"""
+
+    def __init__(self, client, cache: CompletionCache):
+        self.client = client
+        self.cache = cache
+        self.chat = _CachedChat(client, cache)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> CompletionCache:
+    """Return the process-wide completion cache shared by all agents"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = CompletionCache(
+                path=os.getenv("COMPLETION_CACHE_PATH", DEFAULT_CACHE_PATH)
+            )
+        return _default_cache
+
+
+def build_chat_client(api_key: str, client=None, cache: Optional[CompletionCache] = None,
+                      use_cache: bool = True):
+    """Create the chat client used by an agent, routed through the completion cache"""
+    if client is None:
+        from openai import OpenAI
+        client = OpenAI(api_key=api_key)
+
+    if not use_cache:
+        return client
+    return CachedChatClient(client, cache or get_default_cache())
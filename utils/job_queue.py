@@ -0,0 +1,138 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+FINISHED_STATUSES = ("completed", "failed")
+
+
+class Job:
+    """A long-running unit of work and the partial-result events it has emitted so far"""
+
+    def __init__(self, kind: str, params: Optional[Dict[str, Any]] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params or {}
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.events: List[Tuple[str, Any]] = []
+        self._condition = threading.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def emit(self, event: str, data: Any):
+        """Record a partial result and wake up any event listeners"""
+        with self._condition:
+            self.events.append((event, data))
+            self._condition.notify_all()
+
+    def _finish(self, status: str, result: Any = None, error: Optional[str] = None):
+        with self._condition:
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished_at = time.time()
+            self._condition.notify_all()
+
+    def iter_events(self, start: int = 0, heartbeat: Optional[float] = None) -> Iterator[Tuple[int, str, Any]]:
+        """Yield (index, event, data) from start until the job finishes
+
+        With a heartbeat, ("heartbeat", None) is yielded with index -1 whenever no
+        event arrived for that many seconds, so callers can keep connections alive.
+        """
+        index = start
+        while True:
+            with self._condition:
+                if index >= len(self.events) and not self.finished:
+                    self._condition.wait(timeout=heartbeat)
+                pending = self.events[index:]
+                finished = self.finished
+
+            for event, data in pending:
+                yield index, event, data
+                index += 1
+
+            if finished and index >= len(self.events):
+                return
+            if not pending and heartbeat is not None:
+                yield -1, "heartbeat", None
+
+    def to_dict(self, include_result: bool = True) -> Dict[str, Any]:
+        data = {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "events": len(self.events),
+        }
+        if self.error is not None:
+            data["error"] = self.error
+        if include_result and self.finished:
+            data["result"] = self.result
+        return data
+
+
+class JobQueue:
+    """Runs jobs on a worker pool that is sized independently of the web server threads
+
+    A job function is called with the Job, may call job.emit() for partial results,
+    and returns the final result. Finished jobs are kept for polling until more
+    than max_finished_jobs have accumulated, then the oldest are dropped.
+    """
+
+    def __init__(self, max_workers: int = 4, max_finished_jobs: int = 500):
+        self.max_workers = max_workers
+        self.max_finished_jobs = max_finished_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job-worker")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, func: Callable[[Job], Any], params: Optional[Dict[str, Any]] = None) -> Job:
+        """Queue a job and return it immediately"""
+        job = Job(kind, params)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job, func)
+        return job
+
+    def _run(self, job: Job, func: Callable[[Job], Any]):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job._finish("completed", result=func(job))
+        except Exception as e:
+            print(f"JobQueue: Job {job.id} ({job.kind}) failed: {str(e)}")
+            job._finish("failed", error=str(e))
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def stats(self) -> Dict[str, Any]:
+        counts = {}
+        for job in self.list():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"workers": self.max_workers, "jobs": counts}
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
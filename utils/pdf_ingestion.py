@@ -0,0 +1,287 @@
+import hashlib
+import io
+import mmap
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, Optional, Tuple, Union
+from utils.prompt_packing import count_tokens
+
+DEFAULT_PDF_CACHE_PATH = os.path.join(".cache", "pdf_extractions.sqlite")
+# Files at least this large are read through mmap instead of buffered reads
+MMAP_THRESHOLD_BYTES = 8 * 1024 * 1024
+HASH_BLOCK_SIZE = 1024 * 1024
+
+PdfInput = Union[str, os.PathLike, bytes, BinaryIO]
+
+
+def file_sha256(pdf: PdfInput) -> str:
+    """Hash a PDF path, bytes or file object in fixed-size blocks"""
+    digest = hashlib.sha256()
+    if isinstance(pdf, bytes):
+        digest.update(pdf)
+        return digest.hexdigest()
+
+    if isinstance(pdf, (str, os.PathLike)):
+        with open(pdf, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    position = pdf.tell()
+    pdf.seek(0)
+    for block in iter(lambda: pdf.read(HASH_BLOCK_SIZE), b""):
+        digest.update(block)
+    pdf.seek(position)
+    return digest.hexdigest()
+
+
+def _clean_page_text(text: str) -> str:
+    # Re-join words hyphenated across line breaks and collapse layout whitespace
+    text = re.sub(r"(\w)-\n(\w)", r"\1\2", text or "")
+    text = re.sub(r"[ \t]+", " ", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def iter_pdf_pages(pdf: PdfInput) -> Iterator[Tuple[int, str]]:
+    """Yield (page_number, text) one page at a time, starting at 1
+
+    Paths are opened lazily; large files are memory-mapped so page objects
+    are read from the OS page cache instead of being copied into memory.
+    """
+    from PyPDF2 import PdfReader
+
+    if isinstance(pdf, bytes):
+        pdf = io.BytesIO(pdf)
+
+    if not isinstance(pdf, (str, os.PathLike)):
+        for number, page in enumerate(PdfReader(pdf).pages, start=1):
+            yield number, _clean_page_text(page.extract_text())
+        return
+
+    with open(pdf, "rb") as f:
+        mapped = None
+        stream = f
+        if os.fstat(f.fileno()).st_size >= MMAP_THRESHOLD_BYTES:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            stream = mapped
+        try:
+            for number, page in enumerate(PdfReader(stream).pages, start=1):
+                yield number, _clean_page_text(page.extract_text())
+        finally:
+            if mapped is not None:
+                mapped.close()
+
+
+def read_pdf_metadata(path: Union[str, os.PathLike]) -> Dict[str, Any]:
+    """Return the title, author and page count stored in a PDF's document info"""
+    from PyPDF2 import PdfReader
+
+    with open(path, "rb") as f:
+        reader = PdfReader(f)
+        info = reader.metadata or {}
+        return {
+            "title": (info.get("/Title") or "").strip(),
+            "author": (info.get("/Author") or "").strip(),
+            "pages": len(reader.pages)
+        }
+
+
+def _split_pieces(text: str, max_tokens: int, model: str) -> Iterator[Tuple[str, int]]:
+    """Split text into sentence-sized (piece, tokens) pairs no larger than max_tokens"""
+    for paragraph in re.split(r"\n\s*\n", text):
+        for sentence in re.split(r"(?<=[.!?])\s+", paragraph.replace("\n", " ")):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            tokens = count_tokens(sentence, model)
+            if tokens <= max_tokens:
+                yield sentence, tokens
+                continue
+            # Very long "sentences" (tables, references) are split on words
+            words = sentence.split(" ")
+            step = max(1, len(words) * max_tokens // tokens)
+            for start in range(0, len(words), step):
+                piece = " ".join(words[start:start + step])
+                yield piece, count_tokens(piece, model)
+
+
+def chunk_pages(pages: Iterable[Tuple[int, str]], model: str = "gpt-3.5-turbo", max_tokens: int = 1500,
+                overlap_tokens: int = 150) -> Iterator[Dict[str, Any]]:
+    """Group page text into overlapping chunks of at most max_tokens tokens
+
+    Works as a stream: only the current chunk and its overlap are held in
+    memory. Each chunk records the pages it spans.
+    """
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+    window = deque()  # (piece, tokens, page_number)
+    window_tokens = 0
+    fresh = False
+    index = 0
+
+    def emit():
+        return {
+            "index": index,
+            "text": " ".join(piece for piece, _, _ in window),
+            "tokens": window_tokens,
+            "start_page": window[0][2],
+            "end_page": window[-1][2]
+        }
+
+    for page_number, text in pages:
+        for piece, tokens in _split_pieces(text, max_tokens - overlap_tokens, model):
+            if window_tokens + tokens > max_tokens and fresh:
+                yield emit()
+                index += 1
+                # Keep the tail of the chunk as overlap for the next one
+                while window and window_tokens > overlap_tokens:
+                    window_tokens -= window.popleft()[1]
+                fresh = False
+            window.append((piece, tokens, page_number))
+            window_tokens += tokens
+            fresh = True
+
+    if fresh:
+        yield emit()
+
+
+def chunk_text(text: str, model: str = "gpt-3.5-turbo", max_tokens: int = 1500,
+               overlap_tokens: int = 150) -> Iterator[Dict[str, Any]]:
+    """Chunk plain text that did not come from a PDF"""
+    return chunk_pages([(1, text)], model=model, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+
+
+class PdfExtractionCache:
+    """SQLite store of extracted page text keyed by the PDF's SHA-256
+
+    Pages are written as they are extracted and read back in small batches,
+    so neither direction needs the whole document in memory. A document only
+    counts as cached once every page has been stored.
+    """
+
+    def __init__(self, path: str = DEFAULT_PDF_CACHE_PATH, read_batch_size: int = 16):
+        self.path = path
+        self.read_batch_size = read_batch_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Import worker processes write to the same file, so wait on locks and use WAL
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pdf_documents ("
+            "file_hash TEXT PRIMARY KEY, "
+            "page_count INTEGER NOT NULL, "
+            "extracted_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pdf_pages ("
+            "file_hash TEXT NOT NULL, "
+            "page_number INTEGER NOT NULL, "
+            "text TEXT NOT NULL, "
+            "PRIMARY KEY (file_hash, page_number))"
+        )
+        self._conn.commit()
+
+    def page_count(self, file_hash: str) -> Optional[int]:
+        """Return the page count of a fully cached document, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT page_count FROM pdf_documents WHERE file_hash = ?", (file_hash,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def iter_pages(self, file_hash: str) -> Iterator[Tuple[int, str]]:
+        last_page = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT page_number, text FROM pdf_pages WHERE file_hash = ? AND page_number > ? "
+                    "ORDER BY page_number LIMIT ?",
+                    (file_hash, last_page, self.read_batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for page_number, text in rows:
+                yield page_number, text
+            last_page = rows[-1][0]
+
+    def store_pages(self, file_hash: str, pages: Iterable[Tuple[int, str]]) -> Iterator[Tuple[int, str]]:
+        """Pass pages through while writing them; the document is marked complete at the end"""
+        count = 0
+        for page_number, text in pages:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO pdf_pages (file_hash, page_number, text) VALUES (?, ?, ?)",
+                    (file_hash, page_number, text)
+                )
+                if page_number % 16 == 0:
+                    self._conn.commit()
+            count += 1
+            yield page_number, text
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pdf_documents (file_hash, page_count, extracted_at) VALUES (?, ?, ?)",
+                (file_hash, count, time.time())
+            )
+            self._conn.commit()
+
+    def invalidate(self, file_hash: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM pdf_documents WHERE file_hash = ?", (file_hash,))
+            self._conn.execute("DELETE FROM pdf_pages WHERE file_hash = ?", (file_hash,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM pdf_documents")
+            self._conn.execute("DELETE FROM pdf_pages")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            documents = self._conn.execute("SELECT COUNT(*) FROM pdf_documents").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "documents": documents}
+
+
+def extract_pages(pdf: PdfInput, cache: Optional["PdfExtractionCache"] = None,
+                  file_hash: Optional[str] = None, store: bool = True) -> Iterator[Tuple[int, str]]:
+    """Yield page text from the cache when the file was extracted before, otherwise from the PDF
+
+    Pass store=False when only the opening pages will be read: a cache miss is then
+    read straight from the PDF instead of leaving a partial, never completed entry.
+    """
+    if cache is None:
+        yield from iter_pdf_pages(pdf)
+        return
+
+    file_hash = file_hash or file_sha256(pdf)
+    if cache.page_count(file_hash) is not None:
+        cache.hits += 1
+        yield from cache.iter_pages(file_hash)
+        return
+
+    cache.misses += 1
+    yield from cache.store_pages(file_hash, iter_pdf_pages(pdf)) if store else iter_pdf_pages(pdf)
+
+
+_default_pdf_cache = None
+_default_pdf_cache_lock = threading.Lock()
+
+
+def get_default_pdf_cache() -> PdfExtractionCache:
+    """Return the process-wide PDF extraction cache"""
+    global _default_pdf_cache
+    with _default_pdf_cache_lock:
+        if _default_pdf_cache is None:
+            _default_pdf_cache = PdfExtractionCache(os.getenv("PDF_CACHE_PATH", DEFAULT_PDF_CACHE_PATH))
+        return _default_pdf_cache
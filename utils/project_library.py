@@ -0,0 +1,363 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+from utils.source_store import make_source_id, normalize_title, normalize_url, source_domain
+
+DEFAULT_LIBRARY_PATH = os.path.join("data", "research_projects.sqlite")
+
+# Workflow outputs kept per project; the dict-valued ones are stored as JSON
+ARTEFACT_KINDS = [
+    "literature_review", "research_gaps", "research_gaps_state", "references_list", "paper_summary_table",
+    "paper_summary_rows", "reference_entries", "citation_style"
+]
+
+
+def fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query that prefix-matches every word"""
+    words = re.findall(r"\w+", text or "")
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def _publication(source: Dict[str, Any]) -> str:
+    publication = source.get("publication") or ""
+    return ", ".join(publication) if isinstance(publication, list) else str(publication)
+
+
+def _year(source: Dict[str, Any]) -> Optional[int]:
+    for value in (source.get("year"), source.get("publication"), source.get("date")):
+        match = re.search(r"\b(19|20)\d{2}\b", str(value or ""))
+        if match:
+            return int(match.group(0))
+    return None
+
+
+def _fts_values(source: Dict[str, Any]):
+    """Title, authors and content as indexed by sources_fts"""
+    authors = source.get("authors") or ""
+    content = source.get("abstract") or source.get("content") or ""
+    return (source.get("title", ""),
+            ", ".join(authors) if isinstance(authors, list) else str(authors),
+            " ".join(content) if isinstance(content, list) else str(content))
+
+
+class ProjectLibrary:
+    """Persistent SQLite store of research projects, their sources, runs and artefacts
+
+    Sources are kept in insertion order with an FTS5 index over title,
+    authors and content, so the UI can page through or search a large
+    project without loading it. Source dicts are stored whole as JSON.
+    """
+
+    def __init__(self, path: str = DEFAULT_LIBRARY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS projects ("
+            "id INTEGER PRIMARY KEY, "
+            "name TEXT NOT NULL UNIQUE, "
+            "created_at REAL NOT NULL, "
+            "updated_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS sources ("
+            "id INTEGER PRIMARY KEY, "
+            "project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE, "
+            "source_id TEXT NOT NULL, "
+            "url_key TEXT NOT NULL, "
+            "title_key TEXT NOT NULL, "
+            "title TEXT NOT NULL, "
+            "year INTEGER, "
+            "publication TEXT, "
+            "domain TEXT, "
+            "data TEXT NOT NULL, "
+            "added_at REAL NOT NULL, "
+            "UNIQUE (project_id, source_id));"
+            "CREATE INDEX IF NOT EXISTS sources_by_project ON sources (project_id, id);"
+            "CREATE INDEX IF NOT EXISTS sources_by_url ON sources (project_id, url_key);"
+            "CREATE INDEX IF NOT EXISTS sources_by_title ON sources (project_id, title_key);"
+            "CREATE VIRTUAL TABLE IF NOT EXISTS sources_fts USING fts5 (title, authors, content);"
+            "CREATE TABLE IF NOT EXISTS runs ("
+            "id INTEGER PRIMARY KEY, "
+            "project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE, "
+            "question TEXT NOT NULL, "
+            "status TEXT, "
+            "answer TEXT, "
+            "created_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS artefacts ("
+            "project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE, "
+            "kind TEXT NOT NULL, "
+            "value TEXT NOT NULL, "
+            "updated_at REAL NOT NULL, "
+            "PRIMARY KEY (project_id, kind));"
+        )
+        self._add_filter_columns()
+        # Created after the columns, which older libraries only get in _add_filter_columns
+        self._conn.executescript(
+            "CREATE INDEX IF NOT EXISTS sources_by_domain ON sources (project_id, domain);"
+            "CREATE INDEX IF NOT EXISTS sources_by_publication ON sources (project_id, publication);"
+        )
+        self._conn.commit()
+
+    def _add_filter_columns(self):
+        """Add and backfill the publication and domain columns in libraries created before they existed"""
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(sources)")}
+        if {"publication", "domain"} <= columns:
+            return
+        for column in ("publication", "domain"):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE sources ADD COLUMN {column} TEXT")
+        rows = self._conn.execute("SELECT id, data FROM sources").fetchall()
+        for row in rows:
+            source = json.loads(row["data"])
+            self._conn.execute(
+                "UPDATE sources SET publication = ?, domain = ? WHERE id = ?",
+                (_publication(source), source_domain(source.get("url", "")), row["id"])
+            )
+
+    def _touch(self, project_id: int):
+        self._conn.execute("UPDATE projects SET updated_at = ? WHERE id = ?", (time.time(), project_id))
+
+    def get_or_create_project(self, name: str) -> int:
+        """Return the ID of the project with this name, creating it if needed"""
+        with self._lock:
+            row = self._conn.execute("SELECT id FROM projects WHERE name = ?", (name,)).fetchone()
+            if row:
+                return row["id"]
+            now = time.time()
+            cursor = self._conn.execute(
+                "INSERT INTO projects (name, created_at, updated_at) VALUES (?, ?, ?)", (name, now, now)
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def list_projects(self) -> List[Dict[str, Any]]:
+        """Return projects with their source counts, most recently updated first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT p.id, p.name, p.updated_at, "
+                "(SELECT COUNT(*) FROM sources s WHERE s.project_id = p.id) AS source_count "
+                "FROM projects p ORDER BY p.updated_at DESC"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def delete_project(self, project_id: int):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM sources_fts WHERE rowid IN (SELECT id FROM sources WHERE project_id = ?)", (project_id,)
+            )
+            for table in ("sources", "runs", "artefacts"):
+                self._conn.execute(f"DELETE FROM {table} WHERE project_id = ?", (project_id,))
+            self._conn.execute("DELETE FROM projects WHERE id = ?", (project_id,))
+            self._conn.commit()
+
+    def add_sources(self, project_id: int, sources: Sequence[Dict[str, Any]]) -> List[str]:
+        """Store sources not yet in the project (by ID, normalized URL or title); return the new IDs"""
+        added = []
+        now = time.time()
+        with self._lock:
+            for source in sources:
+                source_id = source.get("id") or make_source_id(source)
+                url_key = normalize_url(source.get("url", ""))
+                title_key = normalize_title(source.get("title", ""))
+                # Separate lookups so each one uses its index
+                checks = [("source_id", source_id), ("url_key", url_key), ("title_key", title_key)]
+                if any(value and self._conn.execute(
+                    f"SELECT 1 FROM sources WHERE project_id = ? AND {column} = ?", (project_id, value)
+                ).fetchone() for column, value in checks):
+                    continue
+
+                data = dict(source, id=source_id)
+                cursor = self._conn.execute(
+                    "INSERT INTO sources (project_id, source_id, url_key, title_key, title, year, publication, "
+                    "domain, data, added_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (project_id, source_id, url_key, title_key, source.get("title", ""), _year(source),
+                     _publication(source), source_domain(source.get("url", "")), json.dumps(data), now)
+                )
+                self._conn.execute(
+                    "INSERT INTO sources_fts (rowid, title, authors, content) VALUES (?, ?, ?, ?)",
+                    (cursor.lastrowid,) + _fts_values(source)
+                )
+                added.append(source_id)
+            if added:
+                self._touch(project_id)
+            self._conn.commit()
+        return added
+
+    def update_source(self, project_id: int, source: Dict[str, Any]):
+        """Replace the stored data of a source, for example after a duplicate was merged into it
+
+        The lookup keys, filter columns and full-text row are rebuilt from the new data.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM sources WHERE project_id = ? AND source_id = ?", (project_id, source["id"])
+            ).fetchone()
+            if row is None:
+                return
+            self._conn.execute(
+                "UPDATE sources SET url_key = ?, title_key = ?, title = ?, year = ?, publication = ?, domain = ?, "
+                "data = ? WHERE id = ?",
+                (normalize_url(source.get("url", "")), normalize_title(source.get("title", "")),
+                 source.get("title", ""), _year(source), _publication(source), source_domain(source.get("url", "")),
+                 json.dumps(source), row["id"])
+            )
+            self._conn.execute("DELETE FROM sources_fts WHERE rowid = ?", (row["id"],))
+            self._conn.execute(
+                "INSERT INTO sources_fts (rowid, title, authors, content) VALUES (?, ?, ?, ?)",
+                (row["id"],) + _fts_values(source)
+            )
+            self._conn.commit()
+
+    def remove_source(self, project_id: int, source_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM sources WHERE project_id = ? AND source_id = ?", (project_id, source_id)
+            ).fetchone()
+            if row is None:
+                return False
+            self._conn.execute("DELETE FROM sources_fts WHERE rowid = ?", (row["id"],))
+            self._conn.execute("DELETE FROM sources WHERE id = ?", (row["id"],))
+            self._touch(project_id)
+            self._conn.commit()
+            return True
+
+    def _where(self, project_id: int, query: Optional[str], filters: Optional[Dict[str, Any]] = None):
+        """Build the WHERE clause for a full-text query and filters
+
+        Filters: year_from, year_to, publication (substring) and domain (exact host).
+        """
+        clauses = ["s.project_id = ?"]
+        params: List[Any] = [project_id]
+        match = fts_query(query)
+        if match:
+            clauses.append("s.id IN (SELECT rowid FROM sources_fts WHERE sources_fts MATCH ?)")
+            params.append(match)
+
+        filters = filters or {}
+        if filters.get("year_from") is not None:
+            clauses.append("s.year >= ?")
+            params.append(filters["year_from"])
+        if filters.get("year_to") is not None:
+            clauses.append("s.year <= ?")
+            params.append(filters["year_to"])
+        if filters.get("publication"):
+            clauses.append("s.publication LIKE ?")
+            params.append(f"%{filters['publication']}%")
+        if filters.get("domain"):
+            clauses.append("s.domain = ?")
+            params.append(filters["domain"])
+        return " AND ".join(clauses), params
+
+    def count_sources(self, project_id: int, query: Optional[str] = None,
+                      filters: Optional[Dict[str, Any]] = None) -> int:
+        """Count a project's sources, optionally only those matching a full-text query and filters"""
+        where, params = self._where(project_id, query, filters)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM sources s WHERE {where}", params).fetchone()[0]
+
+    def page_sources(self, project_id: int, page: int = 0, page_size: int = 20, query: Optional[str] = None,
+                     filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Return one page of sources in insertion order, optionally filtered by a full-text query and filters"""
+        where, params = self._where(project_id, query, filters)
+        with self._lock:
+            # The offset is skipped over the (project_id, id) index; only the page's rows are read whole
+            rows = self._conn.execute(
+                f"SELECT data FROM sources WHERE id IN (SELECT s.id FROM sources s WHERE {where} "
+                "ORDER BY s.id LIMIT ? OFFSET ?) ORDER BY id",
+                params + [page_size, page * page_size]
+            ).fetchall()
+        return [json.loads(row["data"]) for row in rows]
+
+    def source_facets(self, project_id: int, limit: int = 50) -> Dict[str, Any]:
+        """Return the year range and the most common publications and domains, for filter widgets"""
+        with self._lock:
+            years = self._conn.execute(
+                "SELECT MIN(year), MAX(year) FROM sources WHERE project_id = ?", (project_id,)
+            ).fetchone()
+            facets = {"years": (years[0], years[1]) if years[0] is not None else None}
+            for column in ("publication", "domain"):
+                rows = self._conn.execute(
+                    f"SELECT {column} AS value, COUNT(*) AS count FROM sources "
+                    f"WHERE project_id = ? AND {column} != '' GROUP BY {column} ORDER BY count DESC LIMIT ?",
+                    (project_id, limit)
+                ).fetchall()
+                facets[f"{column}s"] = [(row["value"], row["count"]) for row in rows]
+        return facets
+
+    def iter_sources(self, project_id: int, batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """Yield all sources of a project in insertion order, reading in batches"""
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, data FROM sources WHERE project_id = ? AND id > ? ORDER BY id LIMIT ?",
+                    (project_id, last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield json.loads(row["data"])
+            last_id = rows[-1]["id"]
+
+    def record_run(self, project_id: int, state: Dict[str, Any]) -> int:
+        """Store the question, status and answer of a workflow run"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO runs (project_id, question, status, answer, created_at) VALUES (?, ?, ?, ?, ?)",
+                (project_id, state.get("question", ""), state.get("status"), state.get("answer"), time.time())
+            )
+            self._touch(project_id)
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def list_runs(self, project_id: int, limit: int = 20) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, question, status, answer, created_at FROM runs WHERE project_id = ? "
+                "ORDER BY id DESC LIMIT ?", (project_id, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def save_artefacts(self, project_id: int, **artefacts):
+        """Store workflow outputs such as literature_review or reference_entries"""
+        now = time.time()
+        with self._lock:
+            for kind, value in artefacts.items():
+                if kind not in ARTEFACT_KINDS:
+                    raise ValueError(f"Unknown artefact kind: {kind}")
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO artefacts (project_id, kind, value, updated_at) VALUES (?, ?, ?, ?)",
+                    (project_id, kind, json.dumps(value), now)
+                )
+            self._touch(project_id)
+            self._conn.commit()
+
+    def load_artefacts(self, project_id: int) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT kind, value FROM artefacts WHERE project_id = ?", (project_id,)
+            ).fetchall()
+        return {row["kind"]: json.loads(row["value"]) for row in rows}
+
+
+_default_library = None
+_default_library_lock = threading.Lock()
+
+
+def get_default_library() -> ProjectLibrary:
+    """Return the process-wide project library"""
+    global _default_library
+    with _default_library_lock:
+        if _default_library is None:
+            _default_library = ProjectLibrary(os.getenv("PROJECT_LIBRARY_PATH", DEFAULT_LIBRARY_PATH))
+        return _default_library
@@ -0,0 +1,146 @@
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to a character-based estimate
+    tiktoken = None
+
+# Context windows per model; the sources get a share of it, the rest is left for
+# instructions and the completion
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+SOURCE_BUDGET_SHARE = 0.6
+
+METADATA_FIELDS = ["title", "authors", "year", "publication", "url"]
+CONTENT_FIELDS = ["abstract", "content"]
+
+_encoders = {}
+
+
+def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    """Count tokens locally with tiktoken when available, otherwise estimate from characters"""
+    if not text:
+        return 0
+
+    if tiktoken is not None:
+        encoder = _encoders.get(model)
+        if encoder is None:
+            try:
+                encoder = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoder = tiktoken.get_encoding("cl100k_base")
+            _encoders[model] = encoder
+        return len(encoder.encode(text))
+
+    # Roughly four characters per token for English text
+    return max(1, (len(text) + 3) // 4)
+
+
+def source_token_budget(model: str) -> int:
+    """Return the number of prompt tokens sources may use for a model"""
+    window = MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+    return int(window * SOURCE_BUDGET_SHARE)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = "gpt-3.5-turbo") -> str:
+    """Truncate text at a word boundary so it fits in max_tokens"""
+    if max_tokens <= 0 or not text:
+        return ""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+
+    # Start from the character estimate and shrink until it fits
+    cut = max_tokens * 4
+    while cut > 0:
+        candidate = text[:cut].rsplit(" ", 1)[0] if " " in text[:cut] else text[:cut]
+        if count_tokens(candidate + "...", model) <= max_tokens:
+            return candidate + "..."
+        cut = int(cut * 0.8)
+    return ""
+
+
+def estimate_dict_tokens(items: Sequence[Dict[str, Any]]) -> int:
+    """Estimate the tokens of str(items) from character counts, without tokenizing"""
+    chars = 2
+    for item in items:
+        # Quotes, colons and separators add about six characters per key
+        chars += 2 + sum(len(str(key)) + len(str(value)) + 6 for key, value in item.items())
+    return (chars + 3) // 4
+
+
+def _format_source(index: int, source: Dict[str, Any], fields: Sequence[str], content: str) -> str:
+    parts = []
+    for field in fields:
+        value = source.get(field)
+        if not value:
+            continue
+        if isinstance(value, (list, tuple)):
+            value = ", ".join(str(item) for item in value)
+        parts.append(f"{field.replace('_', ' ').capitalize()}: {value}")
+
+    text = f"[{index}] " + " | ".join(parts)
+    if content:
+        text += f"\n{content}"
+    return text
+
+
+def pack_sources(sources: List[Dict[str, Any]], model: str = "gpt-3.5-turbo",
+                 fields: Optional[Sequence[str]] = None, include_content: bool = True,
+                 max_tokens: Optional[int] = None, max_content_tokens: int = 300) -> Dict[str, Any]:
+    """Serialize sources compactly and fit them to a token budget
+
+    Sources are ranked by score so the most relevant ones are kept when the
+    budget runs out. Only the listed metadata fields and, optionally, a
+    truncated abstract/content are included. The result reports roughly how
+    many tokens were saved compared to interpolating str(sources); that
+    baseline is estimated from character counts rather than tokenized.
+    """
+    fields = list(fields or METADATA_FIELDS)
+    budget = max_tokens if max_tokens is not None else source_token_budget(model)
+    original_tokens = estimate_dict_tokens(sources)
+
+    ranked = sorted(sources, key=lambda source: source.get("score") or 0, reverse=True)
+
+    blocks = []
+    used_tokens = 0
+    dropped = 0
+    for source in ranked:
+        content = ""
+        if include_content:
+            raw = next((source.get(field) for field in CONTENT_FIELDS if source.get(field)), "")
+            content = truncate_to_tokens(re.sub(r"\s+", " ", str(raw)).strip(), max_content_tokens, model)
+
+        block = _format_source(len(blocks) + 1, source, fields, content)
+        block_tokens = count_tokens(block, model)
+
+        # Shrink the content of this source before giving up on it
+        if used_tokens + block_tokens > budget and content:
+            remaining = budget - used_tokens - count_tokens(_format_source(len(blocks) + 1, source, fields, ""), model)
+            content = truncate_to_tokens(content, remaining - 1, model)
+            block = _format_source(len(blocks) + 1, source, fields, content)
+            block_tokens = count_tokens(block, model)
+
+        if used_tokens + block_tokens > budget:
+            dropped += 1
+            continue
+
+        blocks.append(block)
+        used_tokens += block_tokens + 1
+
+    text = "\n".join(blocks)
+    packed_tokens = count_tokens(text, model)
+    return {
+        "text": text,
+        "included": len(blocks),
+        "dropped": dropped,
+        "tokens": packed_tokens,
+        "original_tokens": original_tokens,
+        "tokens_saved": max(0, original_tokens - packed_tokens)
+    }
@@ -0,0 +1,459 @@
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from utils.prompt_packing import count_tokens
+from utils.search_cache import is_search_results
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+DEFAULT_COMPLETION_TOKENS = 512
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERROR_NAMES = {
+    "APITimeoutError", "APIConnectionError", "InternalServerError", "RateLimitError",
+    "Timeout", "TimeoutException", "ReadTimeout", "ConnectTimeout", "ConnectError"
+}
+# 429s that will not succeed on retry
+NON_RETRYABLE_ERROR_CODES = {"insufficient_quota"}
+
+_current_priority = contextvars.ContextVar("request_priority", default=None)
+
+
+@contextlib.contextmanager
+def request_priority(priority: int):
+    """Send the API calls made inside the block with this priority (lower goes first)"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def current_priority(default: int = PRIORITY_INTERACTIVE) -> int:
+    priority = _current_priority.get()
+    return default if priority is None else priority
+
+
+class SearchToolError(Exception):
+    """An error a search tool returned as its result instead of raising it
+
+    LangChain tools such as TavilySearchResults catch HTTP errors and return
+    repr(error); the status code and Retry-After are recovered from that text
+    where it contains them, so the governor can retry and back off as usual.
+    """
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None,
+                 error_name: Optional[str] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.error_name = error_name
+
+
+def search_tool_error(result: Any) -> Optional[SearchToolError]:
+    """Return a SearchToolError if a search tool returned anything but a list of result dicts"""
+    if is_search_results(result):
+        return None
+    message = str(result)
+    name = re.match(r"\s*(\w+)\(", message)
+    status = re.search(r"\b([45]\d\d) (?:Client|Server) Error|status(?:_code)?=([45]\d\d)\b", message)
+    retry_after = re.search(r"retry-after['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)", message, flags=re.IGNORECASE)
+    return SearchToolError(
+        f"Search tool returned an error: {message[:300]}",
+        status_code=int(status.group(1) or status.group(2)) if status else None,
+        retry_after=float(retry_after.group(1)) if retry_after else None,
+        error_name=name.group(1) if name else None
+    )
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def is_retryable(error: Exception) -> bool:
+    """Return True for rate limits, timeouts, connection errors and 5xx responses"""
+    if getattr(error, "code", None) in NON_RETRYABLE_ERROR_CODES:
+        return False
+    if _status_code(error) in RETRYABLE_STATUS_CODES:
+        return True
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return (getattr(error, "error_name", None) or type(error).__name__) in RETRYABLE_ERROR_NAMES
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read the Retry-After delay from an error's HTTP response, if the server sent one"""
+    if getattr(error, "retry_after", None) is not None:
+        return max(0.0, float(error.retry_after))
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms") is not None:
+            return float(headers["retry-after-ms"]) / 1000.0
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_request_tokens(model: str, messages: List[Dict[str, Any]], max_tokens: Optional[int] = None) -> int:
+    """Estimate prompt plus completion tokens for a chat request before it is sent"""
+    prompt = sum(count_tokens(str(message.get("content") or ""), model) + 4 for message in messages)
+    return prompt + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+
+class TokenBucket:
+    """Refills at rate_per_minute up to capacity; not thread-safe on its own"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate_per_minute))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount can be taken; requests larger than capacity wait for a full bucket"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate_per_second)
+        self.updated = now
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        needed = min(amount, self.capacity)
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / self.rate_per_second
+
+    def take(self, amount: float):
+        # May go negative, so a large request is paid back before the next one
+        self.tokens -= amount
+
+
+class RequestGovernor:
+    """Shared throttle and retry layer for calls to rate-limited APIs
+
+    Limits are token buckets per provider and, optionally, per provider and
+    model, for requests per minute and tokens per minute. Callers queue per
+    provider and model in priority order, so interactive requests go ahead of
+    batch ones. Transient failures are retried with jittered exponential
+    backoff; a Retry-After from the server pauses every caller of that
+    provider and model for the requested time.
+    """
+
+    def __init__(self, max_retries: int = 5, base_delay: float = 0.5, max_delay: float = 30.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._buckets: Dict[str, Dict[str, TokenBucket]] = {}
+        self._queues: Dict[Tuple[str, Optional[str]], list] = {}
+        self._condition = threading.Condition()
+        self._sequence = itertools.count()
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "failures": 0}
+
+    @staticmethod
+    def _scope(provider: str, model: Optional[str] = None) -> str:
+        return f"{provider}:{model}" if model else provider
+
+    def configure(self, provider: str, model: Optional[str] = None, requests_per_minute: Optional[float] = None,
+                  tokens_per_minute: Optional[float] = None, burst: Optional[float] = None):
+        """Set the limits for a provider, or for one model of a provider"""
+        buckets = {}
+        if requests_per_minute:
+            buckets["requests"] = TokenBucket(requests_per_minute, burst)
+        if tokens_per_minute:
+            buckets["tokens"] = TokenBucket(tokens_per_minute)
+        with self._condition:
+            self._buckets[self._scope(provider, model)] = buckets
+            self._condition.notify_all()
+
+    def _limits(self, provider: str, model: Optional[str]) -> List[Dict[str, TokenBucket]]:
+        scopes = [self._scope(provider)]
+        if model:
+            scopes.append(self._scope(provider, model))
+        return [self._buckets[scope] for scope in scopes if scope in self._buckets]
+
+    def _enqueue(self, provider: str, model: Optional[str], priority: int, sequence: Optional[int]):
+        entry = [priority, next(self._sequence) if sequence is None else sequence, object()]
+        with self._condition:
+            heapq.heappush(self._queues.setdefault((provider, model), []), entry)
+        return entry
+
+    def _dequeue(self, provider: str, model: Optional[str], entry):
+        queue = self._queues[(provider, model)]
+        if entry in queue:
+            queue.remove(entry)
+            heapq.heapify(queue)
+        self._condition.notify_all()
+
+    def _try_acquire(self, provider: str, model: Optional[str], tokens: float, entry) -> Optional[float]:
+        """Take capacity if entry is first in its queue; return 0, the wait in seconds, or None if not first"""
+        if self._queues[(provider, model)][0] is not entry:
+            return None
+
+        now = time.monotonic()
+        limits = self._limits(provider, model)
+        wait = 0.0
+        for buckets in limits:
+            for kind, bucket in buckets.items():
+                wait = max(wait, bucket.wait_time(1 if kind == "requests" else tokens, now))
+        if wait > 0:
+            return wait
+
+        for buckets in limits:
+            for kind, bucket in buckets.items():
+                bucket.take(1 if kind == "requests" else tokens)
+        self._dequeue(provider, model, entry)
+        self.stats["requests"] += 1
+        return 0.0
+
+    def acquire(self, provider: str, model: Optional[str] = None, tokens: float = 0,
+                priority: Optional[int] = None, sequence: Optional[int] = None) -> int:
+        """Block until the request may be sent; returns its sequence number for retries"""
+        entry = self._enqueue(provider, model, current_priority() if priority is None else priority, sequence)
+        granted = False
+        try:
+            with self._condition:
+                while True:
+                    wait = self._try_acquire(provider, model, tokens, entry)
+                    if wait == 0:
+                        granted = True
+                        return entry[1]
+                    self._condition.wait(timeout=wait)
+        finally:
+            if not granted:
+                with self._condition:
+                    self._dequeue(provider, model, entry)
+
+    async def acquire_async(self, provider: str, model: Optional[str] = None, tokens: float = 0,
+                            priority: Optional[int] = None, sequence: Optional[int] = None) -> int:
+        """Async version of acquire that sleeps on the event loop instead of blocking a thread"""
+        entry = self._enqueue(provider, model, current_priority() if priority is None else priority, sequence)
+        granted = False
+        try:
+            while True:
+                with self._condition:
+                    wait = self._try_acquire(provider, model, tokens, entry)
+                if wait == 0:
+                    granted = True
+                    return entry[1]
+                await asyncio.sleep(min(wait, 0.05) if wait is not None else 0.01)
+        finally:
+            if not granted:
+                with self._condition:
+                    self._dequeue(provider, model, entry)
+
+    def record_usage(self, provider: str, model: Optional[str], extra_tokens: float):
+        """Correct the token buckets once the real usage of a request is known"""
+        if not extra_tokens:
+            return
+        with self._condition:
+            for buckets in self._limits(provider, model):
+                if "tokens" in buckets:
+                    buckets["tokens"].take(extra_tokens)
+
+    def _pause(self, provider: str, model: Optional[str], seconds: float):
+        until = time.monotonic() + seconds
+        with self._condition:
+            for buckets in self._limits(provider, model):
+                for bucket in buckets.values():
+                    bucket.blocked_until = max(bucket.blocked_until, until)
+
+    def _retry_delay(self, provider: str, model: Optional[str], error: Exception, attempt: int) -> Optional[float]:
+        """Return how long to wait before retrying, or None if the error should be raised"""
+        if attempt >= self.max_retries or not is_retryable(error):
+            self.stats["failures"] += 1
+            return None
+
+        self.stats["retries"] += 1
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            # Never retry earlier than the server asked; jitter spreads out the callers it released
+            delay = retry_after + random.uniform(0, self.base_delay)
+        if _status_code(error) == 429:
+            self.stats["throttled"] += 1
+            self._pause(provider, model, delay)
+        return delay
+
+    def call(self, provider: str, func: Callable[[], Any], model: Optional[str] = None, tokens: float = 0,
+             priority: Optional[int] = None, usage: Optional[Callable[[Any], Optional[int]]] = None):
+        """Call func within the limits, retrying transient failures with backoff"""
+        priority = current_priority() if priority is None else priority
+        sequence = None
+        attempt = 0
+        while True:
+            sequence = self.acquire(provider, model, tokens, priority, sequence)
+            try:
+                result = func()
+            except Exception as e:
+                delay = self._retry_delay(provider, model, e, attempt)
+                if delay is None:
+                    raise
+                print(f"RequestGovernor: {provider} call failed ({str(e)}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            if usage is not None:
+                used = usage(result)
+                if used is not None:
+                    self.record_usage(provider, model, used - tokens)
+            return result
+
+    async def call_async(self, provider: str, func: Callable[[], Any], model: Optional[str] = None,
+                         tokens: float = 0, priority: Optional[int] = None,
+                         usage: Optional[Callable[[Any], Optional[int]]] = None):
+        """Async version of call; func returns an awaitable"""
+        priority = current_priority() if priority is None else priority
+        sequence = None
+        attempt = 0
+        while True:
+            sequence = await self.acquire_async(provider, model, tokens, priority, sequence)
+            try:
+                result = await func()
+            except Exception as e:
+                delay = self._retry_delay(provider, model, e, attempt)
+                if delay is None:
+                    raise
+                print(f"RequestGovernor: {provider} call failed ({str(e)}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+
+            if usage is not None:
+                used = usage(result)
+                if used is not None:
+                    self.record_usage(provider, model, used - tokens)
+            return result
+
+
+def _usage_tokens(response) -> Optional[int]:
+    return getattr(getattr(response, "usage", None), "total_tokens", None)
+
+
+class _GovernedCompletions:
+    def __init__(self, client, governor: RequestGovernor, provider: str, priority: int):
+        self._client = client
+        self._governor = governor
+        self._provider = provider
+        self._priority = priority
+
+    def create(self, model: str, messages: List[Dict[str, Any]], **params):
+        return self._governor.call(
+            self._provider,
+            lambda: self._client.chat.completions.create(model=model, messages=messages, **params),
+            model=model,
+            tokens=estimate_request_tokens(model, messages, params.get("max_tokens")),
+            priority=current_priority(self._priority),
+            # Streams report no usage, so the estimate stands
+            usage=None if params.get("stream") else _usage_tokens
+        )
+
+
+class _GovernedAsyncCompletions(_GovernedCompletions):
+    async def create(self, model: str, messages: List[Dict[str, Any]], **params):
+        return await self._governor.call_async(
+            self._provider,
+            lambda: self._client.chat.completions.create(model=model, messages=messages, **params),
+            model=model,
+            tokens=estimate_request_tokens(model, messages, params.get("max_tokens")),
+            priority=current_priority(self._priority),
+            usage=None if params.get("stream") else _usage_tokens
+        )
+
+
+class _GovernedChat:
+    def __init__(self, completions):
+        self.completions = completions
+
+
+class GovernedChatClient:
+    """Wrap an OpenAI-compatible client so chat completions go through a RequestGovernor
+
+    Set is_async for AsyncOpenAI clients. priority is the default for calls made
+    outside a request_priority block.
+    """
+
+    def __init__(self, client, governor: RequestGovernor, provider: str = "openai",
+                 priority: int = PRIORITY_INTERACTIVE, is_async: bool = False):
+        self.client = client
+        self.governor = governor
+        completions = _GovernedAsyncCompletions if is_async else _GovernedCompletions
+        self.chat = _GovernedChat(completions(client, governor, provider, priority))
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+class GovernedSearchTool:
+    """Wrap a LangChain search tool so invoke and ainvoke go through a RequestGovernor
+
+    Error strings returned by the tool are raised as SearchToolError, so rate
+    limits and timeouts are retried and failures never pass as results.
+    """
+
+    def __init__(self, tool, governor: RequestGovernor, provider: str = "tavily",
+                 priority: int = PRIORITY_INTERACTIVE):
+        self.tool = tool
+        self.governor = governor
+        self.provider = provider
+        self.priority = priority
+
+    @staticmethod
+    def _checked(result):
+        error = search_tool_error(result)
+        if error is not None:
+            raise error
+        return result
+
+    def invoke(self, *args, **kwargs):
+        return self.governor.call(
+            self.provider,
+            lambda: self._checked(self.tool.invoke(*args, **kwargs)),
+            priority=current_priority(self.priority)
+        )
+
+    async def ainvoke(self, *args, **kwargs):
+        async def run():
+            if hasattr(self.tool, "ainvoke"):
+                return self._checked(await self.tool.ainvoke(*args, **kwargs))
+            return self._checked(await asyncio.to_thread(self.tool.invoke, *args, **kwargs))
+
+        return await self.governor.call_async(self.provider, run, priority=current_priority(self.priority))
+
+    def __getattr__(self, name):
+        return getattr(self.tool, name)
+
+
+_default_governor = None
+_default_governor_lock = threading.Lock()
+
+
+def get_default_governor() -> RequestGovernor:
+    """Return the process-wide governor, with limits read from the environment on first use"""
+    global _default_governor
+    with _default_governor_lock:
+        if _default_governor is None:
+            _default_governor = RequestGovernor(max_retries=int(os.getenv("API_MAX_RETRIES", 5)))
+            _default_governor.configure(
+                "openai",
+                requests_per_minute=float(os.getenv("OPENAI_RPM", 500)),
+                tokens_per_minute=float(os.getenv("OPENAI_TPM", 200000))
+            )
+            _default_governor.configure("tavily", requests_per_minute=float(os.getenv("TAVILY_RPM", 100)))
+        return _default_governor
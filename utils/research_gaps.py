@@ -0,0 +1,85 @@
+import hashlib
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+PRIORITIES = ["high", "medium", "low"]
+
+
+def review_digest(text: str) -> str:
+    """Hash a review with whitespace normalized, so reflowed text counts as unchanged"""
+    return hashlib.sha256(re.sub(r"\s+", " ", text or "").strip().encode("utf-8")).hexdigest()
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """Split a review into paragraphs; headings count as paragraphs of their own"""
+    paragraphs = []
+    for block in re.split(r"\n\s*\n", text or ""):
+        lines = [line.strip() for line in block.splitlines() if line.strip()]
+        current = []
+        for line in lines:
+            if line.startswith("#"):
+                if current:
+                    paragraphs.append(" ".join(current))
+                    current = []
+                paragraphs.append(line)
+            else:
+                current.append(line)
+        if current:
+            paragraphs.append(" ".join(current))
+    return paragraphs
+
+
+def _shingles(text: str) -> set:
+    words = re.findall(r"\w+", text.lower())
+    return {" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))}
+
+
+def diff_paragraphs(previous: Sequence[str], current: Sequence[str],
+                    threshold: float = 0.6) -> Tuple[List[str], List[str]]:
+    """Return (added, removed) paragraphs between two versions of a review
+
+    A paragraph counts as kept when the other version has one sharing at least
+    threshold of its word trigrams, so light rewording is not reported as a change.
+    """
+    previous_shingles = [_shingles(paragraph) for paragraph in previous]
+    current_shingles = [_shingles(paragraph) for paragraph in current]
+
+    def has_match(shingles, candidates):
+        return any(len(shingles & other) / max(1, len(shingles | other)) >= threshold for other in candidates)
+
+    added = [p for p, s in zip(current, current_shingles) if not has_match(s, previous_shingles)]
+    removed = [p for p, s in zip(previous, previous_shingles) if not has_match(s, current_shingles)]
+    return added, removed
+
+
+def clean_gap(item: Any) -> Optional[Dict[str, str]]:
+    """Normalize a gap returned by the model, or None if it has no title"""
+    if isinstance(item, str):
+        item = {"title": item}
+    if not isinstance(item, dict) or not str(item.get("title") or "").strip():
+        return None
+    priority = str(item.get("priority") or "medium").strip().lower()
+    return {
+        "title": str(item["title"]).strip(),
+        "description": str(item.get("description") or "").strip(),
+        "priority": priority if priority in PRIORITIES else "medium"
+    }
+
+
+def format_gaps(gaps: Sequence[Dict[str, Any]]) -> str:
+    """Render open gaps by priority as markdown, followed by the gaps resolved so far"""
+    open_gaps = [gap for gap in gaps if gap.get("status") != "resolved"]
+    resolved = [gap for gap in gaps if gap.get("status") == "resolved"]
+    sections = []
+    for priority in PRIORITIES:
+        group = [gap for gap in open_gaps if gap["priority"] == priority]
+        if not group:
+            continue
+        lines = [f"## {priority.capitalize()} priority"]
+        for gap in group:
+            lines.append(f"- **{gap['id']}. {gap['title']}**" + (f": {gap['description']}" if gap["description"] else ""))
+        sections.append("\n".join(lines))
+    if resolved:
+        sections.append("## Addressed by newer sources\n" +
+                        "\n".join(f"- ~~{gap['id']}. {gap['title']}~~" for gap in resolved))
+    return "\n\n".join(sections) if sections else "No research gaps identified."
@@ -0,0 +1,217 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+DEFAULT_SEARCH_CACHE_PATH = os.path.join(".cache", "search.sqlite")
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a search query so case and whitespace variants share a cache entry"""
+    return re.sub(r"\s+", " ", query or "").strip().lower()
+
+
+def is_search_results(results: Any) -> bool:
+    """Check that a search returned a list of result dicts rather than an error string"""
+    return isinstance(results, list) and all(isinstance(result, dict) for result in results)
+
+
+class SearchCache:
+    """Persistent SQLite cache for search results with a freshness window and stale-while-revalidate"""
+
+    def __init__(self, path: str = DEFAULT_SEARCH_CACHE_PATH, freshness_seconds: float = 24 * 3600,
+                 stale_while_revalidate: bool = False, max_stale_seconds: Optional[float] = 30 * 24 * 3600):
+        self.path = path
+        self.freshness_seconds = freshness_seconds
+        self.stale_while_revalidate = stale_while_revalidate
+        self.max_stale_seconds = max_stale_seconds
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._refresh_tasks = set()
+
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS search_results ("
+            "key TEXT PRIMARY KEY, "
+            "query TEXT NOT NULL, "
+            "results TEXT NOT NULL, "
+            "fetched_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(query: str, paper_only: bool = False, domains: Optional[List[str]] = None) -> str:
+        """Build a cache key from the normalized query, paper_only flag and domain list"""
+        payload = json.dumps(
+            {
+                "query": normalize_query(query),
+                "paper_only": bool(paper_only),
+                "domains": sorted(set(domains or []))
+            },
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _read(self, key: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT results, fetched_at FROM search_results WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        results = json.loads(row[0])
+        # Entries written before errors were filtered out count as misses
+        return (results, row[1]) if is_search_results(results) else None
+
+    def _write(self, key: str, query: str, results: List[Dict[str, Any]]) -> bool:
+        """Store results unless they are an error, so a failed search never replaces a good entry"""
+        if not is_search_results(results):
+            print(f"SearchCache: Not caching an error response for query '{query}'")
+            return False
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_results (key, query, results, fetched_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, normalize_query(query), json.dumps(results, default=str), time.time())
+            )
+            self._conn.commit()
+        return True
+
+    def _refresh_in_background(self, key: str, query: str, fetcher: Callable[[], List[Dict[str, Any]]]):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._write(key, query, fetcher())
+            except Exception as e:
+                print(f"SearchCache: Background refresh failed for query '{query}': {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def fetch(self, query: str, fetcher: Callable[[], List[Dict[str, Any]]], paper_only: bool = False,
+              domains: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Return cached results for a query, calling fetcher on a miss or stale entry"""
+        key = self.make_key(query, paper_only, domains)
+        entry = self._read(key)
+
+        if entry is not None:
+            results, fetched_at = entry
+            age = time.time() - fetched_at
+
+            if age <= self.freshness_seconds:
+                self.hits += 1
+                return results
+
+            within_stale_window = self.max_stale_seconds is None or age <= self.max_stale_seconds
+            if self.stale_while_revalidate and within_stale_window:
+                self.stale_hits += 1
+                self._refresh_in_background(key, query, fetcher)
+                return results
+
+        self.misses += 1
+        results = fetcher()
+        self._write(key, query, results)
+        return results
+
+    async def fetch_async(self, query: str, fetcher: Callable[[], Awaitable[List[Dict[str, Any]]]],
+                          paper_only: bool = False, domains: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Async counterpart of fetch; fetcher is a coroutine function and stale refreshes run as tasks"""
+        key = self.make_key(query, paper_only, domains)
+        entry = self._read(key)
+
+        if entry is not None:
+            results, fetched_at = entry
+            age = time.time() - fetched_at
+
+            if age <= self.freshness_seconds:
+                self.hits += 1
+                return results
+
+            within_stale_window = self.max_stale_seconds is None or age <= self.max_stale_seconds
+            if self.stale_while_revalidate and within_stale_window:
+                self.stale_hits += 1
+                self._refresh_as_task(key, query, fetcher)
+                return results
+
+        self.misses += 1
+        results = await fetcher()
+        self._write(key, query, results)
+        return results
+
+    def _refresh_as_task(self, key: str, query: str, fetcher: Callable[[], Awaitable[List[Dict[str, Any]]]]):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        async def refresh():
+            try:
+                self._write(key, query, await fetcher())
+            except Exception as e:
+                print(f"SearchCache: Background refresh failed for query '{query}': {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        task = asyncio.get_running_loop().create_task(refresh())
+        # Keep a reference so the task is not garbage collected before it finishes
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
+
+    def invalidate(self, query: str, paper_only: bool = False, domains: Optional[List[str]] = None):
+        """Drop the cached results for a single query"""
+        key = self.make_key(query, paper_only, domains)
+        with self._lock:
+            self._conn.execute("DELETE FROM search_results WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        """Remove all cached search results"""
+        with self._lock:
+            self._conn.execute("DELETE FROM search_results")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/stale/miss counters and the current number of entries"""
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM search_results").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "entries": size
+        }
+
+
+_default_search_cache = None
+_default_search_cache_lock = threading.Lock()
+
+
+def get_default_search_cache() -> SearchCache:
+    """Return the process-wide search cache shared by research agents"""
+    global _default_search_cache
+    with _default_search_cache_lock:
+        if _default_search_cache is None:
+            _default_search_cache = SearchCache(
+                path=os.getenv("SEARCH_CACHE_PATH", DEFAULT_SEARCH_CACHE_PATH),
+                freshness_seconds=float(os.getenv("SEARCH_CACHE_FRESHNESS_SECONDS", 24 * 3600)),
+                stale_while_revalidate=os.getenv("SEARCH_CACHE_STALE_WHILE_REVALIDATE", "false").lower() == "true"
+            )
+        return _default_search_cache
@@ -0,0 +1,80 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict
+from utils.prompt_packing import truncate_to_tokens
+
+# Markdown per source is rendered once and reused across reruns and pages
+MARKDOWN_CACHE_SIZE = 4096
+
+# The fields render_source_details shows; only these go into the cache key
+DETAIL_FIELDS = ["url", "alternate_urls", "authors", "publication", "year", "abstract", "content", "keywords"]
+
+_markdown_cache = OrderedDict()
+_markdown_cache_lock = threading.Lock()
+_cache_stats = {"hits": 0, "misses": 0}
+
+
+def _as_text(value: Any) -> str:
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(item) for item in value)
+    return str(value)
+
+
+def _details_key(source: Dict[str, Any]):
+    """The source ID plus a short digest of the displayed fields, so an edited source is re-rendered"""
+    digest = hashlib.sha1()
+    for field in DETAIL_FIELDS:
+        digest.update(f"{field}\0{_as_text(source.get(field) or '')}\0".encode("utf-8"))
+    return source.get("id") or "", digest.hexdigest()[:16]
+
+
+def _render_details(source: Dict[str, Any]) -> str:
+    lines = []
+    if source.get("url"):
+        lines.append(f"**Link:** [{source['url']}]({source['url']})")
+    for url in source.get("alternate_urls", []):
+        lines.append(f"**Also at:** [{url}]({url})")
+    for field, label in [("authors", "Authors"), ("publication", "Publication"), ("year", "Year")]:
+        if source.get(field):
+            lines.append(f"**{label}:** {_as_text(source[field])}")
+    if source.get("abstract"):
+        lines.append("**Abstract:**")
+        lines.append(_as_text(source["abstract"]))
+    elif source.get("content"):
+        lines.append("**Excerpt:**")
+        lines.append(truncate_to_tokens(_as_text(source["content"]), 150))
+    if source.get("keywords"):
+        lines.append(f"**Keywords:** {_as_text(source['keywords'])}")
+    return "\n\n".join(lines)
+
+
+def render_source_details(source: Dict[str, Any]) -> str:
+    """Render a source's fields as markdown, cached by source ID and a digest of its fields"""
+    key = _details_key(source)
+    with _markdown_cache_lock:
+        if key in _markdown_cache:
+            _markdown_cache.move_to_end(key)
+            _cache_stats["hits"] += 1
+            return _markdown_cache[key]
+        _cache_stats["misses"] += 1
+
+    markdown = _render_details(source)
+    with _markdown_cache_lock:
+        _markdown_cache[key] = markdown
+        while len(_markdown_cache) > MARKDOWN_CACHE_SIZE:
+            _markdown_cache.popitem(last=False)
+    return markdown
+
+
+def source_label(number: int, source: Dict[str, Any]) -> str:
+    """One-line label for a source in a list"""
+    label = f"{number}. {source.get('title') or 'Untitled'}"
+    if source.get("year"):
+        label += f" ({source['year']})"
+    return label
+
+
+def render_cache_info() -> Dict[str, int]:
+    with _markdown_cache_lock:
+        return dict(_cache_stats, size=len(_markdown_cache))
@@ -0,0 +1,68 @@
+import re
+from collections import Counter
+from typing import Any, Dict, List
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in", "is",
+    "it", "its", "of", "on", "or", "that", "the", "this", "to", "was", "were", "which", "with",
+    "we", "our", "their", "these", "those", "using", "based", "study", "paper", "research",
+    "results", "approach", "new", "can", "also", "between", "more", "than", "into", "about",
+    "http", "https", "www", "com", "org", "pdf", "abs", "doi"
+}
+
+
+def extract_keywords(source: Dict[str, Any], top_n: int = 12) -> List[str]:
+    """Return the most frequent informative words of a source's title and content"""
+    title = source.get("title", "") or ""
+    body = source.get("abstract") or source.get("content") or ""
+    words = re.findall(r"[a-z][a-z\-]{2,}", f"{title} {title} {body}".lower())
+    counts = Counter(word for word in words if word not in STOPWORDS)
+    return [word for word, _ in counts.most_common(top_n)]
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def cluster_sources(sources: List[Dict[str, Any]], max_cluster_size: int = 8,
+                    similarity_threshold: float = 0.15) -> List[Dict[str, Any]]:
+    """Group sources into keyword-based themes
+
+    Each source joins the most similar existing cluster that still has room,
+    otherwise it starts a new one. Returns a list of {"theme", "sources"} dicts.
+    """
+    clusters = []
+    for source in sources:
+        keywords = set(extract_keywords(source))
+        best_cluster = None
+        best_similarity = similarity_threshold
+        for cluster in clusters:
+            if len(cluster["sources"]) >= max_cluster_size:
+                continue
+            similarity = _jaccard(keywords, cluster["keywords"])
+            if similarity >= best_similarity:
+                best_cluster = cluster
+                best_similarity = similarity
+
+        if best_cluster is None:
+            clusters.append({"keywords": set(keywords), "counts": Counter(keywords), "sources": [source]})
+        else:
+            best_cluster["keywords"] |= keywords
+            best_cluster["counts"].update(keywords)
+            best_cluster["sources"].append(source)
+
+    # Fold singleton clusters into a shared "other" group so they don't each cost a call
+    themed = [cluster for cluster in clusters if len(cluster["sources"]) > 1]
+    leftovers = [cluster["sources"][0] for cluster in clusters if len(cluster["sources"]) == 1]
+
+    result = []
+    for cluster in themed:
+        theme = ", ".join(word for word, _ in cluster["counts"].most_common(3))
+        result.append({"theme": theme, "sources": cluster["sources"]})
+
+    for start in range(0, len(leftovers), max_cluster_size):
+        result.append({"theme": "Other related work", "sources": leftovers[start:start + max_cluster_size]})
+
+    return result
@@ -0,0 +1,239 @@
+import math
+import re
+import threading
+import zlib
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from utils.source_clustering import STOPWORDS
+
+# Site decorations that differ between copies of the same paper
+TITLE_NOISE_PATTERNS = [
+    re.compile(r"^\s*\[\d{4}\.\d{4,5}(v\d+)?\]\s*"),
+    re.compile(r"\s*(\||-|–|—|:)\s*(request pdf|pdf|researchgate|arxiv|semantic scholar|sciencedirect|"
+               r"ieee xplore|pubmed|pmc|acm digital library|springerlink|wiley online library)\b.*$", re.IGNORECASE),
+    re.compile(r"\s*\((pdf|preprint)\)\s*$", re.IGNORECASE),
+]
+
+
+def clean_title(title: str) -> str:
+    """Strip arXiv IDs and site suffixes such as " | Request PDF" from a title"""
+    title = title or ""
+    for pattern in TITLE_NOISE_PATTERNS:
+        title = pattern.sub("", title)
+    title = re.sub(r"[^\w\s]", " ", title.lower())
+    return re.sub(r"\s+", " ", title).strip()
+
+
+def _trigrams(text: str) -> set:
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def title_similarity(a: str, b: str) -> float:
+    """Jaccard similarity of the character trigrams of two cleaned titles"""
+    if not a or not b:
+        return 0.0
+    grams_a, grams_b = _trigrams(a), _trigrams(b)
+    return len(grams_a & grams_b) / len(grams_a | grams_b)
+
+
+def _numbers(title: str) -> set:
+    return set(re.findall(r"\d+", title))
+
+
+def source_features(source: Dict[str, Any]) -> Counter:
+    """Weighted n-gram features of a source's title and content"""
+    title = clean_title(source.get("title", ""))
+    body = source.get("abstract") or source.get("content") or ""
+    if isinstance(body, list):
+        body = " ".join(str(item) for item in body)
+
+    features = Counter()
+    title_words = [word for word in title.split() if word not in STOPWORDS]
+    for word in title_words:
+        features[f"w:{word}"] += 2.0
+    for first, second in zip(title_words, title_words[1:]):
+        features[f"b:{first} {second}"] += 2.0
+    for gram in _trigrams(title):
+        features[f"t:{gram}"] += 0.5
+
+    counts = Counter(word for word in re.findall(r"[a-z][a-z\-]{2,}", body.lower()) if word not in STOPWORDS)
+    for word, count in counts.items():
+        features[f"w:{word}"] += 1.0 + math.log(count)
+    return features
+
+
+class SourceIndex:
+    """In-memory vector index over sources for near-duplicate detection and similarity search
+
+    Sources are embedded with signed feature hashing of title and content
+    n-grams into unit vectors. Random-hyperplane LSH tables give approximate
+    nearest-neighbour candidates, which are re-ranked with an exact NumPy
+    cosine. Small indexes are searched exhaustively instead.
+    """
+
+    def __init__(self, dim: int = 1024, tables: int = 12, bits: int = 10, probes: int = 2,
+                 exact_below: int = 2000, duplicate_threshold: float = 0.92,
+                 title_threshold: float = 0.85, title_content_threshold: float = 0.35, seed: int = 7):
+        if dim & (dim - 1):
+            raise ValueError("dim must be a power of two")
+        self.dim = dim
+        self.tables = tables
+        self.bits = bits
+        # Extra buckets probed per table by flipping the least certain signature bits
+        self.probes = probes
+        self.exact_below = exact_below
+        # Copies are near-identical overall, or share a title and overlap in content
+        self.duplicate_threshold = duplicate_threshold
+        self.title_threshold = title_threshold
+        self.title_content_threshold = title_content_threshold
+
+        self._planes = np.random.default_rng(seed).standard_normal((dim, tables * bits)).astype(np.float32)
+        self._powers = (1 << np.arange(bits)).astype(np.int64)
+        self._vectors = np.zeros((64, dim), dtype=np.float32)
+        self._ids: List[Optional[str]] = []
+        self._titles: List[str] = []
+        self._rows: Dict[str, int] = {}
+        # Copies with identical cleaned titles are found without relying on LSH recall
+        self._by_title: Dict[str, List[int]] = {}
+        self._signatures: Dict[int, np.ndarray] = {}
+        self._buckets: List[Dict[int, List[int]]] = [{} for _ in range(tables)]
+        self._lock = threading.RLock()
+
+    def embed(self, source: Dict[str, Any]) -> np.ndarray:
+        """Return the unit feature-hashing vector of a source"""
+        features = source_features(source)
+        digests = np.fromiter((zlib.crc32(feature.encode("utf-8")) for feature in features), dtype=np.int64,
+                              count=len(features))
+        weights = np.fromiter(features.values(), dtype=np.float32, count=len(features))
+        # The top hash bit picks the sign so colliding features tend to cancel rather than add up
+        weights = np.where(digests & 0x80000000, weights, -weights)
+        vector = np.bincount(digests & (self.dim - 1), weights=weights, minlength=self.dim).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """Embed free text as if it were a source title"""
+        return self.embed({"title": query, "content": query})
+
+    def _signature(self, vector: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        projections = (vector @ self._planes).reshape(self.tables, self.bits)
+        keys = (projections > 0).astype(np.int64) @ self._powers
+        return keys, projections
+
+    def _probe_keys(self, keys: np.ndarray, projections: np.ndarray) -> Iterable[Tuple[int, int]]:
+        # Multi-probe: the buckets one flip away on the bits closest to their hyperplane
+        uncertain = np.argsort(np.abs(projections), axis=1)[:, :self.probes]
+        for table in range(self.tables):
+            key = int(keys[table])
+            yield table, key
+            for bit in uncertain[table]:
+                yield table, key ^ (1 << int(bit))
+
+    def add(self, source_id: str, source: Dict[str, Any], vector: Optional[np.ndarray] = None):
+        """Index a source under its ID, replacing any earlier entry"""
+        vector = self.embed(source) if vector is None else vector
+        with self._lock:
+            if source_id in self._rows:
+                self.remove(source_id)
+            row = len(self._ids)
+            if row == len(self._vectors):
+                grown = np.zeros((2 * len(self._vectors), self.dim), dtype=np.float32)
+                grown[:row] = self._vectors
+                self._vectors = grown
+            self._vectors[row] = vector
+            self._ids.append(source_id)
+            title = clean_title(source.get("title", ""))
+            self._titles.append(title)
+            self._rows[source_id] = row
+            if title:
+                self._by_title.setdefault(title, []).append(row)
+
+            keys, _ = self._signature(vector)
+            self._signatures[row] = keys
+            for table, key in enumerate(keys):
+                self._buckets[table].setdefault(int(key), []).append(row)
+
+    def remove(self, source_id: str) -> bool:
+        """Drop a source from the index; its row is left empty"""
+        with self._lock:
+            row = self._rows.pop(source_id, None)
+            if row is None:
+                return False
+            for table, key in enumerate(self._signatures.pop(row)):
+                bucket = self._buckets[table].get(int(key), [])
+                if row in bucket:
+                    bucket.remove(row)
+            same_title = self._by_title.get(self._titles[row], [])
+            if row in same_title:
+                same_title.remove(row)
+            self._ids[row] = None
+            self._vectors[row] = 0.0
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._vectors = np.zeros((64, self.dim), dtype=np.float32)
+            self._ids.clear()
+            self._titles.clear()
+            self._rows.clear()
+            self._by_title.clear()
+            self._signatures.clear()
+            self._buckets = [{} for _ in range(self.tables)]
+
+    def _candidate_rows(self, vector: np.ndarray) -> np.ndarray:
+        keys, projections = self._signature(vector)
+        rows = set()
+        for table, key in self._probe_keys(keys, projections):
+            rows.update(self._buckets[table].get(key, ()))
+        return np.fromiter(rows, dtype=np.int64, count=len(rows))
+
+    def search(self, vector: np.ndarray, k: int = 5, exact: bool = False) -> List[Tuple[str, float]]:
+        """Return up to k (source_id, cosine similarity) pairs, most similar first"""
+        with self._lock:
+            rows = None
+            if not exact and len(self._rows) >= self.exact_below:
+                rows = self._candidate_rows(vector)
+                if len(rows) < k:
+                    rows = None
+
+            if rows is None:
+                # Exhaustive scan; removed rows are zero vectors and are filtered out below
+                scores = self._vectors[:len(self._ids)] @ vector
+                rows = np.arange(len(self._ids))
+            else:
+                scores = self._vectors[rows] @ vector
+
+            count = min(len(rows), k + len(self._ids) - len(self._rows))
+            if not count:
+                return []
+            top = np.argpartition(-scores, count - 1)[:count] if count < len(rows) else np.arange(len(rows))
+            top = top[np.argsort(-scores[top])]
+            results = [(self._ids[rows[i]], float(scores[i])) for i in top if self._ids[rows[i]] is not None]
+            return results[:k]
+
+    def find_duplicate(self, source: Dict[str, Any], vector: Optional[np.ndarray] = None) -> Optional[str]:
+        """Return the ID of an indexed copy of the same work, if there is one"""
+        vector = self.embed(source) if vector is None else vector
+        title = clean_title(source.get("title", ""))
+        with self._lock:
+            for row in self._by_title.get(title, ()):
+                if float(self._vectors[row] @ vector) >= self.title_content_threshold:
+                    return self._ids[row]
+            for source_id, score in self.search(vector, k=3):
+                other = self._titles[self._rows[source_id]]
+                # "Llama 2" and "Llama 3" are different works however similar their text
+                if _numbers(title) != _numbers(other):
+                    continue
+                if score >= self.duplicate_threshold:
+                    return source_id
+                if score >= self.title_content_threshold and title_similarity(title, other) >= self.title_threshold:
+                    return source_id
+        return None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, source_id: str) -> bool:
+        return source_id in self._rows
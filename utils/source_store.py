@@ -0,0 +1,230 @@
+import hashlib
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+from urllib.parse import urlsplit, unquote
+from utils.source_index import SourceIndex
+
+DOI_PATTERN = re.compile(r"(10\.\d{4,9}/[^\s?#]+)", re.IGNORECASE)
+
+
+def normalize_url(url: str) -> str:
+    """Normalize a URL for deduplication, collapsing DOI links to their DOI"""
+    if not url:
+        return ""
+
+    url = unquote(url.strip())
+    doi_match = DOI_PATTERN.search(url)
+    if doi_match:
+        return "doi:" + doi_match.group(1).rstrip("/.").lower()
+
+    parts = urlsplit(url if "://" in url else f"//{url}")
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = parts.path.rstrip("/")
+    return f"{host}{path}"
+
+
+def source_domain(url: str) -> str:
+    """Return the host of a URL without a leading www., or "" for sources without one"""
+    if not url:
+        return ""
+    host = urlsplit(url.strip() if "://" in url else f"//{url.strip()}").netloc.lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def normalize_title(title: str) -> str:
+    """Normalize a title for deduplication by dropping case, punctuation and extra whitespace"""
+    if not title:
+        return ""
+    title = re.sub(r"[^\w\s]", " ", title.lower())
+    return re.sub(r"\s+", " ", title).strip()
+
+
+def make_source_id(source: Dict[str, Any]) -> str:
+    """Derive a stable ID for a source from its normalized URL, falling back to its title"""
+    key = normalize_url(source.get("url", "")) or normalize_title(source.get("title", ""))
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+
+
+@dataclass(slots=True)
+class SourceRecord:
+    """A stored source together with its index keys, including those of copies merged into it"""
+    id: str
+    url_key: str
+    title_key: str
+    data: Dict[str, Any]
+    alias_url_keys: List[str] = field(default_factory=list)
+    alias_title_keys: List[str] = field(default_factory=list)
+
+
+def merge_sources(target: Dict[str, Any], duplicate: Dict[str, Any]):
+    """Fold a duplicate copy of a source into the stored one"""
+    url = duplicate.get("url")
+    if url and normalize_url(url) != normalize_url(target.get("url", "")):
+        alternates = target.setdefault("alternate_urls", [])
+        if url not in alternates:
+            alternates.append(url)
+    for field, value in duplicate.items():
+        if field in ("id", "url", "alternate_urls") or not value:
+            continue
+        if not target.get(field):
+            target[field] = value
+    if duplicate.get("score") is not None:
+        target["score"] = max(target.get("score") or 0, duplicate["score"])
+
+
+class SourceStore:
+    """Insertion-ordered source collection with hash indexes on normalized URL and title
+
+    With semantic_dedup, sources are also embedded into a SourceIndex so that
+    copies of the same work under different URLs and title decorations are
+    merged into the first stored copy instead of being added again.
+    """
+
+    def __init__(self, sources: Optional[List[Dict[str, Any]]] = None, semantic_dedup: bool = True,
+                 index: Optional[SourceIndex] = None):
+        self._records: Dict[str, SourceRecord] = {}
+        self._by_url: Dict[str, str] = {}
+        self._by_title: Dict[str, str] = {}
+        self._index = index or (SourceIndex() if semantic_dedup else None)
+        self._lock = threading.RLock()
+
+        for source in sources or []:
+            self.add(source)
+
+    def add(self, source: Dict[str, Any]) -> Optional[str]:
+        """Add a source unless its URL or title is already present; return its ID if added"""
+        url_key = normalize_url(source.get("url", ""))
+        title_key = normalize_title(source.get("title", ""))
+
+        with self._lock:
+            if url_key and url_key in self._by_url:
+                return None
+            if title_key and title_key in self._by_title:
+                return None
+
+            source_id = source.get("id") or make_source_id(source)
+            if source_id in self._records:
+                return None
+
+            vector = None
+            if self._index is not None:
+                vector = self._index.embed(source)
+                duplicate_of = self._index.find_duplicate(source, vector)
+                if duplicate_of is not None:
+                    record = self._records[duplicate_of]
+                    merge_sources(record.data, source)
+                    # Later exact lookups of this copy resolve to the merged source
+                    if url_key:
+                        self._by_url[url_key] = duplicate_of
+                        record.alias_url_keys.append(url_key)
+                    if title_key:
+                        self._by_title[title_key] = duplicate_of
+                        record.alias_title_keys.append(title_key)
+                    return None
+
+            data = dict(source)
+            data["id"] = source_id
+            self._records[source_id] = SourceRecord(source_id, url_key, title_key, data)
+            if url_key:
+                self._by_url[url_key] = source_id
+            if title_key:
+                self._by_title[title_key] = source_id
+            if self._index is not None:
+                self._index.add(source_id, source, vector)
+            return source_id
+
+    def add_many(self, sources: List[Dict[str, Any]]) -> List[str]:
+        """Add several sources and return the IDs of those that were new"""
+        added = []
+        for source in sources:
+            source_id = self.add(source)
+            if source_id:
+                added.append(source_id)
+        return added
+
+    def remove(self, source_id: str) -> bool:
+        """Remove a source by ID"""
+        with self._lock:
+            record = self._records.pop(source_id, None)
+            if record is None:
+                return False
+            # Keys of merged copies point at the removed source too
+            for key in [record.url_key] + record.alias_url_keys:
+                if key and self._by_url.get(key) == source_id:
+                    del self._by_url[key]
+            for key in [record.title_key] + record.alias_title_keys:
+                if key and self._by_title.get(key) == source_id:
+                    del self._by_title[key]
+            if self._index is not None:
+                self._index.remove(source_id)
+            return True
+
+    def get(self, source_id: str) -> Optional[Dict[str, Any]]:
+        """Return the source with the given ID"""
+        record = self._records.get(source_id)
+        return record.data if record else None
+
+    def find_by_url(self, url: str) -> Optional[Dict[str, Any]]:
+        """Return the source whose normalized URL matches"""
+        source_id = self._by_url.get(normalize_url(url))
+        return self.get(source_id) if source_id else None
+
+    def find_by_title(self, title: str) -> Optional[Dict[str, Any]]:
+        """Return the source whose normalized title matches"""
+        source_id = self._by_title.get(normalize_title(title))
+        return self.get(source_id) if source_id else None
+
+    def contains(self, source: Dict[str, Any]) -> bool:
+        """Check whether a source with the same URL or title is already stored"""
+        url_key = normalize_url(source.get("url", ""))
+        title_key = normalize_title(source.get("title", ""))
+        return bool((url_key and url_key in self._by_url) or (title_key and title_key in self._by_title))
+
+    def similar_sources(self, query, k: int = 5, exact: bool = False) -> List[Dict[str, Any]]:
+        """Return the k sources most similar to a query string or source dict, with a similarity score"""
+        if self._index is None:
+            raise ValueError("similar_sources needs a SourceStore with semantic_dedup enabled")
+        if isinstance(query, dict):
+            vector = self._index.embed(query)
+        else:
+            vector = self._index.embed_query(query)
+
+        results = []
+        with self._lock:
+            for source_id, score in self._index.search(vector, k=k, exact=exact):
+                record = self._records.get(source_id)
+                if record is not None:
+                    results.append(dict(record.data, similarity=score))
+        return results
+
+    def ids(self) -> List[str]:
+        """Return source IDs in insertion order"""
+        with self._lock:
+            return list(self._records)
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """Return the stored sources as a list of dicts in insertion order"""
+        with self._lock:
+            return [record.data for record in self._records.values()]
+
+    def clear(self):
+        """Remove all sources"""
+        with self._lock:
+            self._records.clear()
+            self._by_url.clear()
+            self._by_title.clear()
+            if self._index is not None:
+                self._index.clear()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.to_list())
+
+    def __contains__(self, source_id: str) -> bool:
+        return source_id in self._records
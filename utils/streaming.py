@@ -0,0 +1,11 @@
+from typing import Iterator
+
+
+def iter_completion_text(stream) -> Iterator[str]:
+    """Yield the text deltas of a streamed chat completion"""
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        content = chunk.choices[0].delta.content
+        if content:
+            yield content
@@ -0,0 +1,191 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# Field specs for the paper analysis; "array" fields are lists of strings. Every field may be
+# null when the text does not state it, e.g. the authors of a web snippet
+PAPER_ANALYSIS_FIELDS = {
+    "title": {"type": "string", "description": "Full title of the paper"},
+    "authors": {"type": "array", "description": "Author names in the order they are listed"},
+    "publication": {"type": "string", "description": "Journal or conference and publication year"},
+    "abstract": {"type": "string", "description": "Summary of the abstract in about 100 words", "max_words": 150},
+    "key_findings": {"type": "array", "description": "Key findings, one short sentence each"},
+    "methodology": {"type": "string", "description": "Research methodology in one or two sentences"},
+    "topics": {"type": "array", "description": "Main topics or themes, a few words each"},
+}
+
+# Answers meaning "not in the text"; they are stored as None instead of being re-asked
+PLACEHOLDER_VALUES = {"", "n/a", "none", "null", "unknown", "not specified", "not provided", "not available", "extraction failed"}
+
+
+def json_schema(fields: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Return a JSON Schema object for a set of field specs"""
+    properties = {}
+    for name, spec in fields.items():
+        if spec["type"] == "array":
+            properties[name] = {"type": ["array", "null"], "items": {"type": "string"},
+                                "description": spec["description"]}
+        else:
+            properties[name] = {"type": ["string", "null"], "description": spec["description"]}
+    return {"type": "object", "properties": properties, "required": list(fields), "additionalProperties": False}
+
+
+def describe_fields(fields: Dict[str, Dict[str, Any]]) -> str:
+    """Describe field specs as prompt lines"""
+    lines = []
+    for name, spec in fields.items():
+        kind = "list of strings" if spec["type"] == "array" else "string"
+        lines.append(f"- {name} ({kind}): {spec['description']}")
+    lines.append("Use null for a field the text does not state; do not guess.")
+    return "\n".join(lines)
+
+
+def _coerce(value: Any, spec: Dict[str, Any]) -> Any:
+    """Fix common deviations, such as a comma-separated string where a list was asked for"""
+    if spec["type"] == "array":
+        if isinstance(value, str):
+            value = [item for item in re.split(r"\n|;|•|^\s*[-*]\s+", value, flags=re.MULTILINE)]
+            if len(value) == 1 and "," in value[0]:
+                value = value[0].split(",")
+        if isinstance(value, (list, tuple)):
+            return [str(item).strip(" -*•\t") for item in value if str(item).strip(" -*•\t")]
+        return value
+
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(item) for item in value)
+    if isinstance(value, (int, float)):
+        return str(value)
+    return value.strip() if isinstance(value, str) else value
+
+
+def validate_fields(data: Dict[str, Any], fields: Dict[str, Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """Split a parsed object into valid field values and error messages for invalid fields
+
+    null or a placeholder such as "unknown" is valid and stored as None, since the
+    text may simply not state the field. Only missing keys and malformed values
+    are errors worth re-asking for.
+    """
+    valid = {}
+    errors = {}
+    for name, spec in fields.items():
+        if name not in data:
+            errors[name] = "missing"
+            continue
+        if data[name] is None:
+            valid[name] = None
+            continue
+
+        value = _coerce(data[name], spec)
+        if spec["type"] == "array":
+            if not isinstance(value, list):
+                errors[name] = "must be a list of strings or null"
+            elif all(item.lower() in PLACEHOLDER_VALUES for item in value):
+                valid[name] = None
+            else:
+                valid[name] = [item for item in value if item.lower() not in PLACEHOLDER_VALUES]
+            continue
+
+        if not isinstance(value, str):
+            errors[name] = "must be a string or null"
+        elif value.lower() in PLACEHOLDER_VALUES:
+            valid[name] = None
+        elif spec.get("max_words") and len(value.split()) > spec["max_words"]:
+            errors[name] = f"too long: {len(value.split())} words, at most {spec['max_words']}"
+        else:
+            valid[name] = value
+    return valid, errors
+
+
+class IncrementalJsonParser:
+    """Parse a streamed JSON object, reporting each top-level field as soon as its value is complete
+
+    Text before the opening brace, such as a code fence, is skipped. Values
+    that are not valid JSON are recorded in errors instead of fields.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.fields: Dict[str, Any] = {}
+        self.errors: Dict[str, str] = {}
+        self.done = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect = "key"
+        self._key = None
+        self._key_start = None
+        self._value_start = None
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Add streamed text and return the (key, value) pairs it completed"""
+        self.text += chunk
+        completed = []
+        while self._pos < len(self.text) and not self.done:
+            position = self._pos
+            char = self.text[position]
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._expect == "key_end":
+                        self._key = json.loads(self.text[self._key_start:position + 1])
+                        self._expect = "colon"
+                continue
+
+            if self._depth == 0:
+                if char == "{":
+                    self._depth = 1
+                    self._expect = "key"
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1 and self._expect == "key":
+                    self._key_start = position
+                    self._expect = "key_end"
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 1:
+                    self._complete(position, completed)
+                    self.done = True
+                else:
+                    self._depth -= 1
+            elif self._depth == 1 and char == ":" and self._expect == "colon":
+                self._expect = "value"
+                self._value_start = position + 1
+            elif self._depth == 1 and char == ",":
+                self._complete(position, completed)
+        return completed
+
+    def _complete(self, end: int, completed: List[Tuple[str, Any]]):
+        if self._expect == "value" and self._key is not None:
+            raw = self.text[self._value_start:end].strip()
+            try:
+                value = json.loads(raw)
+                self.fields[self._key] = value
+                completed.append((self._key, value))
+            except ValueError:
+                self.errors[self._key] = raw
+        self._key = None
+        self._expect = "key"
+
+
+def parse_json_object(text: str) -> Optional[Dict[str, Any]]:
+    """Parse a complete JSON object from a response, allowing a code fence around it"""
+    fenced = re.search(r"```(?:json)?\s*(.*?)```", text or "", re.DOTALL)
+    candidate = fenced.group(1) if fenced else text or ""
+    start, end = candidate.find("{"), candidate.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        data = json.loads(candidate[start:end + 1])
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
@@ -0,0 +1,225 @@
+import operator
+import os
+import sqlite3
+import uuid
+from typing import Annotated, Any, Dict, List, Optional, TypedDict
+from langgraph.config import get_stream_writer
+from langgraph.graph import StateGraph, START, END
+from langgraph.checkpoint.sqlite import SqliteSaver
+from workflows.research_graph import DEFAULT_CHECKPOINT_PATH, MAX_RESEARCH_ITERATIONS, ResearchWorkflowEngine
+
+
+class ResearchGraphState(TypedDict, total=False):
+    """Graph state; parallel branches only write their own keys"""
+    run_id: str
+    question: str
+    paper_only: bool
+    search_results: List[Dict[str, Any]]
+    retrieved_chunks: List[Dict[str, Any]]
+    retrieval_tokens_saved: int
+    analysis: str
+    answer: str
+    needs_more_research: bool
+    iteration: int
+    status: str
+    sources: List[Dict[str, Any]]
+    citation_style: str
+    citation_llm_fallback: bool
+    literature_review: str
+    research_gaps: str
+    research_gaps_state: Dict[str, Any]
+    paper_summary_table: str
+    paper_summary_rows: Dict[str, Any]
+    references_list: str
+    reference_entries: Dict[str, Any]
+    completed_nodes: Annotated[List[str], operator.add]
+
+
+class WorkflowNodeError(Exception):
+    """Raised when a graph node fails, leaving the run resumable from its last checkpoint"""
+
+
+def _run_step(step, state: Dict[str, Any], node: str, fields: List[str], *args) -> Dict[str, Any]:
+    """Run an engine step on a copy of the state and return only the fields it owns"""
+    return _node_update(step(dict(state), *args), node, fields)
+
+
+def _node_update(result: Dict[str, Any], node: str, fields: List[str]) -> Dict[str, Any]:
+    status = result.get("status", "")
+    if status.endswith("_failed") or status.endswith("_error"):
+        raise WorkflowNodeError(f"{node} failed: {result.get('error', 'Unknown error')}")
+
+    update = {field: result[field] for field in fields if field in result}
+    update["completed_nodes"] = [node]
+    return update
+
+
+def create_research_graph(engine: ResearchWorkflowEngine, checkpoint_path: Optional[str] = DEFAULT_CHECKPOINT_PATH,
+                          style: str = "thematic", post_search: bool = True):
+    """Compile the research workflow as a LangGraph StateGraph
+
+    research -> analysis -> drafting, looping back to research while more research
+    is needed. With post_search, references, literature review and summary table
+    then run as parallel branches; research gaps follow the review when there
+were sources to review. The drafted
+    answer is streamed as ("answer", chunk) custom events. With a checkpoint path
+    every completed node is saved to SQLite, so a failed or interrupted run can be
+    resumed from the last completed node.
+    """
+    graph = StateGraph(ResearchGraphState)
+
+    def research(state):
+        update = _run_step(engine.run_research, state, "research",
+                           ["search_results", "sources", "status"])
+        # Counts follow-up rounds, as execute_workflow does: 0 for the first search
+        update["iteration"] = state.get("completed_nodes", []).count("research")
+        return update
+
+    def analysis(state):
+        return _run_step(engine.run_analysis, state, "analysis",
+                         ["analysis", "retrieved_chunks", "retrieval_tokens_saved", "status"])
+
+    def drafting(state):
+        fields = ["answer", "needs_more_research", "status"]
+        if not hasattr(engine.drafting_agent, "draft_answer_stream"):
+            return _run_step(engine.run_drafting, state, "drafting", fields)
+        step_state = dict(state)
+        # Outside graph.stream the writer discards the chunks
+        writer = get_stream_writer()
+        for chunk in engine.run_drafting_stream(step_state):
+            writer(("answer", chunk))
+        return _node_update(step_state, "drafting", fields)
+
+    def references(state):
+        return _run_step(engine.update_references_list, state, "references",
+                         ["references_list", "reference_entries"])
+
+    def literature_review(state):
+        return _run_step(engine.generate_literature_review, state, "literature_review",
+                         ["literature_review"], style)
+
+    def summary_table(state):
+        return _run_step(engine.update_paper_summary_table, state, "summary_table",
+                         ["paper_summary_table", "paper_summary_rows"])
+
+    def research_gaps(state):
+        # Without sources the review is only a placeholder; like run_post_search_stage, skip the gaps
+        if not state.get("sources"):
+            return {"completed_nodes": ["research_gaps"]}
+        return _run_step(engine.identify_research_gaps, state, "research_gaps",
+                         ["research_gaps", "research_gaps_state"])
+
+    def finish(state):
+        status = "max_iterations_reached" if state.get("needs_more_research") else "workflow_complete"
+        return {"status": status, "completed_nodes": ["finish"]}
+
+    def after_drafting(state):
+        if state.get("needs_more_research") and state.get("iteration", 0) < MAX_RESEARCH_ITERATIONS:
+            return ["research"]
+        if not post_search:
+            return ["finish"]
+        return ["references", "literature_review", "summary_table"]
+
+    graph.add_node("research", research)
+    graph.add_node("analysis", analysis)
+    graph.add_node("drafting", drafting)
+    graph.add_node("references", references)
+    graph.add_node("literature_review", literature_review)
+    graph.add_node("summary_table", summary_table)
+    graph.add_node("research_gaps", research_gaps)
+    graph.add_node("finish", finish)
+
+    graph.add_edge(START, "research")
+    graph.add_edge("research", "analysis")
+    graph.add_edge("analysis", "drafting")
+    graph.add_conditional_edges(
+        "drafting",
+        after_drafting,
+        ["research", "references", "literature_review", "summary_table", "finish"]
+    )
+    graph.add_edge("literature_review", "research_gaps")
+    # finish waits for all parallel branches
+    graph.add_edge(["references", "summary_table", "research_gaps"], "finish")
+    graph.add_edge("finish", END)
+
+    checkpointer = None
+    if checkpoint_path:
+        if os.path.dirname(checkpoint_path):
+            os.makedirs(os.path.dirname(checkpoint_path), exist_ok=True)
+        checkpointer = SqliteSaver(sqlite3.connect(checkpoint_path, check_same_thread=False))
+
+    return graph.compile(checkpointer=checkpointer)
+
+
+def _graph_input(graph, initial_state: Optional[Dict[str, Any]], thread_id: Optional[str], resume: bool):
+    thread_id = thread_id or (initial_state or {}).get("run_id") or uuid.uuid4().hex
+    config = {"configurable": {"thread_id": thread_id}}
+
+    # A thread with pending nodes continues from its last checkpoint instead of starting over
+    if resume and graph.checkpointer and graph.get_state(config).next:
+        initial_state = None
+
+    graph_input = None
+    if initial_state is not None:
+        graph_input = dict(initial_state)
+        graph_input.setdefault("run_id", thread_id)
+        graph_input.setdefault("citation_style", "APA")
+        graph_input.setdefault("sources", [])
+        graph_input.setdefault("iteration", 0)
+        graph_input.setdefault("needs_more_research", False)
+    return graph_input, config, thread_id
+
+
+def _discard_checkpoints(graph, thread_id: str):
+    """Delete a completed run's checkpoints; only failed runs are kept for resuming"""
+    if graph.checkpointer is not None and hasattr(graph.checkpointer, "delete_thread"):
+        graph.checkpointer.delete_thread(thread_id)
+
+
+def _failed_run(graph, config, thread_id: str, error: Exception) -> Dict[str, Any]:
+    return {
+        "success": False,
+        "error": str(error),
+        "thread_id": thread_id,
+        "state": graph.get_state(config).values if graph.checkpointer else None
+    }
+
+
+def execute_research_graph(graph, initial_state: Optional[Dict[str, Any]] = None,
+                           thread_id: Optional[str] = None, resume: bool = False):
+    """Run the compiled graph, or resume the run for thread_id when initial_state is None
+
+    With resume, a thread_id whose last run failed is resumed even when an
+    initial state is given. Returns a dict with the final state, the thread_id
+    to resume with, and an error message if a node failed. The checkpoints of
+    a completed run are deleted, so the checkpoint database only holds
+    resumable runs.
+    """
+    graph_input, config, thread_id = _graph_input(graph, initial_state, thread_id, resume)
+    try:
+        state = graph.invoke(graph_input, config)
+        _discard_checkpoints(graph, thread_id)
+        return {"success": True, "state": state, "thread_id": thread_id}
+    except WorkflowNodeError as e:
+        return _failed_run(graph, config, thread_id, e)
+
+
+def stream_research_graph(graph, initial_state: Optional[Dict[str, Any]] = None,
+                          thread_id: Optional[str] = None, resume: bool = False):
+    """Like execute_research_graph, but yields ("answer", chunk) events while the answer is drafted
+
+    The last event is ("result", result) with the dict execute_research_graph returns.
+    """
+    graph_input, config, thread_id = _graph_input(graph, initial_state, thread_id, resume)
+    state = None
+    try:
+        for mode, payload in graph.stream(graph_input, config, stream_mode=["custom", "values"]):
+            if mode == "custom":
+                yield payload
+            else:
+                state = payload
+    except WorkflowNodeError as e:
+        yield "result", _failed_run(graph, config, thread_id, e)
+        return
+    _discard_checkpoints(graph, thread_id)
+    yield "result", {"success": True, "state": state, "thread_id": thread_id}
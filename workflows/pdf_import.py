@@ -0,0 +1,168 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from utils.pdf_ingestion import (
+    PdfExtractionCache, chunk_pages, file_sha256, get_default_pdf_cache, iter_pdf_pages, read_pdf_metadata
+)
+from utils.source_store import SourceStore
+
+
+def _extract_pdf(path: str, file_hash: str, cache_path: str, opening_tokens: int) -> Dict[str, Any]:
+    """Process-pool worker: extract every page into the shared cache and return a small summary"""
+    cache = PdfExtractionCache(cache_path)
+    if cache.page_count(file_hash) is None:
+        for _ in cache.store_pages(file_hash, iter_pdf_pages(path)):
+            pass
+
+    opening = next(chunk_pages(cache.iter_pages(file_hash), max_tokens=opening_tokens, overlap_tokens=0), None)
+    try:
+        metadata = read_pdf_metadata(path)
+    except Exception:
+        metadata = {}
+    return {
+        "pages": cache.page_count(file_hash) or 0,
+        "opening_text": opening["text"] if opening else "",
+        "metadata": metadata
+    }
+
+
+def find_pdfs(directory: str, recursive: bool = True) -> List[str]:
+    """List the PDF files in a directory, sorted by path"""
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(".pdf"))
+        if not recursive:
+            break
+    return sorted(paths)
+
+
+class PdfBulkImporter:
+    """Import many local PDFs into a SourceStore
+
+    Files are hashed and skipped if a source with the same content hash was
+    already imported. Text extraction is CPU-bound and runs in a process pool;
+    metadata extraction with the LLM is I/O-bound and runs in a separate,
+    bounded thread pool. Extracted pages land in the shared PDF cache, so
+    re-importing a file never extracts it twice.
+    """
+
+    def __init__(self, source_store: SourceStore, analysis_agent=None, extract_workers: Optional[int] = None,
+                 io_workers: int = 4, pdf_cache: Optional[PdfExtractionCache] = None, opening_tokens: int = 800,
+                 metadata_chunks: int = 3):
+        self.source_store = source_store
+        self.analysis_agent = analysis_agent
+        self.extract_workers = extract_workers or os.cpu_count() or 2
+        self.io_workers = io_workers
+        self.pdf_cache = pdf_cache or get_default_pdf_cache()
+        self.opening_tokens = opening_tokens
+        # Title, authors and abstract sit at the start, so only the first chunks go to the LLM
+        self.metadata_chunks = metadata_chunks
+
+        if self.pdf_cache.path == ":memory:":
+            raise ValueError("PdfBulkImporter needs a file-backed PDF cache shared with its worker processes")
+
+    def import_directory(self, directory: str, recursive: bool = True, analyze: bool = True,
+                         progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Import every PDF under a directory"""
+        return self.import_files(find_pdfs(directory, recursive), analyze=analyze, progress=progress)
+
+    def import_files(self, paths: Iterable[str], analyze: bool = True,
+                     progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Import PDFs, calling progress with running totals and throughput after each file"""
+        paths = list(paths)
+        known_hashes = {source.get("file_hash") for source in self.source_store if source.get("file_hash")}
+        report = {
+            "total": len(paths),
+            "done": 0,
+            "imported": [],
+            "skipped": [],
+            "failed": [],
+            "pages": 0,
+            "elapsed_seconds": 0.0,
+            "pages_per_second": 0.0,
+            "papers_per_second": 0.0
+        }
+        start = time.monotonic()
+
+        def finish(bucket, item):
+            report[bucket].append(item)
+            report["done"] += 1
+            elapsed = time.monotonic() - start
+            report["elapsed_seconds"] = elapsed
+            report["pages_per_second"] = report["pages"] / elapsed if elapsed else 0.0
+            report["papers_per_second"] = len(report["imported"]) / elapsed if elapsed else 0.0
+            if progress is not None:
+                progress(dict(report, current=item.get("path")))
+
+        io_pool = ThreadPoolExecutor(max_workers=self.io_workers)
+        cpu_pool = ProcessPoolExecutor(max_workers=self.extract_workers)
+        try:
+            pending = {io_pool.submit(file_sha256, path): ("hash", path, None) for path in paths}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, path, file_hash = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"PdfBulkImporter: {stage} failed for {path}: {str(e)}")
+                        finish("failed", {"path": path, "stage": stage, "error": str(e)})
+                        continue
+
+                    if stage == "hash":
+                        if result in known_hashes:
+                            finish("skipped", {"path": path, "file_hash": result})
+                            continue
+                        known_hashes.add(result)
+                        extraction = cpu_pool.submit(_extract_pdf, path, result, self.pdf_cache.path,
+                                                     self.opening_tokens)
+                        pending[extraction] = ("extract", path, result)
+                    elif stage == "extract":
+                        report["pages"] += result["pages"]
+                        metadata = io_pool.submit(self._build_source, path, file_hash, result, analyze)
+                        pending[metadata] = ("metadata", path, file_hash)
+                    else:
+                        source_id = self.source_store.add(result)
+                        bucket = "imported" if source_id is not None else "skipped"
+                        finish(bucket, {"path": path, "file_hash": file_hash, "id": source_id,
+                                        "title": result["title"]})
+        finally:
+            cpu_pool.shutdown(wait=True, cancel_futures=True)
+            io_pool.shutdown(wait=True, cancel_futures=True)
+
+        return report
+
+    def _build_source(self, path: str, file_hash: str, extraction: Dict[str, Any], analyze: bool) -> Dict[str, Any]:
+        """Build the source record, using the analysis agent for metadata when available"""
+        metadata = extraction.get("metadata") or {}
+        source = {
+            "title": metadata.get("title") or os.path.splitext(os.path.basename(path))[0],
+            "authors": metadata.get("author", ""),
+            "url": "",
+            "content": extraction["opening_text"],
+            "score": 1.0,
+            "file_hash": file_hash,
+            "file_path": os.path.abspath(path),
+            "pages": extraction["pages"],
+            "date_accessed": datetime.now().strftime("%Y-%m-%d")
+        }
+
+        if analyze and self.analysis_agent is not None:
+            chunks = islice(chunk_pages(self.pdf_cache.iter_pages(file_hash), model=self.analysis_agent.model,
+                                        max_tokens=self.analysis_agent.chunk_tokens), self.metadata_chunks)
+            analysis = self.analysis_agent.analyze_paper_chunks(chunks, source["title"], max_workers=1)
+            if analysis["success"]:
+                paper = analysis["paper_analysis"]
+                # Fields that failed validation come back as None and keep the PDF metadata
+                for field, value in paper.items():
+                    if value:
+                        source[field] = value
+                if source.get("abstract"):
+                    source["content"] = source["abstract"]
+            else:
+                print(f"PdfBulkImporter: Metadata extraction failed for {path}: {analysis.get('error')}")
+
+        return source
@@ -1,5 +1,17 @@
 from typing import TypedDict, List, Dict, Any, Optional
 from datetime import datetime
+import asyncio
+import contextvars
+import os
+import queue
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from utils.chunk_retrieval import format_excerpts, retrieve_chunks
+from utils.citation_formatter import CitationFormatter, FORMATTERS, citation_key, join_references
+from utils.source_store import make_source_id
+
+DEFAULT_CHECKPOINT_PATH = os.path.join(".cache", "checkpoints.sqlite")
 
 # Define state structure with additional fields for research capabilities
 class ResearchState(TypedDict):
@@ -14,62 +26,161 @@ class ResearchState(TypedDict):
     citation_style: str
     literature_review: str
     research_gaps: str
+    research_gaps_state: Dict[str, Any]
     paper_summary_table: str
     references_list: str
+    retrieved_chunks: List[Dict[str, Any]]
+
+def _source_id(source):
+    return source.get("id") or make_source_id(source)
+
+def _table_cell(value):
+    if isinstance(value, (list, tuple)):
+        value = ", ".join(str(item) for item in value)
+    return str(value or "").replace("|", "\\|").replace("\n", " ")
+
+# Follow-up research rounds allowed after the first, in every execution path
+MAX_RESEARCH_ITERATIONS = 3
+
+# Fields each post-search branch is allowed to write back into the merged state
+POST_SEARCH_BRANCH_FIELDS = {
+    "references_list": ["references_list", "reference_entries"],
+    "literature_review": ["literature_review", "research_gaps", "research_gaps_state"],
+    "paper_summary_table": ["paper_summary_table", "paper_summary_rows"],
+}
 
-# Store agents globally for the workflow functions to access
-research_agent = None
-analysis_agent = None
-drafting_agent = None
-literature_review_agent = None
-research_gaps_agent = None
+SUMMARY_TABLE_HEADER = (
+    "| Title | Authors | Publication | Summary | Key Contribution |\n"
+    "|---|---|---|---|---|"
+)
 
-def run_research(state):
-    """Use the research agent to gather information from the web"""
-    try:
-        # Get the question from the state
-        question = state["question"]
+class ResearchWorkflowEngine:
+    """Research workflow that holds its agents as instance state
+        
+    The engine keeps no per-run data: every execute_workflow call works on its own
+    copy of the state, so many runs can execute at once from threads or an
+    asyncio loop against the same engine.
+    """
+        
+    def __init__(self, research_agent=None, analysis_agent=None, drafting_agent=None,
+                 literature_review_agent=None, research_gaps_agent=None, retrieval_k: Optional[int] = 8,
+                 draft_excerpts: int = 4, chunk_tokens: int = 200, use_graph: bool = False,
+                 checkpoint_path: Optional[str] = DEFAULT_CHECKPOINT_PATH):
+        self.research_agent = research_agent
+        self.analysis_agent = analysis_agent
+        self.drafting_agent = drafting_agent
+        self.literature_review_agent = literature_review_agent
+        self.research_gaps_agent = research_gaps_agent
+        
+        # Analysis sees only the retrieval_k chunks most relevant to the question (None sends every
+        # result), and drafting gets the best draft_excerpts of them for citing
+        self.retrieval_k = retrieval_k
+        self.draft_excerpts = draft_excerpts
+        self.chunk_tokens = chunk_tokens
+        
+        # With use_graph, execute_workflow and execute_workflow_stream run the LangGraph
+        # version of the workflow, checkpointing every node so failed runs can be resumed
+        self.use_graph = use_graph
+        self.checkpoint_path = checkpoint_path
+        self._graphs = {}
+        self._graphs_lock = threading.Lock()
+            
+        # Formatted citations are cached by style and cited fields, so style switches are instant
+        self.citation_formatter = CitationFormatter(fallback=self._llm_citation_fallback)
         
-        # Check if we should focus only on research papers
-        paper_only = state.get("paper_only", False)
+    def _llm_citation_fallback(self, source, style):
+        """Ask the LLM to format a citation for a source with incomplete metadata"""
+        if self.analysis_agent is None:
+            return None
+        citation_response = self.analysis_agent.format_citation(source, style)
+        return citation_response["citation"] if citation_response["success"] else None
         
-        # Use the research agent to search for information
-        search_response = research_agent.research(question, paper_only=paper_only)
+    def run_research(self, state):
+        """Use the research agent to gather information from the web"""
+        try:
+            # Get the question from the state
+            question = state["question"]
+            
+            # Check if we should focus only on research papers
+            paper_only = state.get("paper_only", False)
+            
+            # Use the research agent to search for information
+            search_response = self.research_agent.research(question, paper_only=paper_only)
+            self._apply_research_response(state, search_response)
+                
+        except Exception as e:
+            # Handle any unexpected errors
+            state["status"] = "research_error"
+            state["error"] = str(e)
         
+        return state
+    
+    def _apply_research_response(self, state, search_response):
         if search_response["success"]:
             # Store the search results in the state
             state["search_results"] = search_response["results"]
             state["status"] = "research_complete"
             
-            # Update sources from research agent if available
-            if hasattr(research_agent, "get_sources"):
-                state["sources"] = research_agent.get_sources()
+            # Use the sources found by this run only, so concurrent runs
+            # sharing the research agent do not see each other's sources
+            if "sources" in search_response:
+                state["sources"] = search_response["sources"]
+            elif hasattr(self.research_agent, "get_sources"):
+                state["sources"] = self.research_agent.get_sources()
         else:
             # Handle error
             state["status"] = "research_failed"
             state["error"] = search_response.get("error", "Unknown error during research")
-            
-    except Exception as e:
-        # Handle any unexpected errors
-        state["status"] = "research_error"
-        state["error"] = str(e)
-    
-    return state
 
-def run_analysis(state):
-    """Use the analysis agent to organize and synthesize the research information"""
-    try:
-        # Get the search results from the state
+    def _analysis_input(self, state):
+        """Return the top retrieved chunks of the search results, recording them in the state"""
         search_results = state["search_results"]
+        if not self.retrieval_k or not search_results:
+            return search_results
         
-        # Skip analysis if research failed
-        if state["status"] in ["research_failed", "research_error"]:
-            state["status"] = "analysis_skipped"
-            return state
-        
-        # Use the analysis agent to analyze the search results
-        analysis_response = analysis_agent.analyze(search_results)
+        retrieval = retrieve_chunks(
+            state["question"],
+            search_results,
+            model=getattr(self.analysis_agent, "model", "gpt-3.5-turbo"),
+            k=self.retrieval_k,
+            chunk_tokens=self.chunk_tokens
+        )
+        state["retrieved_chunks"] = retrieval["chunks"]
+        state["retrieval_tokens_saved"] = retrieval["tokens_saved"]
+        if not retrieval["chunks"]:
+            # Results without any content text are passed through as they are
+            return search_results
+        return [
+            {"title": chunk["title"], "url": chunk["url"], "content": chunk["content"], "score": chunk["score"]}
+            for chunk in retrieval["chunks"]
+        ]
+    
+    def _drafting_kwargs(self, state):
+        chunks = state.get("retrieved_chunks")
+        if not chunks or not self.draft_excerpts:
+            return {}
+        return {"excerpts": format_excerpts(chunks[:self.draft_excerpts])}
+    
+    def run_analysis(self, state):
+        """Use the analysis agent to organize and synthesize the research information"""
+        try:
+            # Skip analysis if research failed
+            if state["status"] in ["research_failed", "research_error"]:
+                state["status"] = "analysis_skipped"
+                return state
+            
+            # Use the analysis agent to analyze the search results most relevant to the question
+            analysis_response = self.analysis_agent.analyze(self._analysis_input(state))
+            self._apply_analysis_response(state, analysis_response)
+                
+        except Exception as e:
+            # Handle any unexpected errors
+            state["status"] = "analysis_error"
+            state["error"] = str(e)
         
+        return state
+    
+    def _apply_analysis_response(self, state, analysis_response):
         if analysis_response["success"]:
             # Store the analysis in the state
             state["analysis"] = analysis_response["analysis"]
@@ -78,30 +189,32 @@ def run_analysis(state):
             # Handle error
             state["status"] = "analysis_failed"
             state["error"] = analysis_response.get("error", "Unknown error during analysis")
-            
-    except Exception as e:
-        # Handle any unexpected errors
-        state["status"] = "analysis_error"
-        state["error"] = str(e)
-    
-    return state
 
-def run_drafting(state):
-    """Use the drafting agent to create a comprehensive answer"""
-    try:
-        # Get the question and analysis from the state
-        question = state["question"]
-        analysis = state["analysis"]
-        
-        # Skip drafting if previous steps failed
-        if state["status"] in ["research_failed", "research_error", "analysis_failed", "analysis_error"]:
-            state["status"] = "drafting_skipped"
-            state["answer"] = "Unable to generate answer due to errors in previous steps."
-            return state
-        
-        # Use the drafting agent to create an answer
-        drafting_response = drafting_agent.draft_answer(question, analysis)
+    def run_drafting(self, state):
+        """Use the drafting agent to create a comprehensive answer"""
+        try:
+            # Get the question and analysis from the state
+            question = state["question"]
+            analysis = state["analysis"]
+            
+            # Skip drafting if previous steps failed
+            if state["status"] in ["research_failed", "research_error", "analysis_failed", "analysis_error"]:
+                state["status"] = "drafting_skipped"
+                state["answer"] = "Unable to generate answer due to errors in previous steps."
+                return state
+            
+            # Use the drafting agent to create an answer
+            drafting_response = self.drafting_agent.draft_answer(question, analysis, **self._drafting_kwargs(state))
+            self._apply_drafting_response(state, drafting_response)
+                
+        except Exception as e:
+            # Handle any unexpected errors
+            state["status"] = "drafting_error"
+            state["error"] = str(e)
         
+        return state
+    
+    def _apply_drafting_response(self, state, drafting_response):
         if drafting_response["success"]:
             # Store the answer in the state
             state["answer"] = drafting_response["answer"]
@@ -113,150 +226,518 @@ def run_drafting(state):
             # Handle error
             state["status"] = "drafting_failed"
             state["error"] = drafting_response.get("error", "Unknown error during drafting")
-            
-    except Exception as e:
-        # Handle any unexpected errors
-        state["status"] = "drafting_error"
-        state["error"] = str(e)
     
-    return state
+    async def _call_async(self, agent, name, *args, **kwargs):
+        """Await the agent's native <name>_async method, or run the sync method in a thread"""
+        async_method = getattr(agent, f"{name}_async", None)
+        if async_method is not None:
+            return await async_method(*args, **kwargs)
+        return await asyncio.to_thread(getattr(agent, name), *args, **kwargs)
+    
+    async def run_research_async(self, state):
+        """Async version of run_research"""
+        try:
+            search_response = await self._call_async(
+                self.research_agent, "research", state["question"], paper_only=state.get("paper_only", False)
+            )
+            self._apply_research_response(state, search_response)
+        except Exception as e:
+            state["status"] = "research_error"
+            state["error"] = str(e)
+        return state
+    
+    async def run_analysis_async(self, state):
+        """Async version of run_analysis"""
+        try:
+            if state["status"] in ["research_failed", "research_error"]:
+                state["status"] = "analysis_skipped"
+                return state
+            analysis_response = await self._call_async(self.analysis_agent, "analyze", self._analysis_input(state))
+            self._apply_analysis_response(state, analysis_response)
+        except Exception as e:
+            state["status"] = "analysis_error"
+            state["error"] = str(e)
+        return state
+    
+    async def run_drafting_async(self, state):
+        """Async version of run_drafting"""
+        try:
+            if state["status"] in ["research_failed", "research_error", "analysis_failed", "analysis_error"]:
+                state["status"] = "drafting_skipped"
+                state["answer"] = "Unable to generate answer due to errors in previous steps."
+                return state
+            drafting_response = await self._call_async(
+                self.drafting_agent, "draft_answer", state["question"], state["analysis"],
+                **self._drafting_kwargs(state)
+            )
+            self._apply_drafting_response(state, drafting_response)
+        except Exception as e:
+            state["status"] = "drafting_error"
+            state["error"] = str(e)
+        return state
 
-# New functions for research paper functionality
+    def run_drafting_stream(self, state):
+        """Stream the drafted answer, yielding text chunks and storing the full answer in the state"""
+        if state["status"] in ["research_failed", "research_error", "analysis_failed", "analysis_error"]:
+            state["status"] = "drafting_skipped"
+            state["answer"] = "Unable to generate answer due to errors in previous steps."
+            return
+        
+        chunks = []
+        try:
+            for chunk in self.drafting_agent.draft_answer_stream(state["question"], state["analysis"],
+                                                                 **self._drafting_kwargs(state)):
+                chunks.append(chunk)
+                yield chunk
+            state["answer"] = "".join(chunks)
+            state["status"] = "drafting_complete"
+            state["needs_more_research"] = False
+        except Exception as e:
+            state["answer"] = "".join(chunks)
+            state["status"] = "drafting_error"
+            state["error"] = str(e)
 
+    # New functions for research paper functionality
 
-def generate_paper_summary_table(state):
-    """Generate a summary table of all research papers"""
-    try:
-        if not state.get("sources"):
-            state["status"] = "no_papers_available"
-            state["paper_summary_table"] = "No papers available for summary."
-            return state
+
+    def generate_paper_summary_table(self, state):
+        """Generate a summary table of all research papers"""
+        try:
+            if not state.get("sources"):
+                state["status"] = "no_papers_available"
+                state["paper_summary_table"] = "No papers available for summary."
+                return state
+                
+            # Use the literature review agent to create a summary table
+            summary_response = self.literature_review_agent.create_paper_summary_table(state["sources"])
             
-        # Use the literature review agent to create a summary table
-        summary_response = literature_review_agent.create_paper_summary_table(state["sources"])
-        
-        if summary_response["success"]:
-            state["paper_summary_table"] = summary_response["summary_table"]
-            state["status"] = "summary_table_generated"
-        else:
-            state["status"] = "summary_table_failed"
-            state["error"] = summary_response.get("error", "Unknown error generating summary table")
+            if summary_response["success"]:
+                state["paper_summary_table"] = summary_response["summary_table"]
+                state["status"] = "summary_table_generated"
+            else:
+                state["status"] = "summary_table_failed"
+                state["error"] = summary_response.get("error", "Unknown error generating summary table")
+                
+        except Exception as e:
+            state["status"] = "summary_table_error"
+            state["error"] = str(e)
             
-    except Exception as e:
-        state["status"] = "summary_table_error"
-        state["error"] = str(e)
-        
-    return state
+        return state
 
-def generate_literature_review(state, style="thematic"):
-    """Generate a literature review based on sources"""
-    try:
-        if not state.get("sources"):
-            state["status"] = "no_sources_available"
-            state["literature_review"] = "No sources available for literature review."
-            return state
+    def generate_literature_review(self, state, style="thematic"):
+        """Generate a literature review based on sources"""
+        try:
+            if not state.get("sources"):
+                state["status"] = "no_sources_available"
+                state["literature_review"] = "No sources available for literature review."
+                return state
+                
+            # Use the literature review agent to generate a literature review
+            review_response = self.literature_review_agent.generate_literature_review(state["sources"], style)
             
-        # Use the literature review agent to generate a literature review
-        review_response = literature_review_agent.generate_literature_review(state["sources"], style)
-        
-        if review_response["success"]:
-            state["literature_review"] = review_response["literature_review"]
-            state["status"] = "literature_review_generated"
-        else:
-            state["status"] = "literature_review_failed"
-            state["error"] = review_response.get("error", "Unknown error generating literature review")
+            if review_response["success"]:
+                state["literature_review"] = review_response["literature_review"]
+                state["status"] = "literature_review_generated"
+            else:
+                state["status"] = "literature_review_failed"
+                state["error"] = review_response.get("error", "Unknown error generating literature review")
+                
+        except Exception as e:
+            state["status"] = "literature_review_error"
+            state["error"] = str(e)
             
-    except Exception as e:
-        state["status"] = "literature_review_error"
-        state["error"] = str(e)
+        return state
+
+    def identify_research_gaps(self, state):
+        """Identify research gaps based on the literature review
         
-    return state
+        When the state carries a research_gaps_state (empty for a first run), the
+        structured gaps list is updated incrementally from the sources added or
+        removed since the last update.
+        """
+        try:
+            if not state.get("literature_review"):
+                state["status"] = "no_literature_review"
+                state["research_gaps"] = "No literature review available for gap analysis."
+                return state
+                
+            # Use the research gaps agent to identify research gaps
+            if "research_gaps_state" in state:
+                gaps_response = self.research_gaps_agent.update_research_gaps(
+                    state["literature_review"], state["research_gaps_state"], state.get("sources")
+                )
+            else:
+                gaps_response = self.research_gaps_agent.identify_research_gaps(state["literature_review"])
+            
+            if gaps_response["success"]:
+                state["research_gaps"] = gaps_response["research_gaps"]
+                if "gaps_state" in gaps_response:
+                    state["research_gaps_state"] = gaps_response["gaps_state"]
+                state["status"] = "research_gaps_identified"
+            else:
+                state["status"] = "research_gaps_failed"
+                state["error"] = gaps_response.get("error", "Unknown error identifying research gaps")
+                
+        except Exception as e:
+            state["status"] = "research_gaps_error"
+            state["error"] = str(e)
+            
+        return state
 
-def identify_research_gaps(state):
-    """Identify research gaps based on the literature review"""
-    try:
-        if not state.get("literature_review"):
-            state["status"] = "no_literature_review"
-            state["research_gaps"] = "No literature review available for gap analysis."
-            return state
+    def generate_references_list(self, state):
+        """Generate a formatted references list from all sources"""
+        try:
+            if not state.get("sources"):
+                state["status"] = "no_sources_available"
+                state["references_list"] = "No sources available for references list."
+                return state
+                
+            # Get the citation style from state or use default
+            citation_style = state.get("citation_style", "APA")
             
-        # Use the research gaps agent to identify research gaps
-        gaps_response = research_gaps_agent.identify_research_gaps(state["literature_review"])
-        
-        if gaps_response["success"]:
-            state["research_gaps"] = gaps_response["research_gaps"]
-            state["status"] = "research_gaps_identified"
-        else:
-            state["status"] = "research_gaps_failed"
-            state["error"] = gaps_response.get("error", "Unknown error identifying research gaps")
+            # Format supported styles locally; the LLM is only used for other styles
+            # and, when enabled, for sources with incomplete metadata
+            if citation_style.upper() in FORMATTERS:
+                state["references_list"] = self.citation_formatter.format_references(
+                    state["sources"],
+                    citation_style,
+                    use_fallback=state.get("citation_llm_fallback", False)
+                )
+                state["status"] = "references_list_generated"
+                return state
             
-    except Exception as e:
-        state["status"] = "research_gaps_error"
-        state["error"] = str(e)
-        
-    return state
+            # Use the drafting agent to generate references list
+            refs_response = self.drafting_agent.generate_references_list(state["sources"], citation_style)
+            
+            if refs_response["success"]:
+                state["references_list"] = refs_response["references_list"]
+                state["status"] = "references_list_generated"
+            else:
+                state["status"] = "references_list_failed"
+                state["error"] = refs_response.get("error", "Unknown error generating references list")
+                
+        except Exception as e:
+            state["status"] = "references_list_error"
+            state["error"] = str(e)
+            
+        return state
 
-def generate_references_list(state):
-    """Generate a formatted references list from all sources"""
-    try:
-        if not state.get("sources"):
-            state["status"] = "no_sources_available"
-            state["references_list"] = "No sources available for references list."
-            return state
+    def update_paper_summary_table(self, state):
+        """Update the paper summary table, only summarizing sources that have no row yet"""
+        try:
+            if not state.get("sources"):
+                state["status"] = "no_papers_available"
+                state["paper_summary_table"] = "No papers available for summary."
+                return state
             
-        # Get the citation style from state or use default
-        citation_style = state.get("citation_style", "APA")
-        
-        # Use the drafting agent to generate references list
-        refs_response = drafting_agent.generate_references_list(state["sources"], citation_style)
-        
-        if refs_response["success"]:
-            state["references_list"] = refs_response["references_list"]
-            state["status"] = "references_list_generated"
-        else:
-            state["status"] = "references_list_failed"
-            state["error"] = refs_response.get("error", "Unknown error generating references list")
+            # Rows rendered by earlier runs, keyed by source ID
+            rows = dict(state.get("paper_summary_rows") or {})
+            new_sources = [
+                dict(source, id=_source_id(source))
+                for source in state["sources"]
+                if _source_id(source) not in rows
+            ]
             
-    except Exception as e:
-        state["status"] = "references_list_error"
-        state["error"] = str(e)
-        
-    return state
+            if new_sources:
+                summary_response = self.literature_review_agent.create_paper_summary_rows(new_sources)
+                
+                if not summary_response["success"]:
+                    state["status"] = "summary_table_failed"
+                    state["error"] = summary_response.get("error", "Unknown error generating summary table")
+                    return state
+                
+                for source in new_sources:
+                    if source["id"] in summary_response["rows"]:
+                        rows[source["id"]] = summary_response["rows"][source["id"]]
+            
+            table_rows = []
+            for source in state["sources"]:
+                # Sources the model skipped fall back to their metadata and are retried next time
+                row = rows.get(_source_id(source), source)
+                table_rows.append(row)
+            table_rows.sort(key=lambda row: str(row.get("title", "")).lower())
+            
+            lines = [SUMMARY_TABLE_HEADER]
+            for row in table_rows:
+                lines.append(
+                    f"| {_table_cell(row.get('title'))} | {_table_cell(row.get('authors'))} | "
+                    f"{_table_cell(row.get('publication'))} | {_table_cell(row.get('summary'))} | "
+                    f"{_table_cell(row.get('contribution'))} |"
+                )
+            
+            state["paper_summary_rows"] = rows
+            state["paper_summary_table"] = "\n".join(lines)
+            state["status"] = "summary_table_generated"
+            
+        except Exception as e:
+            state["status"] = "summary_table_error"
+            state["error"] = str(e)
+            
+        return state
 
-def update_citation_style(state, style):
-    """Update the citation style used for references"""
-    try:
-        state["citation_style"] = style
+    def update_references_list(self, state):
+        """Update the references list, only formatting sources whose cited fields have no entry yet
         
-        # If we already have sources, regenerate the references list
-        if state.get("sources"):
-            state = generate_references_list(state)
+        reference_entries is keyed by style and a digest of the cited fields, so a
+        source whose metadata changed gets a new entry. Entries of the current
+        style that no current source uses are dropped.
+        """
+        try:
+            if not state.get("sources"):
+                state["status"] = "no_sources_available"
+                state["references_list"] = "No sources available for references list."
+                return state
+            
+            citation_style = state.get("citation_style", "APA")
+            style_key = citation_style.upper()
+            if style_key not in FORMATTERS:
+                return self.generate_references_list(state)
+            
+            # Entries rendered by earlier runs; LLM-formatted ones are kept apart from rule-based ones
+            use_fallback = state.get("citation_llm_fallback", False)
+            suffix = ":llm" if use_fallback else ""
+            previous = state.get("reference_entries") or {}
+            entries = {key: entry for key, entry in previous.items() if not key.startswith(f"{style_key}:")}
+            keys = []
+            for source in state["sources"]:
+                key = f"{style_key}:{citation_key(source, style_key)}{suffix}"
+                if key not in entries:
+                    entries[key] = previous.get(key) or self.citation_formatter.format_source(
+                        source,
+                        citation_style,
+                        use_fallback=use_fallback
+                    )
+                keys.append(key)
+            
+            state["reference_entries"] = entries
+            state["references_list"] = join_references([entries[key] for key in keys], citation_style)
+            state["status"] = "references_list_generated"
+            
+        except Exception as e:
+            state["status"] = "references_list_error"
+            state["error"] = str(e)
             
         return state
-    except Exception as e:
-        state["status"] = "citation_style_error"
-        state["error"] = str(e)
+
+    def update_citation_style(self, state, style):
+        """Update the citation style used for references"""
+        try:
+            state["citation_style"] = style
+            
+            # If we already have sources, regenerate the references list
+            if state.get("sources"):
+                state = self.generate_references_list(state)
+                
+            return state
+        except Exception as e:
+            state["status"] = "citation_style_error"
+            state["error"] = str(e)
+            return state
+
+    def run_post_search_stage(self, state, style="thematic", max_workers=3):
+        """Generate references, literature review, summary table and research gaps concurrently.
+
+        References, review and summary table only depend on the sources, so they are
+        fanned out to a thread pool. Gap identification is chained onto the review
+        branch and starts as soon as the review is ready. Each branch works on its
+        own copy of the state; the produced fields are merged back into one state.
+        References and the summary table are updated incrementally, so only sources
+        without a rendered entry or row cost any work.
+        """
+        def review_then_gaps(branch_state):
+            branch_state = self.generate_literature_review(branch_state, style)
+            if branch_state["status"] == "literature_review_generated":
+                branch_state = self.identify_research_gaps(branch_state)
+            return branch_state
+
+        branches = {
+            "references_list": self.update_references_list,
+            "literature_review": review_then_gaps,
+            "paper_summary_table": self.update_paper_summary_table,
+        }
+        def branch_copy():
+            branch_state = dict(state)
+            branch_state.pop("error", None)
+            return branch_state
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                # Copy the context so branches keep the caller's request priority
+                name: executor.submit(contextvars.copy_context().run, func, branch_copy())
+                for name, func in branches.items()
+            }
+            results = {name: future.result() for name, future in futures.items()}
+
+        errors = {}
+        for name, branch_state in results.items():
+            for field in POST_SEARCH_BRANCH_FIELDS[name]:
+                if field in branch_state:
+                    state[field] = branch_state[field]
+            if "error" in branch_state:
+                # Report gap failures separately from review failures
+                step = "research_gaps" if branch_state["status"].startswith("research_gaps") else name
+                errors[step] = branch_state["error"]
+
+        state["errors"] = errors
+        state["status"] = "post_search_failed" if errors else "post_search_complete"
         return state
 
-def needs_more_research(state):
-    """Condition to check if more research is needed"""
-    return state["needs_more_research"]
+    def stream_post_search_stage(self, state, style="thematic", min_review_chars=1500, max_workers=2,
+                                 map_reduce_threshold=24):
+        """Run the post-search stage while streaming the literature review and research gaps
+        
+        References and the summary table run in a thread pool. The review is streamed,
+        and gap identification starts from the partial review as soon as it holds
+        min_review_chars characters (or from the full review if it is shorter).
+        With a research_gaps_state in the state, gaps are instead updated
+        incrementally once the full review is known, and arrive as one chunk.
+        More than map_reduce_threshold sources do not fit one prompt, so the review
+        is then built with the hierarchical map-reduce and arrives as one chunk.
+        Yields (field, chunk) events for "literature_review" and "research_gaps",
+        followed by a final ("state", merged_state) event.
+        """
+        errors = {}
+        state.pop("error", None)
+        incremental_gaps = "research_gaps_state" in state
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        side_branches = {
+            "references_list": executor.submit(contextvars.copy_context().run, self.update_references_list, dict(state)),
+            "paper_summary_table": executor.submit(contextvars.copy_context().run, self.update_paper_summary_table, dict(state)),
+        }
+        
+        gaps_queue = queue.Queue()
+        gaps_done = object()
+        gaps_thread = None
+        
+        def stream_gaps(partial_review):
+            try:
+                for chunk in self.research_gaps_agent.identify_research_gaps_stream(partial_review):
+                    gaps_queue.put(chunk)
+            except Exception as e:
+                errors["research_gaps"] = str(e)
+            finally:
+                gaps_queue.put(gaps_done)
+        
+        def start_gaps(review_text):
+            thread = threading.Thread(target=contextvars.copy_context().run, args=(stream_gaps, review_text), daemon=True)
+            thread.start()
+            return thread
+        
+        gaps_chunks = []
+        gaps_finished = False
+        
+        def drain_gaps(block):
+            nonlocal gaps_finished
+            while not gaps_finished:
+                try:
+                    item = gaps_queue.get(block=block)
+                except queue.Empty:
+                    return
+                if item is gaps_done:
+                    gaps_finished = True
+                    return
+                gaps_chunks.append(item)
+                yield "research_gaps", item
+        
+        review_chunks = []
+        try:
+            if state.get("sources") and map_reduce_threshold is not None and \
+                    len(state["sources"]) > map_reduce_threshold:
+                review_state = self.generate_literature_review(dict(state), style)
+                if review_state["status"] != "literature_review_generated":
+                    raise RuntimeError(review_state.get("error", "Unknown error generating literature review"))
+                review_chunks.append(review_state["literature_review"])
+                state["literature_review"] = review_state["literature_review"]
+                yield "literature_review", state["literature_review"]
+            elif state.get("sources"):
+                for chunk in self.literature_review_agent.generate_literature_review_stream(state["sources"], style):
+                    review_chunks.append(chunk)
+                    yield "literature_review", chunk
+                    
+                    if gaps_thread is None and not incremental_gaps and \
+                            sum(len(part) for part in review_chunks) >= min_review_chars:
+                        gaps_thread = start_gaps("".join(review_chunks))
+                    if gaps_thread is not None:
+                        yield from drain_gaps(block=False)
+                state["literature_review"] = "".join(review_chunks)
+            else:
+                state["literature_review"] = "No sources available for literature review."
+        except Exception as e:
+            state["literature_review"] = "".join(review_chunks)
+            errors["literature_review"] = str(e)
+        
+        if incremental_gaps and review_chunks and "literature_review" not in errors:
+            gaps_state = self.identify_research_gaps(dict(state))
+            if "error" in gaps_state:
+                errors["research_gaps"] = gaps_state["error"]
+            else:
+                state["research_gaps"] = gaps_state["research_gaps"]
+                state["research_gaps_state"] = gaps_state["research_gaps_state"]
+                yield "research_gaps", state["research_gaps"]
+        elif gaps_thread is None and review_chunks and "literature_review" not in errors:
+            gaps_thread = start_gaps(state["literature_review"])
+        if gaps_thread is not None:
+            yield from drain_gaps(block=True)
+            state["research_gaps"] = "".join(gaps_chunks)
+        
+        for name, future in side_branches.items():
+            branch_state = future.result()
+            # Each branch holds a stale copy of the other branch's fields; merge only its own
+            for field in POST_SEARCH_BRANCH_FIELDS[name]:
+                if field in branch_state:
+                    state[field] = branch_state[field]
+            if "error" in branch_state:
+                errors[name] = branch_state["error"]
+        executor.shutdown()
+        
+        state["errors"] = errors
+        state["status"] = "post_search_failed" if errors else "post_search_complete"
+        yield "state", state
+
+    def needs_more_research(self, state):
+        """Condition to check if more research is needed"""
+        return state["needs_more_research"]
 
-def create_research_workflow(research_agent_instance=None, analysis_agent_instance=None, drafting_agent_instance=None, literature_review_agent_instance=None, research_gaps_agent_instance=None):
-    """Create a research workflow that uses the provided agents"""
-    # Set the global agent references
-    global research_agent, analysis_agent, drafting_agent, literature_review_agent, research_gaps_agent
-    research_agent = research_agent_instance
-    analysis_agent = analysis_agent_instance
-    drafting_agent = drafting_agent_instance
-    literature_review_agent = literature_review_agent_instance
-    research_gaps_agent = research_gaps_agent_instance
+    def _graph(self, post_search, style="thematic"):
+        """Compile the LangGraph workflow once per mode and review style"""
+        key = (post_search, style)
+        with self._graphs_lock:
+            if key not in self._graphs:
+                from workflows.langgraph_workflow import create_research_graph
+                self._graphs[key] = create_research_graph(self, self.checkpoint_path, style, post_search)
+            return self._graphs[key]
     
-    def execute_workflow(initial_state):
+    def _graph_state(self, result):
+        state = dict(result.get("state") or {})
+        state["run_id"] = result["thread_id"]
+        if not result["success"]:
+            state["status"] = "workflow_failed"
+            state["error"] = result["error"]
+            state.setdefault("answer", "Unable to generate answer due to errors in previous steps.")
+        return state
+    
+    def execute_graph(self, initial_state=None, run_id=None, post_search=False, style="thematic", resume=True):
+        """Run the workflow as a checkpointed LangGraph graph
+        
+        A run_id whose earlier run failed is resumed from its last completed node,
+        so finished searches and LLM calls are not paid for again. With post_search
+        the references, literature review, summary table and gaps run in the graph too.
+        On failure the status is "workflow_failed" and run_id identifies the run to resume.
+        """
+        from workflows.langgraph_workflow import execute_research_graph
+        
+        result = execute_research_graph(self._graph(post_search, style), initial_state, run_id, resume=resume)
+        return self._graph_state(result)
+    
+    def execute_workflow(self, initial_state):
         """Execute the research workflow with the given initial state"""
+        if self.use_graph:
+            return self.execute_graph(initial_state, initial_state.get("run_id"))
+        
         state = initial_state.copy()
         
         # Initialize new state fields if they don't exist
+        state.setdefault("run_id", uuid.uuid4().hex)
         
         if "sources" not in state:
             state["sources"] = []
@@ -272,43 +753,139 @@ def create_research_workflow(research_agent_instance=None, analysis_agent_instan
             state["references_list"] = ""
         
         # Run the research step
-        state = run_research(state)
+        state = self.run_research(state)
         
         # Run the analysis step
-        state = run_analysis(state)
+        state = self.run_analysis(state)
         
         # Run the drafting step
-        state = run_drafting(state)
+        state = self.run_drafting(state)
         
         # Handle the case where more research is needed
         iteration = 0
-        max_iterations = 3  # Limit the number of iterations to prevent infinite loops
         
-        while state["needs_more_research"] and iteration < max_iterations:
+        while state["needs_more_research"] and iteration < MAX_RESEARCH_ITERATIONS:
             # Add iteration information to the state
             state["iteration"] = iteration + 1
             
             # Run another round of research, analysis, and drafting
-            state = run_research(state)
-            state = run_analysis(state)
-            state = run_drafting(state)
+            state = self.run_research(state)
+            state = self.run_analysis(state)
+            state = self.run_drafting(state)
             
             iteration += 1
         
         # Add completion information
-        if iteration >= max_iterations and state["needs_more_research"]:
+        if iteration >= MAX_RESEARCH_ITERATIONS and state["needs_more_research"]:
             state["status"] = "max_iterations_reached"
         else:
             state["status"] = "workflow_complete"
             
         return state
+
+    def execute_workflow_stream(self, initial_state):
+        """Execute the research workflow, streaming the drafted answer
+        
+        Yields ("answer", chunk) events while the answer is drafted and a final
+        ("state", state) event with the completed state.
+        """
+        if self.use_graph:
+            from workflows.langgraph_workflow import stream_research_graph
+            
+            for event, payload in stream_research_graph(self._graph(False), initial_state,
+                                                        initial_state.get("run_id"), resume=True):
+                if event == "result":
+                    yield "state", self._graph_state(payload)
+                else:
+                    yield event, payload
+            return
+        
+        state = initial_state.copy()
+        state.setdefault("run_id", uuid.uuid4().hex)
+        defaults = {
+            "sources": [],
+            "citation_style": "APA",
+            "literature_review": "",
+            "research_gaps": "",
+            "paper_summary_table": "",
+            "references_list": ""
+        }
+        for field, default in defaults.items():
+            state.setdefault(field, default)
+        
+        state = self.run_research(state)
+        state = self.run_analysis(state)
+        
+        for chunk in self.run_drafting_stream(state):
+            yield "answer", chunk
+        
+        if state["status"] == "drafting_complete":
+            state["status"] = "workflow_complete"
+        yield "state", state
+        
+    async def execute_workflow_async(self, initial_state):
+        """Execute the research workflow on the event loop
+        
+        Agents with native *_async methods are awaited directly, so many runs
+        share one loop and one async HTTP pool; other agents run in threads.
+        """
+        state = initial_state.copy()
+        state.setdefault("run_id", uuid.uuid4().hex)
+        defaults = {
+            "sources": [],
+            "citation_style": "APA",
+            "literature_review": "",
+            "research_gaps": "",
+            "paper_summary_table": "",
+            "references_list": ""
+        }
+        for field, default in defaults.items():
+            state.setdefault(field, default)
+        
+        iteration = 0
+        while True:
+            state = await self.run_research_async(state)
+            state = await self.run_analysis_async(state)
+            state = await self.run_drafting_async(state)
+            if not state.get("needs_more_research") or iteration >= MAX_RESEARCH_ITERATIONS:
+                break
+            iteration += 1
+            state["iteration"] = iteration
+        
+        if iteration >= MAX_RESEARCH_ITERATIONS and state["needs_more_research"]:
+            state["status"] = "max_iterations_reached"
+        else:
+            state["status"] = "workflow_complete"
+        return state
+        
+    def as_dict(self):
+        """Return the workflow functions keyed by name"""
+        return {
+            "execute_workflow": self.execute_workflow,
+            "generate_paper_summary_table": self.generate_paper_summary_table,
+            "generate_literature_review": self.generate_literature_review,
+            "identify_research_gaps": self.identify_research_gaps,
+            "generate_references_list": self.generate_references_list,
+            "update_citation_style": self.update_citation_style,
+            "update_references_list": self.update_references_list,
+            "update_paper_summary_table": self.update_paper_summary_table,
+            "run_post_search_stage": self.run_post_search_stage,
+            "execute_workflow_stream": self.execute_workflow_stream,
+            "stream_post_search_stage": self.stream_post_search_stage,
+            "execute_workflow_async": self.execute_workflow_async,
+            "engine": self
+        }
+
+def create_research_workflow(research_agent_instance=None, analysis_agent_instance=None, drafting_agent_instance=None, literature_review_agent_instance=None, research_gaps_agent_instance=None, use_graph=False):
+    """Create a research workflow that uses the provided agents"""
+    engine = ResearchWorkflowEngine(
+        research_agent=research_agent_instance,
+        analysis_agent=analysis_agent_instance,
+        drafting_agent=drafting_agent_instance,
+        literature_review_agent=literature_review_agent_instance,
+        research_gaps_agent=research_gaps_agent_instance,
+        use_graph=use_graph
+    )
     
     # Return a dictionary containing all workflow functions for access
-    return {
-        "execute_workflow": execute_workflow,
-        "generate_paper_summary_table": generate_paper_summary_table,
-        "generate_literature_review": generate_literature_review,
-        "identify_research_gaps": identify_research_gaps,
-        "generate_references_list": generate_references_list,
-        "update_citation_style": update_citation_style
-    }
\ No newline at end of file
+    return engine.as_dict()
\ No newline at end of file